@@ -0,0 +1,185 @@
+import math
+import logging as log
+
+from statistics import fmean, median, stdev
+from typing import Any, Dict, List, Sequence, Tuple
+
+import analysis.stats as stats
+
+from analysis.index import ResultsIndex
+
+# Penalty per change point in units of sigma^2 * log(n), BIC being 2
+defaultPenalty = 3.0
+# Changes smaller than this fraction of the mean are not reported
+defaultMinChange = 0.01
+# p-value a change must reach between neighbouring segments
+alpha = 0.01
+
+
+def noiseSigma(values: Sequence[float]) -> float:
+    """
+    Robust estimate of the run-to-run noise: the MAD of successive
+    differences, which a few step changes barely affect.
+    """
+    diffs = [b - a for a, b in zip(values, values[1:])]
+    if not diffs:
+        return 0.0
+    mad = median(abs(d) for d in diffs)
+    if mad > 0:
+        # 1.4826 * MAD estimates sigma; differences have twice the variance
+        return 1.4826 * mad / math.sqrt(2)
+    return stdev(diffs) / math.sqrt(2) if len(diffs) > 1 else 0.0
+
+
+def pelt(values: Sequence[float], penalty: float, minSize: int = 2) -> List[int]:
+    """
+    PELT (Killick et al. 2012) optimal partitioning for changes in the
+    mean under a squared error cost. Returns the index of the first
+    value of every new segment.
+    """
+    n = len(values)
+    if n < 2 * minSize:
+        return []
+
+    sums = [0.0] * (n + 1)
+    squares = [0.0] * (n + 1)
+    for i, v in enumerate(values):
+        sums[i + 1] = sums[i] + v
+        squares[i + 1] = squares[i] + v * v
+
+    best = [math.inf] * (n + 1)
+    best[0] = -penalty
+    last = [0] * (n + 1)
+    candidates = [0]
+    for t in range(minSize, n + 1):
+        # Every candidate is at least 'minSize' before 't'
+        st, qt = sums[t], squares[t]
+        costs = [best[s] + qt - squares[s] - (st - sums[s]) ** 2 / (t - s) for s in candidates]
+        lowest = min(costs)
+        best[t] = lowest + penalty
+        last[t] = candidates[costs.index(lowest)]
+        # Prune starts that can never be optimal again
+        candidates = [s for s, c in zip(candidates, costs) if c <= best[t]]
+        candidates.append(t - minSize + 1)
+
+    changes = []
+    t = last[n]
+    while t > 0:
+        changes.append(t)
+        t = last[t]
+    return changes[::-1]
+
+
+def _segments(n: int, changes: List[int]) -> List[Tuple[int, int]]:
+    bounds = [0] + changes + [n]
+    return list(zip(bounds, bounds[1:]))
+
+
+def detect(
+    values: Sequence[float],
+    penalty: float = defaultPenalty,
+    minChange: float = defaultMinChange,
+    minSize: int = 4,
+) -> List[Dict[str, Any]]:
+    """
+    Find step changes in a series of per-run values. The penalty scales
+    with the estimated noise, and every change must be significant
+    (Mann-Whitney U) against its neighbouring segments and exceed
+    'minChange' relative to the level before it. Segments shorter than
+    'minSize' runs are not considered, so lone outliers are ignored.
+    """
+    values = list(values)
+    sigma = noiseSigma(values)
+    if sigma == 0:
+        return []
+    changes = pelt(values, penalty * sigma * sigma * math.log(len(values)), minSize)
+
+    while True:
+        reports = []
+        for i, (start, end) in enumerate(_segments(len(values), changes)[1:]):
+            prevStart = ([0] + changes)[i]
+            before, after = values[prevStart:start], values[start:end]
+            _, p = stats.mannWhitneyU(before, after)
+            base = fmean(before)
+            delta = fmean(after) - base
+            reports.append(
+                {
+                    "index": start,
+                    "before": base,
+                    "after": fmean(after),
+                    "delta": delta,
+                    "relative": delta / base if base else math.inf,
+                    "ci": stats.welchDiffCI(before, after),
+                    "p": p,
+                    "confidence": 1 - p,
+                }
+            )
+
+        # Merge away the weakest change that does not hold up and retry
+        weak = [
+            r for r in reports if r["p"] >= alpha or abs(r["relative"]) < minChange
+        ]
+        if not weak:
+            return reports
+        changes.remove(max(weak, key=lambda r: (r["p"], -abs(r["relative"])))["index"])
+
+
+def detectHistory(
+    index: ResultsIndex,
+    workload: str | None = None,
+    name: str | None = None,
+    penalty: float = defaultPenalty,
+    minChange: float = defaultMinChange,
+    limit: int | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run change-point detection over the per-run means of every indexed
+    value (or only those of 'workload'/'name') and report the run that
+    introduced every change.
+    """
+    found = []
+    for w, n in index.names(workload, name):
+        rows = index.trend(w, n, limit)
+        changes = detect([r["mean"] for r in rows], penalty, minChange)
+        for c in changes:
+            run = rows[c.pop("index")]
+            found.append(
+                {
+                    "workload": w,
+                    "name": n,
+                    "run": run["run"],
+                    "started": run["started"],
+                    "uname": run["uname"],
+                    "path": run["path"],
+                    "runs": len(rows),
+                    **c,
+                }
+            )
+        log.debug(f"'{w}' {n}: {len(rows)} runs, {len(changes)} changes")
+    return found
+
+
+def formatChanges(changes: List[Dict[str, Any]]) -> str:
+    header = ("workload", "series", "run", "started", "before", "after", "change", "95% CI", "confidence", "uname")
+    rows = [header]
+    for c in changes:
+        low, high = c["ci"]
+        rows.append(
+            (
+                c["workload"] or "",
+                c["name"],
+                str(c["run"]),
+                c["started"] or "",
+                f"{c['before']:.6g}",
+                f"{c['after']:.6g}",
+                f"{c['relative'] * 100:+.2f}%",
+                f"[{low:+.4g}, {high:+.4g}]",
+                f"{c['confidence']:.4f}",
+                c["uname"] or "",
+            )
+        )
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return "\n".join(
+        "  ".join(col.ljust(w) for col, w in zip(row, widths)).rstrip() for row in rows
+    )
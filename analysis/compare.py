@@ -0,0 +1,182 @@
+import math
+import numbers
+import logging as log
+
+from statistics import fmean
+from typing import Any, Dict, List
+
+import analysis.stats as stats
+from core.loader import ResultFile, load
+
+# p-value below which a difference is reported as significant
+alpha = 0.05
+# Iterations per side needed for confidence intervals and tests
+minSamples = 2
+
+
+def iterationSummaries(result: ResultFile) -> Dict[str, Dict[str, List[float]]]:
+    """
+    Reduce a results file to one value per iteration for every
+    workload's wall time and numeric metric series.
+    """
+    summaries = {}
+    keys = result.keys()
+    for workload in result.workloads():
+        iterations = sorted(result.iterations(workload), key=lambda r: r["iteration"])
+        series = {"time": [r["time"] for r in iterations]}
+        # Resource usage of the benchmark's process tree, if recorded
+        if iterations and all("rusage" in r for r in iterations):
+            for stat in iterations[0]["rusage"]:
+                series[f"rusage/{stat}"] = [r["rusage"][stat] for r in iterations]
+
+        for key in keys:
+            if key.workload != workload:
+                continue
+            _, values = result.series(*key)
+            if len(values) == 0 or not all(
+                isinstance(v, numbers.Real) for v in values
+            ):
+                continue
+            name = f"{key.metric}/{key.series}"
+            series.setdefault(name, []).append(fmean(values))
+
+        # Scalar derived metrics and the stats of derived summaries
+        for r in iterations:
+            for name, value in r.get("metrics", {}).get("derived", {}).items():
+                if isinstance(value, dict):
+                    fields = {f"derived/{name}/{k}": v for k, v in value.items()}
+                else:
+                    fields = {f"derived/{name}": value}
+                for key, v in fields.items():
+                    if isinstance(v, numbers.Real):
+                        series.setdefault(key, []).append(v)
+
+        summaries[workload] = series
+    return summaries
+
+
+def finite(value: Any) -> Any:
+    """
+    Replace infinities and NaNs, which JSON cannot represent, by None.
+    """
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [finite(v) for v in value]
+    return value
+
+
+def compareSamples(baseline: List[float], patched: List[float]) -> Dict[str, Any]:
+    """
+    Compare the per-iteration values of a series. With fewer than
+    'minSamples' values on either side only the means are compared
+    and the status reports too few samples.
+    """
+    base = stats.summarize(baseline)
+    new = stats.summarize(patched)
+    delta = new["mean"] - base["mean"]
+
+    def relative(x):
+        return x / base["mean"] if base["mean"] else math.nan
+
+    if min(len(baseline), len(patched)) < minSamples:
+        return finite(
+            {
+                "status": "too_few_samples",
+                "baseline": base,
+                "patched": new,
+                "delta": delta,
+                "relative": relative(delta),
+                "ci": None,
+                "relative_ci": None,
+                "u": None,
+                "p": None,
+                "cliffs_delta": None,
+                "hedges_g": None,
+                "significant": False,
+            }
+        )
+
+    ciLow, ciHigh = stats.bootstrapDiffCI(baseline, patched)
+    u, p = stats.mannWhitneyU(baseline, patched)
+
+    return finite(
+        {
+            "status": "ok",
+            "baseline": base,
+            "patched": new,
+            "delta": delta,
+            "relative": relative(delta),
+            "ci": [ciLow, ciHigh],
+            "relative_ci": [relative(ciLow), relative(ciHigh)],
+            "u": u,
+            "p": p,
+            "cliffs_delta": stats.cliffsDelta(baseline, patched, u),
+            "hedges_g": stats.hedgesG(baseline, patched),
+            "significant": p < alpha and (ciLow > 0 or ciHigh < 0),
+        }
+    )
+
+
+def compare(baselinePath: str, patchedPath: str) -> Dict[str, Any]:
+    with load(baselinePath) as baseline, load(patchedPath) as patched:
+        baseSummaries = iterationSummaries(baseline)
+        newSummaries = iterationSummaries(patched)
+        report = {
+            "baseline": {"path": baselinePath, **baseline.metadata},
+            "patched": {"path": patchedPath, **patched.metadata},
+            "workloads": {},
+        }
+
+    for workload, baseSeries in baseSummaries.items():
+        if workload not in newSummaries:
+            log.warning(f"Workload '{workload}' is missing from '{patchedPath}'")
+            continue
+        newSeries = newSummaries[workload]
+        report["workloads"][workload] = {
+            name: compareSamples(values, newSeries[name])
+            for name, values in baseSeries.items()
+            if name in newSeries
+        }
+        few = [n for n, c in report["workloads"][workload].items() if c["status"] == "too_few_samples"]
+        if few:
+            log.warning(
+                f"Workload '{workload}': fewer than {minSamples} iterations for {', '.join(few)},"
+                " only comparing means"
+            )
+    return report
+
+
+def _percent(x: float | None) -> str:
+    return "n/a" if x is None else f"{x * 100:+.2f}%"
+
+
+def _number(x: float | None, spec: str) -> str:
+    return "n/a" if x is None else format(x, spec)
+
+
+def formatTable(report: Dict[str, Any]) -> str:
+    header = ("workload", "series", "baseline", "patched", "delta", "95% CI", "p", "cliff", "")
+    rows = [header]
+    for workload, series in report["workloads"].items():
+        for name, c in series.items():
+            rows.append(
+                (
+                    workload,
+                    name,
+                    _number(c["baseline"]["mean"], ".6g"),
+                    _number(c["patched"]["mean"], ".6g"),
+                    _percent(c["relative"]),
+                    f"[{_percent(c['relative_ci'][0])}, {_percent(c['relative_ci'][1])}]" if c["relative_ci"] else "n/a",
+                    _number(c["p"], ".3g"),
+                    _number(c["cliffs_delta"], "+.2f"),
+                    "*" if c["significant"] else ("too few samples" if c["status"] == "too_few_samples" else ""),
+                )
+            )
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return "\n".join(
+        "  ".join(col.ljust(w) for col, w in zip(row, widths)).rstrip() for row in rows
+    )
@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import numbers
+import sqlite3
+import logging as log
+
+from array import array
+from statistics import fmean
+from typing import Any, Dict, Iterator, List, Tuple
+
+import core.columnar
+
+from core.loader import ResultFile, load
+from core.series import jsonDefault
+
+defaultPath = "./results/index.sqlite"
+
+# Samples per stored series chunk
+chunkSize = 4096
+
+schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    started TEXT,
+    action TEXT,
+    config TEXT,
+    uname TEXT,
+    host TEXT,
+    agent TEXT,
+    affinity TEXT,
+    metadata TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+
+CREATE TABLE IF NOT EXISTS iterations (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    workload TEXT NOT NULL,
+    iteration INTEGER NOT NULL,
+    time REAL,
+    status INTEGER,
+    PRIMARY KEY (run_id, workload, iteration)
+);
+CREATE INDEX IF NOT EXISTS iterations_workload ON iterations (workload, run_id);
+
+-- One number per iteration: wall time, rusage, scalar derived
+-- metrics and the mean of every numeric metric series
+CREATE TABLE IF NOT EXISTS iteration_values (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    workload TEXT,
+    iteration INTEGER,
+    name TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS iteration_values_name ON iteration_values (name, workload, run_id, value);
+
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    workload TEXT,
+    iteration INTEGER,
+    metric TEXT NOT NULL,
+    name TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS series_key ON series (metric, name, workload, run_id);
+
+-- Series samples in chunks, encoded like columnar results files
+CREATE TABLE IF NOT EXISTS chunks (
+    series_id INTEGER NOT NULL REFERENCES series (id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    first_ts REAL,
+    last_ts REAL,
+    count INTEGER NOT NULL,
+    ts BLOB,
+    encoding TEXT NOT NULL,
+    "values" BLOB NOT NULL,
+    PRIMARY KEY (series_id, seq)
+);
+"""
+
+
+class ResultsIndex:
+    """
+    SQLite store of imported results files, indexed for queries
+    across many runs without opening any results file.
+    """
+
+    def __init__(self, path: str = defaultPath) -> None:
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(schema)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def importFile(self, path: str) -> bool:
+        """
+        Import a results file, replacing an older import of the same
+        path. Returns False if the file is unchanged since its last import.
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        row = self.db.execute("SELECT id, mtime_ns, size FROM runs WHERE path = ?", (path,)).fetchone()
+        if row is not None and (row["mtime_ns"], row["size"]) == (st.st_mtime_ns, st.st_size):
+            return False
+
+        start = time.perf_counter()
+        with self.db, load(path) as result:
+            if row is not None:
+                self.db.execute("DELETE FROM runs WHERE id = ?", (row["id"],))
+            runId = self._insertRun(path, st, result)
+            self._insertIterations(runId, result)
+            self._insertSeries(runId, result)
+        log.debug(f"Imported '{path}' in {time.perf_counter() - start:.3f}s")
+        return True
+
+    def importFiles(self, paths: List[str]) -> int:
+        imported = 0
+        for path in paths:
+            try:
+                imported += self.importFile(path)
+            except (OSError, ValueError) as e:
+                log.warning(f"Skipping '{path}': {e}")
+        return imported
+
+    def _insertRun(self, path: str, st: os.stat_result, result: ResultFile) -> int:
+        meta = result.metadata
+        started = meta.get("started")
+        if started is None:
+            # Files written before runs recorded their start time
+            started = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(st.st_mtime))
+        affinity = meta.get("affinity")
+        cursor = self.db.execute(
+            "INSERT INTO runs (path, mtime_ns, size, started, action, config, uname, host, agent, affinity, metadata)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                path,
+                st.st_mtime_ns,
+                st.st_size,
+                started,
+                meta.get("action"),
+                meta.get("config", meta.get("name")),
+                meta.get("uname"),
+                meta.get("host"),
+                meta.get("agent"),
+                json.dumps(affinity) if affinity is not None else None,
+                json.dumps(meta, default=jsonDefault),
+            ),
+        )
+        return cursor.lastrowid
+
+    def _insertIterations(self, runId: int, result: ResultFile) -> None:
+        rows, values = [], []
+        for r in result.records("iteration"):
+            workload, iteration = r["workload"], r["iteration"]
+            rows.append((runId, workload, iteration, r.get("time"), r.get("status", 0)))
+
+            scalars = {"time": r.get("time")}
+            for stat, v in r.get("rusage", {}).items():
+                scalars[f"rusage/{stat}"] = v
+            for name, value in r.get("metrics", {}).get("derived", {}).items():
+                if isinstance(value, dict):
+                    scalars.update({f"derived/{name}/{k}": v for k, v in value.items()})
+                else:
+                    scalars[f"derived/{name}"] = value
+            for name, v in scalars.items():
+                if isinstance(v, numbers.Real) and not isinstance(v, bool):
+                    values.append((runId, workload, iteration, name, v))
+
+        self.db.executemany("INSERT OR REPLACE INTO iterations VALUES (?, ?, ?, ?, ?)", rows)
+        self.db.executemany("INSERT INTO iteration_values VALUES (?, ?, ?, ?, ?)", values)
+
+    def _insertSeries(self, runId: int, result: ResultFile) -> None:
+        for key in result.keys():
+            ts, values = result.series(*key)
+            cursor = self.db.execute(
+                "INSERT INTO series (run_id, workload, iteration, metric, name, count) VALUES (?, ?, ?, ?, ?, ?)",
+                (runId, key.workload, key.iteration, key.metric, key.series, len(values)),
+            )
+            seriesId = cursor.lastrowid
+
+            chunks = []
+            for seq, i in enumerate(range(0, len(values), chunkSize)):
+                chunkValues = values[i : i + chunkSize]
+                encoding, data = core.columnar.encodeColumn(chunkValues)
+                chunkTs, tsData, first, last = None, None, None, None
+                if ts is not None:
+                    chunkTs = ts[i : i + chunkSize]
+                    tsData = core.columnar.encodeInts([round(t * 1e6) for t in chunkTs])
+                    first, last = chunkTs[0], chunkTs[-1]
+                chunks.append((seriesId, seq, first, last, len(chunkValues), tsData, encoding, data))
+            self.db.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?, ?)", chunks)
+
+            if len(values) and all(isinstance(v, numbers.Real) and not isinstance(v, bool) for v in values):
+                self.db.execute(
+                    "INSERT INTO iteration_values VALUES (?, ?, ?, ?, ?)",
+                    (runId, key.workload, key.iteration, f"{key.metric}/{key.series}", fmean(values)),
+                )
+
+    @staticmethod
+    def _filters(filters: Dict[str, str | None]) -> Tuple[str, List[Any]]:
+        # Substring matches on run metadata, e.g. a branch name in 'uname'
+        clauses, params = [], []
+        for column in ("uname", "config", "host"):
+            if filters.get(column):
+                clauses.append(f"runs.{column} LIKE ?")
+                params.append(f"%{filters[column]}%")
+        return "".join(f" AND {c}" for c in clauses), params
+
+    def runs(self, workload: str | None = None, **filters) -> List[Dict[str, Any]]:
+        where, params = ResultsIndex._filters(filters)
+        if workload is not None:
+            where += " AND runs.id IN (SELECT run_id FROM iterations WHERE workload = ?)"
+            params.append(workload)
+        rows = self.db.execute(
+            "SELECT id, path, started, action, config, uname, host FROM runs"
+            f" WHERE 1 {where} ORDER BY started",
+            params,
+        )
+        return [dict(r) for r in rows]
+
+    def names(self, workload: str | None = None, name: str | None = None) -> List[Tuple[str | None, str]]:
+        """
+        Every (workload, value name) pair with indexed values.
+        """
+        query = "SELECT DISTINCT workload, name FROM iteration_values WHERE 1"
+        params = []
+        if workload is not None:
+            query += " AND workload = ?"
+            params.append(workload)
+        if name is not None:
+            query += " AND name = ?"
+            params.append(name)
+        return [(r["workload"], r["name"]) for r in self.db.execute(query + " ORDER BY workload, name", params)]
+
+    def trend(self, workload: str | None, name: str = "time", limit: int | None = None, **filters) -> List[Dict[str, Any]]:
+        """
+        Per-run statistics of an iteration value, e.g. 'time',
+        'rusage/maxrss' or 'sysctl/vm.pmap.pde.promotions', oldest run first.
+        """
+        where, params = ResultsIndex._filters(filters)
+        query = (
+            "SELECT runs.id AS run, runs.started, runs.uname, runs.host, runs.path,"
+            " COUNT(v.value) AS n, AVG(v.value) AS mean, MIN(v.value) AS min, MAX(v.value) AS max"
+            " FROM iteration_values AS v JOIN runs ON runs.id = v.run_id"
+            f" WHERE v.name = ? AND v.workload IS ? {where}"
+            " GROUP BY runs.id ORDER BY runs.started DESC"
+        )
+        params = [name, workload] + params
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [dict(r) for r in reversed(self.db.execute(query, params).fetchall())]
+
+    def series(self, runId: int, workload: str | None, iteration: int | None, metric: str, name: str) -> Tuple[Any, Any]:
+        """
+        Read back a stored series as (timestamps, values) columns.
+        """
+        row = self.db.execute(
+            "SELECT id FROM series WHERE run_id = ? AND workload IS ? AND iteration IS ? AND metric = ? AND name = ?",
+            (runId, workload, iteration, metric, name),
+        ).fetchone()
+        if row is None:
+            raise KeyError((runId, workload, iteration, metric, name))
+
+        ts, values = array("d"), None
+        for chunk in self.chunks(row["id"]):
+            if chunk["ts"] is not None:
+                ts.extend(t / 1e6 for t in core.columnar.decodeInts(chunk["ts"]))
+            chunkValues = core.columnar.decodeColumn(chunk["encoding"], chunk["values"])
+            if values is None:
+                values = chunkValues
+            else:
+                try:
+                    values.extend(chunkValues)
+                except TypeError:
+                    values = list(values) + list(chunkValues)
+        return ts, values if values is not None else []
+
+    def chunks(self, seriesId: int) -> Iterator[sqlite3.Row]:
+        yield from self.db.execute("SELECT * FROM chunks WHERE series_id = ? ORDER BY seq", (seriesId,))
+
+
+def formatTrend(rows: List[Dict[str, Any]]) -> str:
+    header = ("run", "started", "n", "mean", "min", "max", "uname")
+    table = [header] + [
+        (
+            str(r["run"]),
+            r["started"] or "",
+            str(r["n"]),
+            f"{r['mean']:.6g}",
+            f"{r['min']:.6g}",
+            f"{r['max']:.6g}",
+            r["uname"] or "",
+        )
+        for r in rows
+    ]
+    widths = [max(len(row[i]) for row in table) for i in range(len(header))]
+    return "\n".join(
+        "  ".join(col.ljust(w) for col, w in zip(row, widths)).rstrip() for row in table
+    )
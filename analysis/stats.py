@@ -0,0 +1,188 @@
+import math
+import random
+import operator
+import functools
+
+from statistics import fmean, median, stdev
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Two-sided 95% Student's t quantiles for 1-30 degrees of freedom
+tQuantiles95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]
+
+
+def tQuantile95(df: int) -> float:
+    if df < 1:
+        return math.inf
+    if df <= len(tQuantiles95):
+        return tQuantiles95[df - 1]
+    return 1.96
+
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+    n = len(values)
+    return {
+        "n": n,
+        "mean": fmean(values) if n else math.nan,
+        "median": median(values) if n else math.nan,
+        "stdev": stdev(values) if n > 1 else 0.0,
+        "min": min(values) if n else math.nan,
+        "max": max(values) if n else math.nan,
+    }
+
+
+def meanCI(values: Sequence[float]) -> Tuple[float, float]:
+    """
+    95% confidence interval of the mean, based on Student's t.
+    """
+    n = len(values)
+    mean = fmean(values)
+    if n < 2:
+        return (-math.inf, math.inf)
+    half = tQuantile95(n - 1) * stdev(values) / math.sqrt(n)
+    return (mean - half, mean + half)
+
+
+def welchDiffCI(a: Sequence[float], b: Sequence[float]) -> Tuple[float, float]:
+    """
+    95% confidence interval of mean(b) - mean(a) from Welch's t, cheap
+    enough for the long samples bootstrapping would be too slow for.
+    """
+    na, nb = len(a), len(b)
+    if na < 2 or nb < 2:
+        return (-math.inf, math.inf)
+    va, vb = stdev(a) ** 2 / na, stdev(b) ** 2 / nb
+    diff = fmean(b) - fmean(a)
+    if va + vb == 0:
+        return (diff, diff)
+    # Welch-Satterthwaite degrees of freedom
+    df = (va + vb) ** 2 / (va**2 / (na - 1) + vb**2 / (nb - 1))
+    half = tQuantile95(int(df)) * math.sqrt(va + vb)
+    return (diff - half, diff + half)
+
+
+@functools.cache
+def _resamplers(n: int, resamples: int, seed: int) -> List[Callable]:
+    """
+    Getters picking 'n' random indices with replacement, one per
+    bootstrap resample. They are shared by all samples of the same
+    size, so comparing many series costs one C-level gather per
+    resample and series.
+    """
+    rng = random.Random(seed)
+    return [
+        operator.itemgetter(*(rng.randrange(n) for _ in range(n)))
+        for _ in range(resamples)
+    ]
+
+
+def bootstrapDiffCI(
+    a: Sequence[float], b: Sequence[float], resamples: int = 1000, seed: int = 0
+) -> Tuple[float, float]:
+    """
+    Percentile bootstrap 95% confidence interval of mean(b) - mean(a).
+    """
+    na, nb = len(a), len(b)
+    if na < 2 or nb < 2:
+        return (-math.inf, math.inf)
+
+    a = list(a)
+    b = list(b)
+    sumsA = [sum(g(a)) for g in _resamplers(na, resamples, seed)]
+    sumsB = [sum(g(b)) for g in _resamplers(nb, resamples, seed + 1)]
+    diffs = sorted([sb / nb - sa / na for sa, sb in zip(sumsA, sumsB)])
+    return (diffs[int(0.025 * (resamples - 1))], diffs[int(0.975 * (resamples - 1))])
+
+
+def _ranks(values: List[float]) -> Tuple[List[float], List[int]]:
+    """
+    Average ranks of 'values' and the sizes of all tie groups.
+    """
+    order = sorted(range(len(values)), key=values.__getitem__)
+    ranks = [0.0] * len(values)
+    ties = []
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        rank = (i + j) / 2 + 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = rank
+        if j > i:
+            ties.append(j - i + 1)
+        i = j + 1
+    return ranks, ties
+
+
+@functools.cache
+def _exactUDistribution(n1: int, n2: int) -> List[int]:
+    """
+    Number of orderings of n1 + n2 distinct values yielding each U value.
+    """
+    dist = [[[1]] * (n2 + 1)] + [[[1]] + [None] * n2 for _ in range(n1)]
+    for i in range(1, n1 + 1):
+        for j in range(1, n2 + 1):
+            row = [0] * (i * j + 1)
+            # The largest value is from the first sample and beats all j others
+            for u, c in enumerate(dist[i - 1][j]):
+                row[u + j] += c
+            # The largest value is from the second sample
+            for u, c in enumerate(dist[i][j - 1]):
+                row[u] += c
+            dist[i][j] = row
+    return dist[n1][n2]
+
+
+def mannWhitneyU(a: Sequence[float], b: Sequence[float]) -> Tuple[float, float]:
+    """
+    Two-sided Mann-Whitney U test. Returns U of the first sample and
+    the p-value, exact for small samples without ties and from the
+    tie-corrected normal approximation otherwise.
+    """
+    n1, n2 = len(a), len(b)
+    if n1 == 0 or n2 == 0:
+        return (math.nan, math.nan)
+
+    ranks, ties = _ranks(list(a) + list(b))
+    u1 = sum(ranks[:n1]) - n1 * (n1 + 1) / 2
+    mu = n1 * n2 / 2
+
+    if not ties and n1 * n2 <= 400:
+        dist = _exactUDistribution(n1, n2)
+        total = sum(dist)
+        k = int(min(u1, n1 * n2 - u1))
+        p = 2 * sum(dist[: k + 1]) / total
+        return (u1, min(p, 1.0))
+
+    n = n1 + n2
+    tieTerm = sum(t**3 - t for t in ties) / (n * (n - 1))
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tieTerm))
+    if sigma == 0:
+        return (u1, 1.0)
+    z = (abs(u1 - mu) - 0.5) / sigma
+    return (u1, min(math.erfc(max(z, 0) / math.sqrt(2)), 1.0))
+
+
+def cliffsDelta(a: Sequence[float], b: Sequence[float], u1: float | None = None) -> float:
+    """
+    Cliff's delta of b relative to a: P(b > a) - P(b < a).
+    """
+    if u1 is None:
+        u1, _ = mannWhitneyU(a, b)
+    # U of the first sample counts pairs where a > b
+    return 1 - 2 * u1 / (len(a) * len(b))
+
+
+def hedgesG(a: Sequence[float], b: Sequence[float]) -> float:
+    n1, n2 = len(a), len(b)
+    if n1 < 2 or n2 < 2:
+        return math.nan
+    pooled = math.sqrt(((n1 - 1) * stdev(a) ** 2 + (n2 - 1) * stdev(b) ** 2) / (n1 + n2 - 2))
+    if pooled == 0:
+        return 0.0
+    correction = 1 - 3 / (4 * (n1 + n2) - 9)
+    return (fmean(b) - fmean(a)) / pooled * correction
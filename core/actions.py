@@ -0,0 +1,103 @@
+import os
+import logging as log
+
+from datetime import datetime
+from threading import Event
+from typing import Any, Dict, Tuple, Type
+
+import util.affinity
+
+from core.benchmark import BenchmarkRegistry
+from core.workload import WorkloadRegistry
+from core.metric import MetricRegistry
+from core.config import RunConfig
+from core.results import ResultSink
+from core.columnar import BinaryResultSink
+
+
+def sinkClass(config: RunConfig) -> Tuple[Type[ResultSink], str]:
+    """
+    Return the results sink class and file extension for the configured format.
+    """
+    return {
+        "json": (ResultSink, "jsonl"),
+        "binary": (BinaryResultSink, "kbc"),
+    }[config.format]
+
+
+def metadata(config: RunConfig) -> Dict[str, Any]:
+    configName = os.path.splitext(os.path.basename(config.configPath))[0]
+    return {
+        "action": config.action,
+        "config": configName,
+        "uname": os.uname().version,
+        "started": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def build(config: RunConfig) -> None:
+    # Load all benchmarks and register them
+    BenchmarkRegistry.loadBenchmarks("./benchmarks")
+    WorkloadRegistry.loadWorkloads("./workloads", config.benchmarkSet)
+    BenchmarkRegistry.buildBenchmarks(config.benchmarkSet, config.buildJobs)
+
+
+def run(config: RunConfig, sink: ResultSink, metadata: Dict[str, Any]) -> None:
+    """
+    Build and run the configured workloads, streaming results to 'sink'.
+    """
+    # Load all benchmarks and register them
+    BenchmarkRegistry.loadBenchmarks("./benchmarks")
+    WorkloadRegistry.loadWorkloads("./workloads", config.benchmarkSet)
+
+    # Load specified metrics
+    MetricRegistry.loadMetrics(config.metricsPath)
+    BenchmarkRegistry.buildBenchmarks(WorkloadRegistry.targetBenchmarks, config.buildJobs)
+
+    # Keep kbench and its sampler off the benchmark's CPUs. Only
+    # done after building, which should use every CPU.
+    affinity = util.affinity.defaultBackend()
+    workloadCpus = config.workloadCpus
+    if config.housekeepingCpus:
+        if workloadCpus is None:
+            workloadCpus = affinity.getAffinity(0) - config.housekeepingCpus
+            if not workloadCpus:
+                raise ValueError("No CPUs left for workloads besides the housekeeping CPUs")
+        affinity.setAffinity(0, config.housekeepingCpus)
+    WorkloadRegistry.cpus = workloadCpus
+    WorkloadRegistry.numaDomain = config.numaDomain
+    metadata["affinity"] = {
+        "kbench_cpus": util.affinity.formatCpus(affinity.getAffinity(0)),
+        "workload_cpus": util.affinity.formatCpus(workloadCpus) if workloadCpus else None,
+        "numa_domain": config.numaDomain,
+    }
+
+    # Stream results as each iteration finishes
+    sink.writeMetadata(metadata)
+    WorkloadRegistry.runWorkloads(sink, config.concurrent)
+
+
+def monitor(
+    config: RunConfig,
+    sink: ResultSink,
+    metadata: Dict[str, Any],
+    stopEvent: Event,
+    flushInterval: float | None = None,
+) -> None:
+    """
+    Sample the configured metrics until 'stopEvent' is set, moving
+    samples to 'sink' every 'flushInterval' seconds (by default the
+    configured flush interval).
+    """
+    MetricRegistry.loadMetrics(config.metricsPath)
+    if flushInterval is None:
+        flushInterval = config.flushInterval
+
+    sink.writeMetadata(metadata)
+    MetricRegistry.startSamplingThreads()
+    # Periodically move samples from memory to the sink
+    while not stopEvent.wait(flushInterval):
+        sink.writeSamples(MetricRegistry.fetchResults(), MetricRegistry.fetchOverhead())
+    MetricRegistry.stopSamplingThreads()
+    sink.writeSamples(MetricRegistry.fetchResults(), MetricRegistry.fetchOverhead())
+    log.debug("Stopped monitoring")
@@ -1,17 +1,20 @@
 import os
-import imp
+import json
+import time
 import glob
 import tomllib
-import cerberus
+import importlib.util
 import logging as log
 
-from typing import Set, Dict
+from typing import Set, Dict, List
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from jinja2 import Template
 
 import core
+import core.config
 import core.setup as setup
 from core import runners
-from util.os import pushd
+from core.buildcache import BuildManifest
 
 
 class BenchmarkBase:
@@ -25,16 +28,9 @@ class BenchmarkBase:
         cwd = os.path.abspath(cwd)
         log.debug(f"Processing {cwd}")
         # Process the configuration file
-        config = None
-        with open(os.path.join(cwd, "config.toml")) as file:
-            config = tomllib.loads(file.read())
-
-        v = cerberus.Validator(core.schemas.bench_conf.schema)
-        if not v.validate(config):
-            raise ValueError(f"{cwd}: invalid benchmark configuration: {v.errors}")
-        config = v.normalized(config)
-        print(config)
+        config = core.config.ConfigLoader.load(os.path.join(cwd, "config.toml"), "benchmark")
         # Populate basic benchmark info
+        self.config = config
         self.path = cwd
         self.name = config["info"]["name"]
         self.desc = config["info"]["description"]
@@ -54,7 +50,9 @@ class BenchmarkBase:
             self.srcFileHandler = None
             match config["src"]:
                 case {"fetch": {"url": url}}:
-                    self.srcFileHandler = setup.FetchSrcHandler(url, cwd)
+                    self.srcFileHandler = setup.FetchSrcHandler(
+                        url, cwd, config["src"]["fetch"].get("sha256")
+                    )
                 case {"git": {"url": url}}:
                     self.srcFileHandler = setup.GitSrcHandler(url, cwd)
 
@@ -69,46 +67,196 @@ class BenchmarkBase:
     def postRun(self):
         pass
 
-    # For every class that inherits from the current,
-    # the class name will be added to plugins
-    def __init_subclass__(cls, **kwargs) -> None:
-        super().__init_subclass__(**kwargs)
-        inst = cls()
-        BenchmarkRegistry.registry[inst.name] = inst
-
 
 class BenchmarkRegistry:
+    # Instantiated benchmarks
     registry: Dict[str, BenchmarkBase] = dict()
+    # Benchmark name -> location of its config and module
+    index: Dict[str, Dict] = dict()
+    indexFilename = ".kbench-index.json"
+
+    @staticmethod
+    def _mtime(path: str) -> int:
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _listFiles(benchmarkDir: str) -> List[str]:
+        return sorted(
+            glob.glob(os.path.join(benchmarkDir, "*", "config.toml"))
+            + glob.glob(os.path.join(benchmarkDir, "*", "*.py"))
+        )
+
+    @staticmethod
+    def _indexValid(cached: Dict, benchmarkDir: str) -> bool:
+        # Benchmarks were added or removed
+        if cached.get("files") != BenchmarkRegistry._listFiles(benchmarkDir):
+            return False
+        for entry in cached["benchmarks"].values():
+            for path, mtime in entry["mtimes"].items():
+                if BenchmarkRegistry._mtime(path) != mtime:
+                    return False
+        return True
+
+    @staticmethod
+    def _buildIndex(benchmarkDir: str) -> Dict:
+        """
+        Map benchmark names to their directory and module using only
+        the 'config.toml' files, without importing anything.
+        """
+        files = BenchmarkRegistry._listFiles(benchmarkDir)
+        index = {"files": files, "benchmarks": {}}
+        for configPath in glob.glob(os.path.join(benchmarkDir, "*", "config.toml")):
+            path = os.path.dirname(configPath)
+            modules = glob.glob(os.path.join(path, "*.py"))
+            if not modules:
+                continue
+
+            with open(configPath, mode="rb") as file:
+                name = tomllib.load(file)["info"]["name"]
+            mtimes = {p: BenchmarkRegistry._mtime(p) for p in [configPath, *modules]}
+            index["benchmarks"][name] = {"path": path, "module": modules[0], "mtimes": mtimes}
+        return index
 
     @staticmethod
     def loadBenchmarks(benchmarkDir):
-        insts = list()
+        """
+        Load the benchmark index, rebuilding it if any benchmark
+        directory, config or module changed since it was written.
+        Benchmarks themselves are only instantiated once requested.
+        """
+        benchmarkDir = os.path.abspath(benchmarkDir)
+        indexPath = os.path.join(benchmarkDir, BenchmarkRegistry.indexFilename)
+
+        cached = None
+        try:
+            with open(indexPath) as file:
+                cached = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+        if cached is None or not BenchmarkRegistry._indexValid(cached, benchmarkDir):
+            log.debug(f"Rebuilding benchmark index for '{benchmarkDir}'")
+            cached = BenchmarkRegistry._buildIndex(benchmarkDir)
+            try:
+                with open(indexPath + ".tmp", "w") as file:
+                    json.dump(cached, file)
+                os.replace(indexPath + ".tmp", indexPath)
+            except OSError as e:
+                log.warning(f"Unable to write benchmark index: {e}")
 
-        for path in glob.glob(os.path.join(benchmarkDir, "*/*")):
-            modname, ext = os.path.splitext(os.path.basename(path))
-            if ext == ".py":
-                file, path, descr = imp.find_module(modname, [os.path.dirname(path)])
-                if file:
-                    imp.load_module(modname, file, path, descr)
+        BenchmarkRegistry.index.update(cached["benchmarks"])
 
     @staticmethod
     def getLoadedBenchmarkNames() -> Set[str]:
-        return set(BenchmarkRegistry.registry.keys())
+        return set(BenchmarkRegistry.index.keys())
 
     @staticmethod
-    def buildBenchmarks(benchmarkSet=None):
-        for benchmark in BenchmarkRegistry.registry.values():
-            if benchmarkSet and benchmark.name not in benchmarkSet:
-                continue
-            with pushd(benchmark.path):
-                # Setup source files, if neccessary
-                if not benchmark.prebuilt and benchmark.srcFileHandler:
-                    if not os.path.isdir("./src"):
-                        os.mkdir("./src")
-                    if len(os.listdir("./src")) == 0:
-                        log.info("Fetching source files for '%s'", benchmark.name)
-                        benchmark.srcFileHandler.run()
-
-                # Run the runner's setup
-                benchmark.runner.setup()
+    def get(name: str) -> BenchmarkBase:
+        """
+        Import, instantiate and validate a benchmark on first use.
+        """
+        if name in BenchmarkRegistry.registry:
+            return BenchmarkRegistry.registry[name]
+        if name not in BenchmarkRegistry.index:
+            raise ValueError(f"Unknown benchmark '{name}'")
+
+        modulePath = BenchmarkRegistry.index[name]["module"]
+        modname = os.path.splitext(os.path.basename(modulePath))[0]
+        spec = importlib.util.spec_from_file_location(modname, modulePath)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        classes = [
+            obj
+            for obj in vars(module).values()
+            if isinstance(obj, type)
+            and issubclass(obj, BenchmarkBase)
+            and obj.__module__ == module.__name__
+        ]
+        if len(classes) != 1:
+            raise ValueError(f"'{modulePath}' must define exactly one benchmark class")
+
+        inst = classes[0]()
+        if inst.name != name:
+            raise ValueError(f"'{modulePath}': expected benchmark '{name}', got '{inst.name}'")
+        BenchmarkRegistry.registry[name] = inst
+        return inst
+
+    @staticmethod
+    def buildBenchmark(benchmark: BenchmarkBase) -> Dict[str, float]:
+        """
+        Run the fetch, unpack and setup stages for a single benchmark
+        and return how long each stage took.
+        """
+        timings = {}
+
+        def stage(name, func):
+            start = time.perf_counter()
+            func()
+            timings[name] = time.perf_counter() - start
+            log.debug(f"'{benchmark.name}': {name} took {timings[name]:.2f}s")
+
+        # Setup source files, if neccessary
+        if not benchmark.prebuilt and benchmark.srcFileHandler:
+            srcdir = os.path.join(benchmark.path, "src")
+            os.makedirs(srcdir, exist_ok=True)
+            if len(os.listdir(srcdir)) == 0:
+                log.info("Fetching source files for '%s'", benchmark.name)
+                stage("fetch", benchmark.srcFileHandler.fetch)
+                stage("unpack", benchmark.srcFileHandler.unpack)
+
+        # Skip the runner's setup if nothing it depends on changed
+        # and what it set up last time is still there
+        manifest = BuildManifest(benchmark)
+        rebuild, reason, components = manifest.check()
+        if not rebuild:
+            try:
+                benchmark.runner.verify()
+            except FileNotFoundError as e:
+                rebuild, reason = True, str(e)
+        if rebuild:
+            log.info(f"Building '{benchmark.name}': {reason}")
+            stage("setup", benchmark.runner.setup)
+        else:
+            log.info(f"Skipping build of '{benchmark.name}': {reason}")
+        manifest.save(rebuild, reason, components)
+        return timings
+
+    @staticmethod
+    def buildBenchmarks(benchmarkSet=None, jobs=None) -> Dict[str, Dict[str, float]]:
+        """
+        Build benchmarks concurrently, using at most 'jobs' workers.
+        Returns per-stage timings for every benchmark.
+        """
+        benchmarks = [
+            BenchmarkRegistry.get(name)
+            for name in sorted(BenchmarkRegistry.index)
+            if not benchmarkSet or name in benchmarkSet
+        ]
+        if jobs is None:
+            jobs = core.config.Defaults.buildJobs
+
+        timings = {}
+        errors = []
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+            futures = {pool.submit(BenchmarkRegistry.buildBenchmark, b): b for b in benchmarks}
+            for future in as_completed(futures):
+                benchmark = futures[future]
+                try:
+                    timings[benchmark.name] = future.result()
+                except Exception as e:
+                    log.error(f"Failed to build '{benchmark.name}': {e}")
+                    errors.append(e)
+                    continue
+                log.info(
+                    "Built '%s' (%s)",
+                    benchmark.name,
+                    ", ".join(f"{k}: {v:.2f}s" for k, v in timings[benchmark.name].items()),
+                )
 
+        if errors:
+            raise errors[0]
+        return timings
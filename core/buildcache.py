@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import hashlib
+import functools
+import subprocess
+import logging as log
+
+from typing import Any, Dict, Tuple
+
+# Environment variables that influence how benchmarks get built
+buildEnvVars = ["CC", "CXX", "CFLAGS", "CXXFLAGS", "LDFLAGS", "MAKEFLAGS", "MAKEOBJDIRPREFIX", "SRCCONF"]
+
+
+def _hash(obj: Any) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()
+
+
+@functools.cache
+def toolchainVersion() -> str:
+    cc = os.environ.get("CC", "cc")
+    try:
+        result = subprocess.run(
+            [cc, "--version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return result.stdout.decode(errors="replace").strip()
+
+
+class BuildManifest:
+    """
+    Record of a benchmark's last successful build, stored next to its
+    './src' directory. A build is skipped when the fingerprint of its
+    config, sources, toolchain and environment is unchanged. Sources are
+    identified by their archive's checksum or git revision, never by
+    walking the source tree.
+    """
+
+    filename = ".kbench-build.json"
+
+    def __init__(self, benchmark) -> None:
+        self.benchmark = benchmark
+        self.path = os.path.join(benchmark.path, BuildManifest.filename)
+
+    def components(self) -> Dict[str, str]:
+        runnerEnv = getattr(self.benchmark.runner, "envvar", None) or {}
+        return {
+            "config": _hash(self.benchmark.config),
+            "source": _hash(self.source()),
+            "toolchain": _hash(toolchainVersion()),
+            "environment": _hash(
+                {
+                    "runner": runnerEnv,
+                    "host": {k: os.environ.get(k) for k in buildEnvVars},
+                }
+            ),
+        }
+
+    def source(self) -> Dict[str, Any]:
+        if self.benchmark.prebuilt:
+            return {"prebuilt": True}
+        handler = self.benchmark.srcFileHandler
+        return {"url": handler.url, "digest": handler.digest()}
+
+    def load(self) -> Dict[str, Any] | None:
+        try:
+            with open(self.path) as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def check(self) -> Tuple[bool, str, Dict[str, str]]:
+        """
+        Return whether the benchmark needs to be rebuilt, why,
+        and the current fingerprint components.
+        """
+        manifest = self.load()
+        current = self.components()
+        if manifest is None:
+            return True, "no previous build", current
+
+        changed = [k for k, v in current.items() if manifest["components"].get(k) != v]
+        if changed:
+            return True, f"{', '.join(changed)} changed", current
+        return False, "unchanged", current
+
+    def save(self, rebuilt: bool, reason: str, components: Dict[str, str] | None = None) -> None:
+        now = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        manifest = self.load() or {}
+        if rebuilt:
+            manifest["built"] = now
+        manifest.update(
+            {
+                "benchmark": self.benchmark.name,
+                "fingerprint": _hash(components),
+                "components": components,
+                "toolchain": toolchainVersion(),
+                "rebuilt": rebuilt,
+                "reason": reason,
+                "checked": now,
+            }
+        )
+        with open(self.path + ".tmp", "w") as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(self.path + ".tmp", self.path)
+        log.debug(f"'{self.benchmark.name}': wrote build manifest ({reason})")
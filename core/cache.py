@@ -0,0 +1,198 @@
+import os
+import shutil
+import hashlib
+import pathlib
+import subprocess
+import urllib.request
+import logging as log
+
+from threading import Lock
+from typing import Dict, List
+
+
+class CacheMissError(Exception):
+    pass
+
+
+class SourceCache:
+    """
+    Content-addressed cache for downloaded source archives and git
+    mirrors, shared by all benchmarks on a host.
+
+    Archives are keyed by the hash of their URL and the SHA-256 checksum
+    declared in the benchmark config, if any, so a changed checksum never
+    reuses an older download. The checksum of every archive is recorded
+    with its size and mtime; a cache hit is only hashed again if those
+    changed or 'verify' is set. Git mirrors are keyed by their URL.
+    """
+
+    root: str = os.environ.get(
+        "KBENCH_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "kbench")
+    )
+    offline: bool = False
+    # Hash every cached archive again before using it
+    verify: bool = False
+    chunkSize = 1 << 20
+
+    _lock = Lock()
+    _keyLocks: Dict[str, Lock] = {}
+
+    @staticmethod
+    def configure(root: str | None = None, offline: bool = False, verify: bool = False) -> None:
+        if root:
+            SourceCache.root = os.path.abspath(os.path.expanduser(root))
+        SourceCache.offline = offline
+        SourceCache.verify = verify
+        log.debug(f"Source cache: '{SourceCache.root}' (offline: {offline}, verify: {verify})")
+
+    @staticmethod
+    def _key(url: str, sha256: str | None = None) -> str:
+        if sha256:
+            url = f"{url}#sha256={sha256.lower()}"
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    @staticmethod
+    def _keyLock(key: str) -> Lock:
+        # Serialize concurrent builds asking for the same entry
+        with SourceCache._lock:
+            return SourceCache._keyLocks.setdefault(key, Lock())
+
+    @staticmethod
+    def _hashFile(path: str) -> str:
+        h = hashlib.sha256()
+        with open(path, "rb") as file:
+            while chunk := file.read(SourceCache.chunkSize):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def _record(path: str, digestPath: str, digest: str) -> None:
+        # Checksum followed by the size and mtime it was computed for
+        st = os.stat(path)
+        with open(digestPath, "w") as file:
+            file.write(f"{digest} {st.st_size} {st.st_mtime_ns}\n")
+
+    @staticmethod
+    def _readRecord(digestPath: str) -> List[str]:
+        # Entries cached before sizes and mtimes were recorded
+        # only hold the checksum
+        with open(digestPath) as file:
+            return file.read().split()
+
+    @staticmethod
+    def _verify(url: str, path: str, digestPath: str, sha256: str | None) -> bool:
+        try:
+            st = os.stat(path)
+            recorded, *stamp = SourceCache._readRecord(digestPath)
+        except (OSError, ValueError):
+            return False
+        if sha256 is not None and recorded != sha256.lower():
+            digest = None
+        elif not SourceCache.verify and stamp == [str(st.st_size), str(st.st_mtime_ns)]:
+            return True
+        else:
+            # Re-hash the archive, it may have been truncated or modified
+            digest = SourceCache._hashFile(path)
+        if digest == recorded:
+            SourceCache._record(path, digestPath, digest)
+            return True
+        log.warning(f"Cached '{url}' is corrupt, discarding it")
+        os.remove(path)
+        os.remove(digestPath)
+        return False
+
+    @staticmethod
+    def fetch(url: str, sha256: str | None = None) -> str:
+        """
+        Return the path of the cached archive for 'url', downloading it first if needed.
+        """
+        key = SourceCache._key(url, sha256)
+        entry = os.path.join(SourceCache.root, "downloads", key[:2], key)
+        path = os.path.join(entry, pathlib.Path(url).name)
+        digestPath = path + ".sha256"
+        partPath = path + ".part"
+
+        with SourceCache._keyLock(key):
+            if SourceCache._verify(url, path, digestPath, sha256):
+                log.info(f"Using cached '{url}'")
+                return path
+
+            if SourceCache.offline:
+                raise CacheMissError(f"'{url}' is not cached and offline mode is enabled")
+
+            os.makedirs(entry, exist_ok=True)
+            try:
+                digest = SourceCache._download(url, partPath)
+                if sha256 and digest != sha256.lower():
+                    raise ValueError(
+                        f"Checksum mismatch for '{url}': expected {sha256}, got {digest}"
+                    )
+            except BaseException:
+                # Never leave a partial download behind
+                if os.path.exists(partPath):
+                    os.remove(partPath)
+                raise
+
+            os.replace(partPath, path)
+            SourceCache._record(path, digestPath, digest)
+            return path
+
+    @staticmethod
+    def cachedDigest(url: str, sha256: str | None = None) -> str | None:
+        """
+        Return the recorded SHA-256 checksum of the cached archive for
+        'url' without verifying it, or None if it is not cached.
+        """
+        key = SourceCache._key(url, sha256)
+        path = os.path.join(SourceCache.root, "downloads", key[:2], key, pathlib.Path(url).name)
+        try:
+            return SourceCache._readRecord(path + ".sha256")[0]
+        except (FileNotFoundError, IndexError):
+            return None
+
+    @staticmethod
+    def _download(url: str, path: str) -> str:
+        """
+        Stream 'url' to 'path', hashing it on the fly.
+        """
+        log.info(f"Downloading '{url}'")
+        h = hashlib.sha256()
+        with urllib.request.urlopen(url) as response, open(path, "wb") as file:
+            total = int(response.headers.get("Content-Length") or 0)
+            done = 0
+            nextReport = 0.1
+            while chunk := response.read(SourceCache.chunkSize):
+                file.write(chunk)
+                h.update(chunk)
+                done += len(chunk)
+                if total and done / total >= nextReport:
+                    log.info(f"'{pathlib.Path(url).name}': {done * 100 // total}% downloaded")
+                    nextReport += 0.1
+        return h.hexdigest()
+
+    @staticmethod
+    def mirror(url: str) -> str:
+        """
+        Return the path of a bare mirror of the git repository at 'url',
+        creating or updating it first.
+        """
+        key = SourceCache._key(url)
+        path = os.path.join(SourceCache.root, "git", key[:2], key)
+
+        with SourceCache._keyLock(key):
+            if os.path.isdir(path):
+                if not SourceCache.offline:
+                    log.info(f"Updating git mirror of '{url}'")
+                    subprocess.run(["git", "-C", path, "remote", "update", "--prune"], check=True)
+                return path
+
+            if SourceCache.offline:
+                raise CacheMissError(f"'{url}' is not cached and offline mode is enabled")
+
+            log.info(f"Mirroring git repo '{url}'")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Left behind by an interrupted clone
+            shutil.rmtree(path + ".part", ignore_errors=True)
+            subprocess.run(["git", "clone", "--mirror", url, path + ".part"], check=True)
+            os.replace(path + ".part", path)
+            return path
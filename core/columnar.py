@@ -0,0 +1,343 @@
+import os
+import sys
+import json
+import zlib
+import struct
+import operator
+import itertools
+import logging as log
+
+from array import array
+from typing import Any, Dict, Iterator, List, Tuple
+
+import core.results
+
+from core.series import jsonDefault
+
+
+# File layout:
+#   magic | block* | zlib(json(index)) | footer
+# Each block is a little-endian u32 header length, a JSON header and
+# the payload described by the header. The footer holds the offset of
+# the index so readers can jump straight to the blocks they need.
+magic = b"KBC1"
+footer = struct.Struct("<Q4s")
+footerMagic = b"KBCI"
+blockHeader = struct.Struct("<I")
+
+
+# Fixed-width delta columns start with this tag, anything else is a
+# zlib stream of zigzag varints
+deltaTag = b"D"
+deltaHeader = struct.Struct("<qc")
+# Narrowest array type codes first
+deltaTypecodes = "bhiq"
+
+
+def _encodeDeltas(values) -> bytes | None:
+    """
+    Store the first value and the deltas between all others in the
+    narrowest fixed-width type they fit, or return None if they do not
+    fit 64 bits.
+    """
+    if not len(values):
+        return deltaTag + zlib.compress(b"")
+    first = values[0]
+    if not -(1 << 63) <= first < 1 << 63:
+        return None
+    try:
+        deltas = array("q", map(operator.sub, values[1:], values[:-1]))
+    except OverflowError:
+        return None
+
+    lo, hi = (min(deltas), max(deltas)) if deltas else (0, 0)
+    for typecode in deltaTypecodes:
+        bits = array(typecode).itemsize * 8
+        if -(1 << (bits - 1)) <= lo and hi < 1 << (bits - 1):
+            break
+    col = array(typecode, deltas)
+    if sys.byteorder != "little":
+        col.byteswap()
+    return deltaTag + zlib.compress(deltaHeader.pack(first, typecode.encode()) + col.tobytes())
+
+
+def _encodeVarints(values) -> bytes:
+    out = bytearray()
+    prev = 0
+    for v in values:
+        delta = v - prev
+        prev = v
+        z = delta << 1 if delta >= 0 else ((-delta) << 1) - 1
+        while z >= 0x80:
+            out.append((z & 0x7F) | 0x80)
+            z >>= 7
+        out.append(z)
+    return zlib.compress(out)
+
+
+def encodeInts(values) -> bytes:
+    """
+    Delta encode integers and compress the result. Deltas are stored
+    at a fixed width so decoding never loops in Python, integers
+    beyond 64 bits fall back to zigzag varints.
+    """
+    data = _encodeDeltas(values)
+    return data if data is not None else _encodeVarints(values)
+
+
+def _decodeDeltas(buf: bytes):
+    if not buf:
+        return array("q")
+    first, typecode = deltaHeader.unpack_from(buf)
+    deltas = array(typecode.decode())
+    deltas.frombytes(buf[deltaHeader.size :])
+    if sys.byteorder != "little":
+        deltas.byteswap()
+    return array("q", itertools.accumulate(deltas, initial=first))
+
+
+def _decodeVarints(buf: bytes):
+    values = []
+    prev = 0
+    z = 0
+    shift = 0
+    for b in buf:
+        z |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+            continue
+        prev += (z >> 1) if not z & 1 else -((z + 1) >> 1)
+        values.append(prev)
+        z = 0
+        shift = 0
+
+    try:
+        return array("q", values)
+    except OverflowError:
+        return values
+
+
+def decodeInts(data: bytes):
+    if data[:1] == deltaTag:
+        return _decodeDeltas(zlib.decompress(data[1:]))
+    return _decodeVarints(zlib.decompress(data))
+
+
+def _encodeFloats(values) -> bytes:
+    col = array("d", values)
+    if sys.byteorder != "little":
+        col.byteswap()
+    return zlib.compress(col.tobytes())
+
+
+def _decodeFloats(data: bytes):
+    col = array("d")
+    col.frombytes(zlib.decompress(data))
+    if sys.byteorder != "little":
+        col.byteswap()
+    return col
+
+
+def encodeColumn(values) -> Tuple[str, bytes]:
+    if isinstance(values, memoryview):
+        values = values.obj if values.obj is not None else values.tolist()
+    if isinstance(values, array):
+        if values.typecode == "d":
+            return "f64", _encodeFloats(values)
+        return "delta", encodeInts(values)
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+        return "delta", encodeInts(values)
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        return "f64", _encodeFloats(values)
+    return "json", zlib.compress(json.dumps(values, default=_jsonBytes).encode())
+
+
+def decodeColumn(encoding: str, data: bytes):
+    match encoding:
+        # Files written before fixed-width deltas name their integer
+        # columns 'varint', decodeInts() tells both apart
+        case "delta" | "varint":
+            return decodeInts(data)
+        case "f64":
+            return _decodeFloats(data)
+        case "us":
+            ts = decodeInts(data)
+            return array("d", map(operator.truediv, ts, itertools.repeat(1e6)))
+        case "json":
+            return json.loads(zlib.decompress(data))
+    raise ValueError(f"Unknown column encoding '{encoding}'")
+
+
+def _jsonBytes(obj: Any) -> Any:
+    if isinstance(obj, bytes):
+        return obj.hex()
+    return jsonDefault(obj)
+
+
+def isSeries(obj: Any) -> bool:
+    return isinstance(obj, dict) and "timestamps" in obj and "values" in obj
+
+
+def splitSeries(obj: Dict[str, Any], path: Tuple[str, ...], out: List) -> Dict[str, Any]:
+    """
+    Return a copy of 'obj' without its series, appending
+    (path, series) pairs for every series found to 'out'.
+    """
+    rest = {}
+    for key, value in obj.items():
+        if isSeries(value):
+            out.append((path + (str(key),), value))
+        elif isinstance(value, dict):
+            rest[key] = splitSeries(value, path + (str(key),), out)
+        else:
+            rest[key] = value
+    return rest
+
+
+class BinaryResultSink(core.results.ResultSink):
+    """
+    Columnar results file.
+
+    Every metric series is written as its own block: integer columns
+    are delta encoded at a fixed width, float columns stored as raw
+    doubles and timestamps quantized to microseconds, all zlib
+    compressed.
+    Everything else in a record goes to a compressed JSON block.
+    """
+
+    def __init__(self, path: str, fsyncInterval: float = core.results.Defaults.fsyncInterval) -> None:
+        super().__init__(path, fsyncInterval)
+        if self.file.tell() == 0:
+            self.file.write(magic)
+
+    def _writeBlock(self, header: Dict[str, Any], payload: bytes) -> None:
+        header["offset"] = self.file.tell()
+        header["size"] = len(payload)
+        encoded = json.dumps(header).encode()
+        self.file.write(blockHeader.pack(len(encoded)))
+        self.file.write(encoded)
+        self.file.write(payload)
+        self.index.append(header)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        seriesList = []
+        rest = splitSeries(record, (), seriesList)
+        workload = record.get("workload")
+        iteration = record.get("iteration")
+
+        for path, series in seriesList:
+            # Metric series are keyed by everything below the 'metrics' key
+            if path[0] == "metrics":
+                path = path[1:]
+            tsData = encodeInts([round(t * 1e6) for t in series["timestamps"]])
+            valuesEnc, valuesData = encodeColumn(series["values"])
+            header = {
+                "kind": "series",
+                "workload": workload,
+                "iteration": iteration,
+                "metric": "/".join(path[:-1]),
+                "series": path[-1],
+                "ts": ["us", len(tsData)],
+                "values": [valuesEnc, len(valuesData)],
+            }
+            payload = tsData + valuesData
+            if "runs" in series:
+                runsData = encodeInts(series["runs"])
+                header["runs"] = ["delta", len(runsData)]
+                payload += runsData
+            for key in ("count", "stride", "end"):
+                if key in series:
+                    header[key] = series[key]
+            self._writeBlock(header, payload)
+
+        payload = zlib.compress(json.dumps(rest, default=_jsonBytes).encode())
+        self._writeBlock({"kind": "record", "type": record["type"]}, payload)
+        self.file.flush()
+        self.sync()
+
+    def close(self) -> None:
+        indexOffset = self.file.tell()
+        self.file.write(zlib.compress(json.dumps(self.index).encode()))
+        self.file.write(footer.pack(indexOffset, footerMagic))
+        self.file.flush()
+        self.sync(force=True)
+        self.file.close()
+        log.debug(f"Closed results file '{self.path}' ({len(self.index)} blocks)")
+
+
+class BinaryResultReader:
+    """
+    Reads blocks of a columnar results file on demand.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.file = open(path, "rb")
+        if self.file.read(len(magic)) != magic:
+            raise ValueError(f"'{path}' is not a kbench columnar results file")
+        self.index = self._readIndex()
+
+    def _readIndex(self) -> List[Dict[str, Any]]:
+        size = self.file.seek(0, os.SEEK_END)
+        if size >= len(magic) + footer.size:
+            self.file.seek(size - footer.size)
+            indexOffset, tag = footer.unpack(self.file.read(footer.size))
+            if tag == footerMagic:
+                self.file.seek(indexOffset)
+                data = self.file.read(size - footer.size - indexOffset)
+                return json.loads(zlib.decompress(data))
+
+        # No footer, the writer did not finish - scan the blocks instead
+        log.warning(f"'{self.path}': missing index, scanning blocks")
+        index = []
+        offset = len(magic)
+        while offset + blockHeader.size <= size:
+            self.file.seek(offset)
+            (length,) = blockHeader.unpack(self.file.read(blockHeader.size))
+            try:
+                header = json.loads(self.file.read(length))
+            except ValueError:
+                break
+            if offset + blockHeader.size + length + header["size"] > size:
+                break
+            index.append(header)
+            offset += blockHeader.size + length + header["size"]
+        return index
+
+    def _payload(self, header: Dict[str, Any]) -> bytes:
+        self.file.seek(header["offset"])
+        (length,) = blockHeader.unpack(self.file.read(blockHeader.size))
+        self.file.seek(length, os.SEEK_CUR)
+        return self.file.read(header["size"])
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        for header in self.index:
+            if header["kind"] == "record":
+                yield json.loads(zlib.decompress(self._payload(header)))
+
+    def seriesHeaders(self) -> Iterator[Dict[str, Any]]:
+        for header in self.index:
+            if header["kind"] == "series":
+                yield header
+
+    def readSeries(self, header: Dict[str, Any]):
+        payload = self._payload(header)
+        tsEnc, tsSize = header["ts"]
+        valuesEnc, valuesSize = header["values"]
+        return (
+            decodeColumn(tsEnc, payload[:tsSize]),
+            decodeColumn(valuesEnc, payload[tsSize : tsSize + valuesSize]),
+        )
+
+    def readRuns(self, header: Dict[str, Any]):
+        """
+        Return the run lengths of an 'rle' encoded series, or None.
+        """
+        if "runs" not in header:
+            return None
+        offset = header["ts"][1] + header["values"][1]
+        encoding, size = header["runs"]
+        return decodeColumn(encoding, self._payload(header)[offset : offset + size])
+
+    def close(self) -> None:
+        self.file.close()
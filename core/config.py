@@ -1,20 +1,147 @@
 import os
+import copy
+import json
+import stat
+import hashlib
 import tomllib
+import threading
 import logging as log
 import cerberus
 
-import util.os
+from typing import Any, Dict
+
+import util.affinity
+import util.sysctl
 import core.schemas.bench_conf
+import core.schemas.metrics_conf
 import core.schemas.run_conf
+import core.schemas.workload_conf
+
+from core.cache import SourceCache
 
 
 class Defaults:
     samplingRate = 1000
+    flushInterval = 10
+    format = "json"
+    minIterations = 3
+    maxIterations = 30
+    buildJobs = 4
+    tracer = "/usr/sbin/dtrace"
+
+
+class ConfigLoader:
+    """
+    Loads, validates and normalizes TOML configuration files.
+
+    Validators are built once per schema (and thread). Normalized
+    configs are cached in memory and as JSON on disk, keyed on the file's
+    path, mtime and size as well as the schema they were validated
+    against. The disk cache is only used if it is private to the user.
+    Callers get their own copy of every config.
+    """
+
+    schemas: Dict[str, Dict] = {
+        "benchmark": core.schemas.bench_conf.schema,
+        "metrics": core.schemas.metrics_conf.schema,
+        "run": core.schemas.run_conf.schema,
+        "workload": core.schemas.workload_conf.schema,
+    }
+    schemaHashes: Dict[str, str] = {
+        kind: hashlib.sha256(repr(schema).encode()).hexdigest()
+        for kind, schema in schemas.items()
+    }
+
+    _local = threading.local()
+    _cache: Dict[tuple, Dict] = {}
+
+    @staticmethod
+    def validator(kind: str) -> cerberus.Validator:
+        # Validators keep per-validation state, give each thread its own
+        validators = getattr(ConfigLoader._local, "validators", None)
+        if validators is None:
+            validators = ConfigLoader._local.validators = {}
+        if kind not in validators:
+            validators[kind] = cerberus.Validator(ConfigLoader.schemas[kind])
+        return validators[kind]
+
+    @staticmethod
+    def _diskCacheDir() -> str | None:
+        # Other users must not be able to plant cached configs
+        path = os.path.join(SourceCache.root, "configs")
+        try:
+            os.makedirs(path, mode=0o700, exist_ok=True)
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_uid != os.getuid() or st.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+            log.debug(f"Not caching configurations in '{path}', it is not private")
+            return None
+        return path
+
+    @staticmethod
+    def _diskCachePath(path: str, kind: str) -> str | None:
+        cacheDir = ConfigLoader._diskCacheDir()
+        if cacheDir is None:
+            return None
+        key = hashlib.sha256(f"{kind}:{path}".encode()).hexdigest()
+        return os.path.join(cacheDir, key + ".json")
+
+    @staticmethod
+    def load(path: str, kind: str) -> Dict[str, Any]:
+        return copy.deepcopy(ConfigLoader._load(path, kind))
+
+    @staticmethod
+    def _load(path: str, kind: str) -> Dict[str, Any]:
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        key = (path, kind, st.st_mtime_ns, st.st_size, ConfigLoader.schemaHashes[kind])
+
+        if key in ConfigLoader._cache:
+            return ConfigLoader._cache[key]
+
+        cachePath = ConfigLoader._diskCachePath(path, kind)
+        if cachePath is not None:
+            try:
+                with open(cachePath, "rb") as file:
+                    cached = json.load(file)
+                if cached["key"] == list(key):
+                    ConfigLoader._cache[key] = cached["config"]
+                    return cached["config"]
+            except (OSError, TypeError, KeyError, ValueError):
+                pass
+
+        with open(path, mode="rb") as file:
+            config = tomllib.load(file)
+
+        v = ConfigLoader.validator(kind)
+        if not v.validate(config):
+            raise ValueError(f"{path}: invalid {kind} configuration: {v.errors}")
+        config = v.normalized(config)
+
+        ConfigLoader._cache[key] = config
+        if cachePath is None:
+            return config
+        try:
+            # TOML dates and times have no JSON equivalent, skip such configs
+            data = json.dumps({"key": key, "config": config})
+            with open(cachePath + ".tmp", "w") as file:
+                file.write(data)
+            os.replace(cachePath + ".tmp", cachePath)
+        except (OSError, TypeError, ValueError) as e:
+            log.debug(f"Unable to cache configuration '{path}': {e}")
+        return config
 
 
 class SysInfo:
     def init():
-        SysInfo.ncpu = util.os.sysctl("hw.ncpu")
+        try:
+            reader = util.sysctl.SysctlReader(["hw.ncpu"])
+            SysInfo.ncpu = reader.read()[0]
+            reader.close()
+        except (OSError, ValueError):
+            # No hw.ncpu, e.g. under /proc/sys on Linux
+            SysInfo.ncpu = os.cpu_count()
         log.debug(f"Number of CPUs: {SysInfo.ncpu}")
 
 
@@ -29,17 +156,27 @@ class RunConfig:
             self.configPath = RunConfig.defaultConfigPath
             log.info("Configuration file not specified - falling back to default.toml")
 
-        with open(self.configPath, mode="rb") as file:
-            config = tomllib.load(file)
-
-        self.validateConfig(config)
+        config = ConfigLoader.load(self.configPath, "run")
 
         self.metricsPath = config["metrics"]
+        self.flushInterval = config.get("flush_interval", Defaults.flushInterval)
+        self.format = config.get("format", Defaults.format)
+        self.buildJobs = config.get("build_jobs", Defaults.buildJobs)
+        self.cacheDir = config.get("cache_dir")
+        self.offline = args.offline or config.get("offline", False)
+        self.concurrent = config.get("concurrent", False)
+
+        affinity = config.get("affinity", {})
+        self.workloadCpus = None
+        self.housekeepingCpus = None
+        if "workload_cpus" in affinity:
+            self.workloadCpus = util.affinity.parseCpus(affinity["workload_cpus"])
+        if "housekeeping_cpus" in affinity:
+            self.housekeepingCpus = util.affinity.parseCpus(affinity["housekeeping_cpus"])
+        if self.workloadCpus and self.housekeepingCpus and self.workloadCpus & self.housekeepingCpus:
+            log.warning("Workload and housekeeping CPUs overlap")
+        self.numaDomain = affinity.get("numa_domain")
         self.benchmarkSet = None
         if config["benchmarks"] != "all":
             self.benchmarkSet = set(config["benchmarks"])
 
-    def validateConfig(self, config):
-        v = cerberus.Validator(core.schemas.run_conf.schema)
-        if not v.validate(config):
-            raise ValueError(f"invalid benchmark configuration: {v.errors}")
@@ -0,0 +1,281 @@
+import ast
+import math
+import operator
+import logging as log
+
+from array import array
+from bisect import bisect_right
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class TDigest:
+    """
+    Merging t-digest (Dunning & Ertl) for streaming quantile estimates.
+
+    Values are buffered and periodically merged into at most roughly
+    'compression' centroids, sized so that quantiles near the tails stay
+    accurate. Digests of separate series or runs can be merged.
+    """
+
+    def __init__(self, compression: int = 100) -> None:
+        self.compression = compression
+        self.bufferSize = 5 * compression
+        self.means: List[float] = []
+        self.weights: List[float] = []
+        self.buffer: List[Tuple[float, float]] = []
+        self.count = 0.0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float, w: float = 1.0) -> None:
+        self.buffer.append((x, w))
+        self.count += w
+        self.sum += x * w
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        if len(self.buffer) >= self.bufferSize:
+            self._compress()
+
+    def update(self, values) -> None:
+        for x in values:
+            self.add(x)
+
+    def merge(self, other: "TDigest") -> None:
+        other._compress()
+        self.buffer.extend(zip(other.means, other.weights))
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def _qLimit(self, q: float) -> float:
+        # Inverse of the k1 scale function applied to k(q) + 1
+        k = self.compression / (2 * math.pi) * math.asin(2 * q - 1) + 1
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(2 * math.pi * k / self.compression) + 1) / 2
+
+    def _compress(self) -> None:
+        if not self.buffer:
+            return
+        points = sorted(list(zip(self.means, self.weights)) + self.buffer)
+        self.buffer = []
+        total = sum(w for _, w in points)
+
+        means, weights = [], []
+        mean, weight = points[0]
+        q0 = 0.0
+        qLimit = self._qLimit(q0)
+        for x, w in points[1:]:
+            if q0 + (weight + w) / total <= qLimit:
+                weight += w
+                mean += (x - mean) * w / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                q0 += weight / total
+                qLimit = self._qLimit(q0)
+                mean, weight = x, w
+        means.append(mean)
+        weights.append(weight)
+        self.means, self.weights = means, weights
+
+    def quantile(self, q: float) -> float:
+        self._compress()
+        if not self.means:
+            return math.nan
+        if len(self.means) == 1:
+            return self.means[0]
+
+        target = q * self.count
+        if target < self.weights[0] / 2:
+            frac = target / (self.weights[0] / 2)
+            return self.min + frac * (self.means[0] - self.min)
+
+        cumulative = 0.0
+        for i in range(len(self.means) - 1):
+            mid = cumulative + self.weights[i] / 2
+            nextMid = cumulative + self.weights[i] + self.weights[i + 1] / 2
+            if target <= nextMid:
+                frac = (target - mid) / (nextMid - mid)
+                return self.means[i] + frac * (self.means[i + 1] - self.means[i])
+            cumulative += self.weights[i]
+
+        mid = self.count - self.weights[-1] / 2
+        frac = min((target - mid) / (self.weights[-1] / 2), 1.0)
+        return self.means[-1] + frac * (self.max - self.means[-1])
+
+
+def lookup(results: Dict[str, Any], path: str) -> Any:
+    """
+    Find a series in fetched results by its '<metric>/.../<series>'
+    path, e.g. 'sysctl/vm.pmap.pde.promotions' or 'ps/make/rss'.
+    """
+    node = results
+    for part in path.split("/"):
+        if not isinstance(node, dict) or part not in node:
+            raise KeyError(path)
+        node = node[part]
+    return node
+
+
+# Operators and functions allowed in derived metric expressions
+_binaryOps: Dict[type, Callable] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_unaryOps: Dict[type, Callable] = {ast.USub: operator.neg, ast.UAdd: operator.pos}
+_functions: Dict[str, Callable] = {"abs": abs, "min": min, "max": max, "log": math.log, "sqrt": math.sqrt}
+
+
+def compileExpression(expr: str) -> Callable[[Dict[str, float]], float]:
+    """
+    Compile an arithmetic expression over named variables into a function
+    evaluating it for a dict of values. Anything beyond arithmetic and a
+    few math functions is rejected.
+    """
+    try:
+        tree = ast.parse(expr, mode="eval").body
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression '{expr}': {e}")
+
+    def build(node) -> Callable[[Dict[str, float]], float]:
+        match node:
+            case ast.Constant(value=value) if isinstance(value, (int, float)):
+                return lambda env: value
+            case ast.Name(id=name):
+                return lambda env: env[name]
+            case ast.BinOp(left=left, op=op, right=right) if type(op) in _binaryOps:
+                func, lhs, rhs = _binaryOps[type(op)], build(left), build(right)
+                return lambda env: func(lhs(env), rhs(env))
+            case ast.UnaryOp(op=op, operand=operand) if type(op) in _unaryOps:
+                func, arg = _unaryOps[type(op)], build(operand)
+                return lambda env: func(arg(env))
+            case ast.Call(func=ast.Name(id=name), args=args, keywords=[]) if name in _functions:
+                func, argFuncs = _functions[name], [build(a) for a in args]
+                return lambda env: func(*(a(env) for a in argFuncs))
+        raise ValueError(f"Unsupported element '{ast.unparse(node)}' in expression '{expr}'")
+
+    return build(tree)
+
+
+class DerivedMetric:
+    """
+    Post-processing step turning fetched series into derived values:
+
+    - 'rate': per-second rate of change of a counter
+    - 'diff': last minus first sample, e.g. across a diff metric's
+      before/after samples
+    - 'summary': count, min, max, mean and quantiles from a t-digest
+    - 'expr': arithmetic over several series, evaluated at the
+      timestamps of the first one using the latest value of the others
+    """
+
+    types = ["rate", "diff", "summary", "expr"]
+
+    def __init__(self, configDict: Dict[str, Any]) -> None:
+        self.name = configDict["name"]
+        self.type = configDict["type"]
+        self.source = configDict.get("source")
+        self.quantiles = configDict.get("quantiles", [0.5, 0.9, 0.99])
+        self.compression = configDict.get("compression", 100)
+        self.vars = configDict.get("vars", {})
+        self.expr = None
+
+        if self.type == "expr":
+            if "expr" not in configDict or not self.vars:
+                raise ValueError(f"Derived metric '{self.name}': 'expr' needs 'expr' and 'vars'")
+            self.expr = compileExpression(configDict["expr"])
+        elif self.source is None:
+            raise ValueError(f"Derived metric '{self.name}': no 'source' series specified")
+
+    def compute(self, results: Dict[str, Any]) -> Any:
+        match self.type:
+            case "rate":
+                return DerivedMetric.rate(lookup(results, self.source))
+            case "diff":
+                values = lookup(results, self.source)["values"]
+                return values[-1] - values[0] if len(values) else None
+            case "summary":
+                series = lookup(results, self.source)
+                return self.summary(series["values"], series.get("runs"))
+            case "expr":
+                return self.evaluate(results)
+
+    @staticmethod
+    def rate(series: Dict[str, Any]) -> Dict[str, Any]:
+        ts, values = series["timestamps"], series["values"]
+        rateTs, rates = array("d"), array("d")
+        for i in range(1, len(ts)):
+            dt = ts[i] - ts[i - 1]
+            dv = values[i] - values[i - 1]
+            # Counter reset or wrap, no meaningful rate
+            if dt <= 0 or dv < 0:
+                continue
+            rateTs.append(ts[i])
+            rates.append(dv / dt)
+        return {"timestamps": rateTs, "values": rates}
+
+    def summary(self, values, runs=None) -> Dict[str, Any]:
+        digest = TDigest(self.compression)
+        if runs is None:
+            digest.update(values)
+        else:
+            # Every 'rle' entry stands for as many samples as its run
+            for x, n in zip(values, runs):
+                digest.add(x, n)
+        if digest.count == 0:
+            return {"count": 0}
+        result = {
+            "count": int(digest.count),
+            "min": digest.min,
+            "max": digest.max,
+            "mean": digest.sum / digest.count,
+        }
+        for q in self.quantiles:
+            result[f"p{q * 100:g}"] = digest.quantile(q)
+        return result
+
+    def evaluate(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        series = {name: lookup(results, path) for name, path in self.vars.items()}
+        first = next(iter(series))
+        ts = series[first]["timestamps"]
+
+        outTs, outValues = array("d"), array("d")
+        for i, t in enumerate(ts):
+            env = {}
+            for name, s in series.items():
+                # Latest sample of every other series at time 't'
+                j = i if name == first else bisect_right(s["timestamps"], t) - 1
+                if j < 0:
+                    break
+                env[name] = s["values"][j]
+            else:
+                try:
+                    value = self.expr(env)
+                except (ZeroDivisionError, ValueError, OverflowError):
+                    continue
+                outTs.append(t)
+                outValues.append(value)
+        return {"timestamps": outTs, "values": outValues}
+
+
+def derive(metrics: List[DerivedMetric], results: Dict[str, Any]) -> None:
+    """
+    Add the 'derived' section to fetched results.
+    """
+    derived = results.setdefault("derived", {})
+    for m in metrics:
+        try:
+            derived[m.name] = m.compute(results)
+        except KeyError as e:
+            log.debug(f"Derived metric '{m.name}': no series {e}")
@@ -0,0 +1,82 @@
+import re
+import logging as log
+
+from typing import Any, Callable, Dict, List
+from threading import Thread
+
+from core.series import SampleSeries
+
+
+class Extractor:
+    """
+    Parses values a benchmark reports on its standard output.
+
+    Every line is matched against 'regex'; the value is taken from the
+    'value' group if the pattern has one, the first group otherwise,
+    or else the whole match.
+    """
+
+    types: Dict[str, Callable[[str], Any]] = {"float": float, "int": int}
+
+    def __init__(self, configDict: Dict[str, Any]) -> None:
+        self.name = configDict["name"]
+        try:
+            self.regex = re.compile(configDict["regex"])
+        except re.error as e:
+            raise ValueError(f"Extractor '{self.name}': invalid regex: {e}")
+        self.convert = Extractor.types[configDict.get("type", "float")]
+
+        if "value" in self.regex.groupindex:
+            self.group = "value"
+        else:
+            self.group = 1 if self.regex.groups else 0
+
+    def match(self, line: str) -> Any | None:
+        m = self.regex.search(line)
+        if m is None:
+            return None
+        try:
+            return self.convert(m.group(self.group))
+        except ValueError:
+            log.warning(f"Extractor '{self.name}': cannot parse '{m.group(self.group)}'")
+            return None
+
+
+class OutputParser:
+    """
+    Streams a child's standard output through a set of extractors,
+    line by line, from a background thread.
+    """
+
+    # Seconds to wait for the output to close once the child exited
+    joinTimeout = 5.0
+
+    def __init__(self, extractors: List[Extractor], clock: Callable[[], float]) -> None:
+        self.extractors = extractors
+        self.clock = clock
+        self.series = {e.name: SampleSeries() for e in extractors}
+        self.thread = None
+
+    def start(self, fd: int) -> None:
+        self.thread = Thread(
+            target=self._consume, args=(fd,), name="kbench-output", daemon=True
+        )
+        self.thread.start()
+
+    def _consume(self, fd: int) -> None:
+        with open(fd, "r", errors="replace", closefd=True) as file:
+            for line in file:
+                ts = None
+                for e in self.extractors:
+                    value = e.match(line)
+                    if value is not None:
+                        ts = self.clock() if ts is None else ts
+                        self.series[e.name].append(ts, value)
+
+    def join(self) -> None:
+        self.thread.join(OutputParser.joinTimeout)
+        if self.thread.is_alive():
+            log.warning("Benchmark output still open after it exited, results may be incomplete")
+
+    def getResults(self, resultsDict) -> None:
+        resultsDict["output"] = {name: series.view() for name, series in self.series.items()}
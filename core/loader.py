@@ -0,0 +1,267 @@
+import os
+import json
+
+from array import array
+from collections import namedtuple
+from typing import Any, Dict, Iterator, List, Tuple
+
+import core.columnar
+import core.results
+
+from core.series import expandRuns
+
+SeriesKey = namedtuple("SeriesKey", ["workload", "iteration", "metric", "series"])
+
+
+class ResultFile:
+    """
+    Read access to a results file, independent of its format.
+    Series are returned as (timestamps, values) column pairs.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.metadata: Dict[str, Any] = {}
+
+    def keys(self) -> List[SeriesKey]:
+        pass
+
+    def series(self, workload, iteration, metric: str, series: str) -> Tuple[Any, Any]:
+        pass
+
+    def records(self, recordType: str | None = None) -> Iterator[Dict[str, Any]]:
+        pass
+
+    def iterations(self, workload: str) -> List[Dict[str, Any]]:
+        return [
+            r
+            for r in self.records("iteration")
+            if r["workload"] == workload
+        ]
+
+    def workloads(self) -> List[str]:
+        names = []
+        for r in self.records("iteration"):
+            if r["workload"] not in names:
+                names.append(r["workload"])
+        return names
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _concat(chunks: List[Tuple[Any, Any]]) -> Tuple[Any, Any]:
+    if len(chunks) == 1:
+        return chunks[0]
+    ts = array("d")
+    values = None
+    for chunkTs, chunkValues in chunks:
+        ts.extend(chunkTs)
+        if values is None:
+            values = chunkValues[:0]
+        try:
+            values.extend(chunkValues)
+        except TypeError:
+            values = list(values) + list(chunkValues)
+    return ts, values
+
+
+class BinaryResultFile(ResultFile):
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self.reader = core.columnar.BinaryResultReader(path)
+        self._records: List[Dict[str, Any]] | None = None
+        self.headers: Dict[SeriesKey, List[Dict[str, Any]]] = {}
+        for h in self.reader.seriesHeaders():
+            key = SeriesKey(h["workload"], h["iteration"], h["metric"], h["series"])
+            self.headers.setdefault(key, []).append(h)
+        for record in self.records("meta"):
+            self.metadata.update({k: v for k, v in record.items() if k != "type"})
+
+    def keys(self) -> List[SeriesKey]:
+        return list(self.headers)
+
+    def series(self, workload, iteration, metric: str, series: str) -> Tuple[Any, Any]:
+        key = SeriesKey(workload, iteration, metric, series)
+        if key not in self.headers:
+            raise KeyError(key)
+        chunks = []
+        for h in self.headers[key]:
+            ts, values = self.reader.readSeries(h)
+            runs = self.reader.readRuns(h)
+            if runs is not None:
+                ts, values = expandRuns(ts, values, runs, h.get("end"))
+            chunks.append((ts, values))
+        return _concat(chunks)
+
+    def records(self, recordType: str | None = None) -> Iterator[Dict[str, Any]]:
+        # Record blocks are small, parse them once for all callers
+        if self._records is None:
+            self._records = list(self.reader.records())
+        for record in self._records:
+            if recordType is None or record["type"] == recordType:
+                yield record
+
+    def close(self) -> None:
+        self.reader.close()
+
+
+def _splitRecord(record: Dict[str, Any]):
+    """
+    Split a JSON record into its series and the remaining fields.
+    Plain lists under 'metrics' come from files written before
+    series carried timestamps.
+    """
+    found = []
+    rest = core.columnar.splitSeries(record, (), found)
+    series = {}
+    for path, s in found:
+        if path[0] == "metrics":
+            path = path[1:]
+        columns = (s["timestamps"], s["values"])
+        if "runs" in s:
+            # One entry per sample, as if the series was not encoded
+            columns = expandRuns(*columns, s["runs"], s.get("end"))
+        series[("/".join(path[:-1]), path[-1])] = columns
+
+    def legacy(obj, path):
+        for key, value in list(obj.items()):
+            if isinstance(value, dict):
+                legacy(value, path + (str(key),))
+            elif isinstance(value, list) and path:
+                series[("/".join(path), str(key))] = (None, value)
+                del obj[key]
+
+    if "metrics" in rest:
+        legacy(rest["metrics"], ())
+    return series, rest
+
+
+class JsonResultFile(ResultFile):
+    """
+    Reads JSON Lines results files and the older single JSON document
+    format. JSON Lines files closed cleanly carry an index, which lets
+    us parse only the records a query needs.
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self.index = None
+        self.cache: Dict[int, Tuple[Dict, Dict]] = {}
+        self.loaded = None
+
+        with open(path, "rb") as file:
+            first = file.readline()
+            try:
+                head = json.loads(first)
+            except json.JSONDecodeError:
+                head = None
+
+            if head is None or "type" not in head:
+                # Single JSON document
+                file.seek(0)
+                self.loaded = self._fromDocument(json.load(file))
+                return
+
+            self.metadata = {k: v for k, v in head.items() if k != "type"}
+            self.index = self._readIndex(file)
+
+        if self.index is None:
+            self.loaded = [_splitRecord(r) for r in core.results.readRecords(path)]
+
+    @staticmethod
+    def _readIndex(file) -> List[Dict[str, Any]] | None:
+        size = file.seek(0, os.SEEK_END)
+        # The summary record is the last line, read backwards until we find it
+        chunk = 1 << 16
+        while True:
+            start = max(size - chunk, 0)
+            file.seek(start)
+            tail = file.read(size - start).rstrip(b"\n")
+            pos = tail.rfind(b"\n")
+            if pos >= 0 or start == 0:
+                break
+            chunk *= 4
+        try:
+            summary = json.loads(tail[pos + 1 :])
+        except json.JSONDecodeError:
+            return None
+        if summary.get("type") != "summary":
+            return None
+        return summary["index"]
+
+    def _fromDocument(self, doc: Dict[str, Any]):
+        records = []
+        for key, value in doc.items():
+            if not isinstance(value, dict):
+                self.metadata[key] = value
+                continue
+            if key in ("sysctl", "ps", "schedule"):
+                records.append(_splitRecord({"type": "samples", "metrics": {key: value}}))
+                continue
+            for iteration, result in value.items():
+                if not str(iteration).isdigit():
+                    continue
+                record = {"type": "iteration", "workload": key, "iteration": int(iteration), **result}
+                records.append(_splitRecord(record))
+        return records
+
+    def _load(self, entry: Dict[str, Any]):
+        offset = entry["offset"]
+        if offset not in self.cache:
+            with open(self.path, "rb") as file:
+                file.seek(offset)
+                self.cache[offset] = _splitRecord(json.loads(file.readline()))
+        return self.cache[offset]
+
+    def _all(self, match=None) -> Iterator[Tuple[Dict, Dict]]:
+        if self.loaded is not None:
+            for series, rest in self.loaded:
+                if match is None or match(rest):
+                    yield series, rest
+            return
+        for entry in self.index:
+            if match is None or match(entry):
+                yield self._load(entry)
+
+    def keys(self) -> List[SeriesKey]:
+        keys = {}
+        for series, rest in self._all():
+            for metric, name in series:
+                keys[SeriesKey(rest.get("workload"), rest.get("iteration"), metric, name)] = None
+        return list(keys)
+
+    def series(self, workload, iteration, metric: str, series: str) -> Tuple[Any, Any]:
+        def match(r):
+            return r.get("workload") == workload and r.get("iteration") == iteration
+
+        chunks = [s[(metric, series)] for s, _ in self._all(match) if (metric, series) in s]
+        if not chunks:
+            raise KeyError(SeriesKey(workload, iteration, metric, series))
+        if chunks[0][0] is None:
+            return chunks[0]
+        return _concat([(array("d", ts), v) for ts, v in chunks])
+
+    def records(self, recordType: str | None = None) -> Iterator[Dict[str, Any]]:
+        def match(r):
+            return recordType is None or r["type"] == recordType
+
+        for _, rest in self._all(match):
+            yield rest
+
+
+def load(path: str) -> ResultFile:
+    """
+    Open a results file in any of the formats kbench writes.
+    """
+    with open(path, "rb") as file:
+        head = file.read(len(core.columnar.magic))
+    if head == core.columnar.magic:
+        return BinaryResultFile(path)
+    return JsonResultFile(path)
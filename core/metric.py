@@ -1,17 +1,24 @@
-import tomllib
-import cerberus
-import datetime
+import os
+import re
+import time
+import signal
+import tempfile
 import logging as log
 
 
-from queue import Queue
-from itertools import chain
-from typing import List, Dict
-from threading import Thread, Event
+from typing import Any, List, Dict, Set, Tuple
+from threading import Event, Lock, Thread
 
 import core.config
-import core.schemas.metrics_conf
-import util.os
+import util.proc
+import util.spawn
+import util.sysctl
+
+from core.derived import DerivedMetric, derive
+from core.extract import Extractor
+from core.overhead import Overhead
+from core.sampler import AdaptiveSamplingGroup, SamplingGroup, SamplingScheduler
+from core.series import SampleSeries
 
 
 class Metric:
@@ -22,108 +29,487 @@ class Metric:
         else:
             self.sampling_rate = core.config.Defaults.samplingRate
 
+        # Sample at a period between 'min_period' and 'max_period'
+        # milliseconds depending on how quickly values change
+        self.adaptive = configDict.get("adaptive")
+        if self.adaptive and self.adaptive["min_period"] > self.adaptive["max_period"]:
+            raise ValueError("adaptive sampling: 'min_period' exceeds 'max_period'")
+        # Whether the last sample differed from the one before
+        self.changed = True
+
+        # In-memory sample storage bounds and encoding
+        self.capacity = configDict.get("capacity")
+        self.overflow = configDict.get("overflow", "ring")
+        self.encoding = configDict.get("encoding", "rle" if self.adaptive else "raw")
+
+    def newSeries(self) -> SampleSeries:
+        return SampleSeries(self.capacity, self.overflow, self.encoding)
+
     def reset(self):
         pass
 
-    def sample(self):
+    def discard(self, before: float):
         pass
 
-    def getResults(self):
+    def start(self):
         pass
 
+    def stop(self):
+        pass
+
+    def sample(self, ts: float):
+        pass
+
+    def getResults(self, resultsDict, window=None):
+        pass
+
+    def label(self) -> str:
+        return f"{self.getName()}/{self.name}"
+
 
 class SysctlMetric(Metric):
     def __init__(self, configDict) -> None:
         super().__init__(configDict)
-        self.values: Dict[str, List[int]] = {}
+        self.values: Dict[str, SampleSeries] = {}
         self.oids = configDict["oids"]
         self.name = configDict["name"]
+        # Resolve all OIDs up front so sampling is a single pass over MIBs
+        self.reader = util.sysctl.SysctlReader(self.oids)
+        self.last = None
 
         for oid in self.oids:
-            self.values[oid] = []
+            self.values[oid] = self.newSeries()
 
         log.debug(f"Registered sysctl metric group: '{self.name}'")
 
-    def sample(self):
-        for oid in self.oids:
-            self.values[oid].append(util.os.sysctl(oid))
-            log.debug(f"Sampled sysctl '{oid}'")
+    def sample(self, ts: float):
+        values = self.reader.read()
+        self.changed = values != self.last
+        self.last = values
+        for oid, value in zip(self.oids, values):
+            self.values[oid].append(ts, value)
+        log.debug(f"Sampled sysctl group '{self.name}'")
 
-    def getResults(self, resultsDict):
+    def getResults(self, resultsDict, window=None):
         for oid in self.oids:
-            resultsDict["sysctl"][oid] = self.values[oid].copy()
+            resultsDict["sysctl"][oid] = self.values[oid].view(window)
 
     def reset(self):
         for oid in self.oids:
-            self.values[oid].clear()
+            self.values[oid].reset()
+
+    def discard(self, before: float):
+        for oid in self.oids:
+            self.values[oid].discard(before)
 
     def getName(self):
         return "sysctl"
 
 
 class PsMetric(Metric):
-    supportedStats: List[str] = {
-        "time",
-    }
+    supportedStats: Set[str] = set(util.proc.stats)
 
     def __init__(self, configDict) -> None:
         super().__init__(configDict)
 
-        self.valueDict = {}
+        self.valueDict: Dict[str, SampleSeries] = {}
         self.cmd = configDict["command"]
+        self.name = self.cmd
         self.stats = configDict["stats"]
 
         for stat in self.stats:
             if stat not in PsMetric.supportedStats:
                 raise ValueError(f"Sampling 'ps' stat '{stat}' is not supported yet")
 
-            self.valueDict[stat] = []
+            self.valueDict[stat] = self.newSeries()
+
+        # The process is looked up lazily and only re-scanned once it exits
+        self.proc = util.proc.ProcStats(self.cmd)
+        self.last = None
 
         log.debug(
             f"Registered 'ps' metric for process '{self.cmd}' - tracking '{self.stats}'"
         )
 
-    def sample(self) -> None:
-        procDict = util.os.procInfo(self.cmd)
-        if procDict:
+    def sample(self, ts: float) -> None:
+        procStats = self.proc.read()
+        self.changed = procStats != self.last
+        self.last = dict(procStats) if procStats else None
+        if procStats:
             for stat in self.stats:
-                match stat:
-                    case "time":
-                        cpuTimeTimestamp = datetime.datetime.strptime(
-                            procDict["cpu-time"], "%M:%S.%f"
-                        ).timestamp()
-                        self.valueDict[stat].append(cpuTimeTimestamp)
+                self.valueDict[stat].append(ts, procStats[stat])
             log.debug(f"Sampled ps metric for '{self.cmd}'")
         else:
             log.warn(f"Unable to fetch process info for '{self.cmd}'")
 
-    def getResults(self, resultsDict) -> None:
+    def getResults(self, resultsDict, window=None) -> None:
         resultsDict["ps"][self.cmd] = {}
 
         for stat in self.stats:
-            resultsDict["ps"][self.cmd][stat] = self.valueDict[stat].copy()
+            resultsDict["ps"][self.cmd][stat] = self.valueDict[stat].view(window)
 
     def reset(self) -> None:
         for stat in self.stats:
-            self.valueDict[stat].clear()
+            self.valueDict[stat].reset()
+
+    def discard(self, before: float) -> None:
+        for stat in self.stats:
+            self.valueDict[stat].discard(before)
 
     def getName(self):
         return "ps"
 
 
+class StreamingMetric(Metric):
+    """
+    Metric fed by the output of a long-lived command instead of being
+    sampled: the command is started with the sampling threads, every
+    line it prints is parsed as it arrives and stamped with the time
+    it was read, and the command is stopped with the sampling threads.
+    """
+
+    # Seconds to wait for the command to exit after 'stopSignal'
+    stopTimeout = 2.0
+    stopSignal = signal.SIGTERM
+
+    def __init__(self, configDict) -> None:
+        super().__init__(configDict)
+        self.name = configDict["name"]
+        self.process = None
+        self.thread = None
+
+    def command(self) -> List[str]:
+        pass
+
+    def parseLine(self, ts: float, line: str) -> None:
+        pass
+
+    def start(self) -> None:
+        outputFd, stdout = os.pipe()
+        try:
+            self.process = util.spawn.SpawnedProcess(self.command(), stdout=stdout)
+        finally:
+            os.close(stdout)
+        self.process.release()
+        self.thread = Thread(
+            target=self._consume, args=(outputFd,), name=f"kbench-{self.label()}", daemon=True
+        )
+        self.thread.start()
+        log.debug(f"Started '{self.label()}' command (pid {self.process.pid})")
+
+    def _consume(self, fd: int) -> None:
+        with open(fd, "r", errors="replace", closefd=True) as file:
+            for line in file:
+                ts = MetricRegistry.clock()
+                with MetricRegistry.lock:
+                    self.parseLine(ts, line)
+
+    def stop(self) -> None:
+        if self.process is None:
+            return
+        status = self.process.terminate(self.stopTimeout, self.stopSignal)
+        self.thread.join()
+        if status not in (0, -self.stopSignal):
+            log.warning(f"'{self.label()}' command exited with status {status}")
+        self.process = None
+        self.thread = None
+
+
+class CollectorMetric(StreamingMetric):
+    """
+    Series parsed from the periodic output of a tool such as 'vmstat -w 1'
+    or 'iostat -w 1', either by whitespace-separated column or with regexes.
+    """
+
+    def __init__(self, configDict) -> None:
+        super().__init__(configDict)
+        self.argv = configDict["command"]
+        # Column names, '-' skips a column
+        self.columns = configDict.get("columns", [])
+        self.extractors = [Extractor(e) for e in configDict.get("extract", [])]
+        if bool(self.columns) == bool(self.extractors):
+            raise ValueError(f"Collector '{self.name}': specify either 'columns' or 'extract'")
+        # Data lines to drop, e.g. vmstat's averages since boot
+        self.skip = configDict.get("skip", 0)
+        self.skipped = 0
+
+        names = [c for c in self.columns if c != "-"] + [e.name for e in self.extractors]
+        self.values: Dict[str, SampleSeries] = {name: self.newSeries() for name in names}
+
+        log.debug(f"Registered collector metric '{self.name}': {self.argv}")
+
+    def command(self) -> List[str]:
+        return self.argv
+
+    def start(self) -> None:
+        self.skipped = 0
+        super().start()
+
+    @staticmethod
+    def _number(field: str) -> Any | None:
+        for convert in (int, float):
+            try:
+                return convert(field)
+            except ValueError:
+                pass
+        return None
+
+    def _parseColumns(self, line: str) -> Dict[str, Any]:
+        fields = line.split()
+        # Header lines have no numeric column
+        parsed = {}
+        for name, field in zip(self.columns, fields):
+            if name == "-":
+                continue
+            value = CollectorMetric._number(field)
+            if value is not None:
+                parsed[name] = value
+        return parsed
+
+    def parseLine(self, ts: float, line: str) -> None:
+        if self.columns:
+            parsed = self._parseColumns(line)
+        else:
+            parsed = {}
+            for e in self.extractors:
+                value = e.match(line)
+                if value is not None:
+                    parsed[e.name] = value
+        if not parsed:
+            return
+        if self.skipped < self.skip:
+            self.skipped += 1
+            return
+        for name, value in parsed.items():
+            self.values[name].append(ts, value)
+
+    def getResults(self, resultsDict, window=None):
+        resultsDict.setdefault("collector", {})[self.name] = {
+            name: series.view(window) for name, series in self.values.items()
+        }
+
+    def reset(self):
+        for series in self.values.values():
+            series.reset()
+
+    def discard(self, before: float):
+        for series in self.values.values():
+            series.discard(before)
+
+    def getName(self):
+        return "collector"
+
+
+class DTraceMetric(StreamingMetric):
+    """
+    In-kernel aggregations from a single DTrace consumer per group.
+
+    All scripts of a group are compiled into one D program whose
+    aggregations are dumped with printa() and cleared every sampling
+    period, so each sample holds the aggregate over one period. A
+    script whose clause updates aggregations is used as is; any other
+    clause is turned into one, e.g. 'fbt::f:return { trace(arg1) }'
+    into '@<name> = sum(arg1)', or a count() without trace().
+    Keyed aggregations become one series per key.
+    """
+
+    aggregations = ["count", "sum", "min", "max", "avg"]
+    # Seconds to wait for the consumer to compile and enable its probes
+    startTimeout = 30.0
+    # DTrace runs END clauses on SIGINT, dumping the last period
+    stopSignal = signal.SIGINT
+
+    def __init__(self, configDict) -> None:
+        super().__init__(configDict)
+        self.tracer = configDict.get("tracer", core.config.Defaults.tracer)
+        self.aggs: Dict[str, str] = {}
+        clauses = []
+        for script in configDict["scripts"]:
+            clause, aggs = DTraceMetric.compileScript(script)
+            clauses.append(clause)
+            self.aggs.update(aggs)
+        self.program = DTraceMetric.program(clauses, self.aggs, self.sampling_rate)
+        self.scriptPath = None
+
+        self.values: Dict[str, SampleSeries] = {}
+        self.ready = Event()
+        self.current = None
+        self.tickTs = 0.0
+
+        log.debug(f"Registered dtrace metric group '{self.name}': {list(self.aggs)}")
+
+    @staticmethod
+    def _traced(body: str) -> List[str]:
+        # Arguments of trace() actions, which may contain parentheses
+        exprs = []
+        for m in re.finditer(r"\btrace\s*\(", body):
+            depth, i = 1, m.end()
+            while i < len(body) and depth:
+                depth += {"(": 1, ")": -1}.get(body[i], 0)
+                i += 1
+            exprs.append(body[m.end() : i - 1].strip())
+        return exprs
+
+    @staticmethod
+    def compileScript(script: Dict[str, Any]) -> Tuple[str, Dict[str, str]]:
+        """
+        Return the D clause for a script and the aggregations it updates.
+        """
+        name = script["name"]
+        src = script.get("src", "").strip()
+        probe, _, body = src.partition("{")
+        probe, body = probe.strip(), body.rpartition("}")[0].strip()
+        if not probe:
+            raise ValueError(f"dtrace script '{name}': no probe specified")
+
+        if "@" in body:
+            # Anonymous aggregations are named after the script
+            body = re.sub(r"@(?=\s*[\[=])", f"@{name}", body)
+            aggs = dict(re.findall(r"@(\w+)\s*(?:\[[^\]]*\])?\s*=\s*(\w+)\s*\(", body))
+        else:
+            traced = DTraceMetric._traced(body)
+            if len(traced) > 1:
+                raise ValueError(f"dtrace script '{name}': cannot aggregate more than one trace() action")
+            func = script.get("aggregation", "sum" if traced else "count")
+            if func == "count":
+                body = f"@{name} = count();"
+            elif traced:
+                body = f"@{name} = {func}({traced[0]});"
+            else:
+                raise ValueError(f"dtrace script '{name}': '{func}' needs a trace() action to aggregate")
+            aggs = {name: func}
+
+        for agg, func in aggs.items():
+            if func not in DTraceMetric.aggregations:
+                raise ValueError(f"dtrace script '{name}': aggregation '{func}' of '@{agg}' is not supported")
+        return f"{probe}\n{{\n    {body}\n}}\n", aggs
+
+    @staticmethod
+    def program(clauses: List[str], aggs: Dict[str, str], periodMs: int) -> str:
+        dump = ['    printf("kbench-tick\\n");']
+        for agg, func in aggs.items():
+            dump.append(f'    printf("kbench-agg {agg}\\n");')
+            dump.append(f"    printa(@{agg});")
+            # Cleared counts and sums read 0 for idle periods,
+            # other aggregations have no value for them
+            dump.append(f"    {'clear' if func in ('count', 'sum') else 'trunc'}(@{agg});")
+        dump.append('    printf("kbench-end\\n");')
+        dump = "\n".join(dump)
+
+        return "\n".join(
+            [
+                "#pragma D option quiet",
+                "#pragma D option switchrate=10hz",
+                'BEGIN\n{\n    printf("kbench-begin\\n");\n}\n',
+                *clauses,
+                f"tick-{periodMs}ms\n{{\n{dump}\n}}\n",
+                f"END\n{{\n{dump}\n}}\n",
+            ]
+        )
+
+    def command(self) -> List[str]:
+        return [self.tracer, "-q", "-s", self.scriptPath]
+
+    def start(self) -> None:
+        with tempfile.NamedTemporaryFile("w", prefix=f"kbench-{self.name}-", suffix=".d", delete=False) as file:
+            file.write(self.program)
+            self.scriptPath = file.name
+        self.ready.clear()
+        self.current = None
+        super().start()
+        # Don't start the workload before the probes are enabled
+        if not self.ready.wait(DTraceMetric.startTimeout):
+            log.warning(f"dtrace consumer '{self.name}' did not start within {DTraceMetric.startTimeout}s")
+        elif not self.thread.is_alive():
+            log.warning(f"dtrace consumer '{self.name}' exited early, see its errors above")
+
+    def _consume(self, fd: int) -> None:
+        try:
+            super()._consume(fd)
+        finally:
+            # Nothing to wait for once the consumer exited
+            self.ready.set()
+
+    def stop(self) -> None:
+        super().stop()
+        if self.scriptPath:
+            os.unlink(self.scriptPath)
+            self.scriptPath = None
+
+    def parseLine(self, ts: float, line: str) -> None:
+        line = line.strip()
+        if line.startswith("kbench-"):
+            marker, _, arg = line.partition(" ")
+            match marker:
+                case "kbench-begin":
+                    self.ready.set()
+                case "kbench-tick":
+                    self.tickTs = ts
+                case "kbench-agg":
+                    self.current = arg
+                case "kbench-end":
+                    self.current = None
+            return
+        if not line or self.current is None:
+            return
+
+        # printa() prints the keys, if any, followed by the value
+        fields = line.split()
+        try:
+            value = int(fields[-1])
+        except ValueError:
+            log.debug(f"dtrace '{self.name}': skipping '{line}'")
+            return
+        key = " ".join(fields[:-1])
+        series = f"{self.current}/{key}" if key else self.current
+        if series not in self.values:
+            self.values[series] = self.newSeries()
+        self.values[series].append(self.tickTs, value)
+
+    def getResults(self, resultsDict, window=None):
+        resultsDict.setdefault("dtrace", {})[self.name] = {
+            name: series.view(window) for name, series in self.values.items()
+        }
+
+    def reset(self):
+        for series in self.values.values():
+            series.reset()
+
+    def discard(self, before: float):
+        for series in self.values.values():
+            series.discard(before)
+
+    def getName(self):
+        return "dtrace"
+
+
 class MetricRegistry:
     diffMetrics: List[Metric] = []
-    continuousMetrics: Dict[int, Metric] = {}
-    tq: list[(Thread, Event)] = []
+    continuousMetrics: Dict[int, List[Metric]] = {}
+    # Continuous metrics sampled at their own, adaptive rate
+    adaptiveMetrics: List[Metric] = []
+    # Metrics fed by long-lived commands running alongside the workloads
+    streamingMetrics: List[StreamingMetric] = []
+    # Computed from the other metrics' results when fetching them
+    derivedMetrics: List[DerivedMetric] = []
+    scheduler: SamplingScheduler | None = None
+    lock = Lock()
+    # Sample timestamps are relative to the start of the last sampling period
+    epoch: float = time.monotonic()
+    # Start times and workloads of the open per-workload windows
+    windows: Dict[float, str | None] = {}
+    # Windows closed while others were still open
+    closedWindows: List[Tuple[float, float, str | None]] = []
+    # Cost of our own sampling
+    overhead = Overhead()
 
     @staticmethod
-    def loadMetrics(configPath: str) -> None:
-        with open(configPath, mode="rb") as file:
-            metricsConfig = tomllib.load(file)
+    def clock() -> float:
+        return time.monotonic() - MetricRegistry.epoch
 
-        v = cerberus.Validator(core.schemas.metrics_conf.schema)
-        if not v.validate(metricsConfig):
-            raise ValueError(f"invalid metrics configuration file: {v.errors}")
+    @staticmethod
+    def loadMetrics(configPath: str) -> None:
+        metricsConfig = core.config.ConfigLoader.load(configPath, "metrics")
 
         for metricClass, metricDicts in metricsConfig.items():
             ctor = None
@@ -132,12 +518,21 @@ class MetricRegistry:
                     ctor = SysctlMetric
                 case "ps":
                     ctor = PsMetric
+                case "collector":
+                    MetricRegistry.streamingMetrics += [CollectorMetric(d) for d in metricDicts]
+                    continue
                 case "dtrace":
+                    MetricRegistry.streamingMetrics += [DTraceMetric(d) for d in metricDicts]
+                    continue
+                case "derived":
+                    MetricRegistry.derivedMetrics += [DerivedMetric(d) for d in metricDicts]
                     continue
 
             for metricDict in metricDicts:
                 m = ctor(metricDict)
-                if "sampling_rate" in metricDict:
+                if m.adaptive:
+                    MetricRegistry.adaptiveMetrics.append(m)
+                elif "sampling_rate" in metricDict:
                     sampling_rate = metricDict["sampling_rate"]
                     if sampling_rate not in MetricRegistry.continuousMetrics:
                         MetricRegistry.continuousMetrics[sampling_rate] = []
@@ -147,54 +542,150 @@ class MetricRegistry:
 
     @staticmethod
     def sampleDiffMetrics():
-        for m in MetricRegistry.diffMetrics:
-            m.sample()
+        with MetricRegistry.lock:
+            ts = MetricRegistry.clock()
+            for m in MetricRegistry.diffMetrics:
+                MetricRegistry.overhead.timeSample(m.label(), m, ts)
+
+    @staticmethod
+    def _metrics() -> List[Metric]:
+        return (
+            MetricRegistry.diffMetrics
+            + [m for metricsList in MetricRegistry.continuousMetrics.values() for m in metricsList]
+            + MetricRegistry.adaptiveMetrics
+            + MetricRegistry.streamingMetrics
+        )
+
+    @staticmethod
+    def openWindow(workload: str | None = None) -> float:
+        """
+        Open a sampling window for one of several concurrently running
+        workloads and return its start time. Sampling keeps running
+        across windows and every window only gets the samples taken
+        while it was open. System-wide metrics cannot tell workloads
+        apart, so overlapping windows share their samples.
+        """
+        with MetricRegistry.lock:
+            start = MetricRegistry.clock()
+            for m in MetricRegistry.diffMetrics:
+                MetricRegistry.overhead.timeSample(m.label(), m, start)
+            MetricRegistry.windows[start] = workload
+        return start
+
+    @staticmethod
+    def closeWindow(start: float):
+        """
+        Close the window opened at 'start' and return its samples along
+        with a description of the window. The samples are system-wide,
+        so the description lists the workloads whose windows overlapped
+        it and whose activity the samples include as well.
+        """
+        with MetricRegistry.lock:
+            end = MetricRegistry.clock()
+            for m in MetricRegistry.diffMetrics:
+                MetricRegistry.overhead.timeSample(m.label(), m, end)
+            fetchStart = time.perf_counter()
+            results = MetricRegistry._fetchResults(window=(start, end))
+            MetricRegistry.overhead.fetchLatency.record(time.perf_counter() - fetchStart)
+
+            workload = MetricRegistry.windows.pop(start)
+            shared = list(MetricRegistry.windows.values())
+            shared += [w for s, e, w in MetricRegistry.closedWindows if e >= start]
+            window = {
+                "start": start,
+                "end": end,
+                "scope": "system",
+                "shared_with": sorted({w for w in shared if w is not None and w != workload}),
+            }
+
+            # Drop samples and closed windows none of the remaining windows need
+            horizon = min(MetricRegistry.windows, default=end)
+            MetricRegistry.closedWindows.append((start, end, workload))
+            if MetricRegistry.windows:
+                MetricRegistry.closedWindows = [c for c in MetricRegistry.closedWindows if c[1] >= horizon]
+            else:
+                MetricRegistry.closedWindows = []
+            for m in MetricRegistry._metrics():
+                m.discard(horizon)
+            if MetricRegistry.scheduler:
+                MetricRegistry.scheduler.discard(horizon)
+        # Windowed results are copies, no need to hold up sampling
+        if MetricRegistry.derivedMetrics:
+            derive(MetricRegistry.derivedMetrics, results)
+        return results, window
 
     @staticmethod
     def startSamplingThreads():
-        def samplingThread(
-            metrics: List[Metric], samplingRateMs: int, stop: Event
-        ) -> None:
-            while not stop.wait(samplingRateMs / 1000.0):
-                for m in metrics:
-                    m.sample()
-
-        # Create threads for monitoring sysctls
-        if len(MetricRegistry.continuousMetrics) == 0:
+        MetricRegistry.epoch = time.monotonic()
+        with MetricRegistry.lock:
+            MetricRegistry.overhead.reset()
+        for m in MetricRegistry.streamingMetrics:
+            m.start()
+        if len(MetricRegistry.continuousMetrics) == 0 and len(MetricRegistry.adaptiveMetrics) == 0:
             return
 
-        MetricRegistry.tq.clear()
-        for samplingRate, m in MetricRegistry.continuousMetrics.items():
-            e = Event()
-            t = Thread(
-                target=samplingThread,
-                args=(m, samplingRate, e),
-            )
-            MetricRegistry.tq.append((t, e))
-
-            for t, _ in MetricRegistry.tq:
-                t.start()
+        # A single scheduler thread samples every continuous metric group
+        if MetricRegistry.scheduler is None:
+            groups = [
+                SamplingGroup(samplingRate, metrics, MetricRegistry.overhead)
+                for samplingRate, metrics in MetricRegistry.continuousMetrics.items()
+            ]
+            groups += [
+                AdaptiveSamplingGroup(
+                    f"adaptive:{m.label()}",
+                    m.adaptive["min_period"],
+                    m.adaptive["max_period"],
+                    [m],
+                    MetricRegistry.overhead,
+                )
+                for m in MetricRegistry.adaptiveMetrics
+            ]
+            MetricRegistry.scheduler = SamplingScheduler(groups, MetricRegistry.lock)
+        MetricRegistry.scheduler.start(MetricRegistry.epoch)
 
     @staticmethod
     def stopSamplingThreads():
-        # Signal the monitoring threads to stop
-        for _, e in MetricRegistry.tq:
-            e.set()
-
-        for t, _ in MetricRegistry.tq:
-            t.join()
+        if MetricRegistry.scheduler:
+            MetricRegistry.scheduler.stop()
+        for m in MetricRegistry.streamingMetrics:
+            m.stop()
 
     @staticmethod
     def fetchResults():
-        results = {"sysctl": {}, "ps": {}}
-        for m in MetricRegistry.diffMetrics:
-            m.getResults(results)
-            m.reset()
-
-        for metricsList in MetricRegistry.continuousMetrics.values():
-            for m in metricsList:
-                m.getResults(results)
+        with MetricRegistry.lock:
+            start = time.perf_counter()
+            results = MetricRegistry._fetchResults()
+            MetricRegistry.overhead.fetchLatency.record(time.perf_counter() - start)
+        # The fetched series were handed over, no need to hold up sampling
+        if MetricRegistry.derivedMetrics:
+            derive(MetricRegistry.derivedMetrics, results)
+        return results
+
+    @staticmethod
+    def fetchOverhead(reset: bool = True):
+        """
+        Return the cost of sampling since the last reset. Sampling
+        windows share one scheduler, so they leave the counters running.
+        """
+        with MetricRegistry.lock:
+            results = MetricRegistry.overhead.getResults()
+            if reset:
+                MetricRegistry.overhead.reset()
+            return results
+
+    @staticmethod
+    def _fetchResults(window=None):
+        # Windowed results leave the samples in place for other windows
+        results = {"sysctl": {}, "ps": {}, "schedule": {}}
+        for m in MetricRegistry._metrics():
+            m.getResults(results, window)
+            if window is None:
                 m.reset()
 
+        if MetricRegistry.scheduler:
+            MetricRegistry.scheduler.getResults(results, window)
+            if window is None:
+                MetricRegistry.scheduler.reset()
+
         return results
 
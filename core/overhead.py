@@ -0,0 +1,104 @@
+import time
+
+from array import array
+from typing import Any, Dict
+
+
+class LatencyHistogram:
+    """
+    Histogram of durations with power-of-two microsecond buckets.
+    Bucket 0 counts durations below 1us, bucket b those below 2^b us.
+    """
+
+    nbuckets = 32
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.counts = array("q", bytes(8 * LatencyHistogram.nbuckets))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        bucket = min(int(seconds * 1e6).bit_length(), LatencyHistogram.nbuckets - 1)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-th quantile, in seconds.
+        """
+        rank = q * self.count
+        seen = 0
+        for bucket, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return min((1 << bucket) / 1e6, self.max)
+        return self.max
+
+    def view(self) -> Dict[str, Any]:
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": {
+                f"<{1 << bucket}us": n for bucket, n in enumerate(self.counts) if n
+            },
+        }
+
+
+class Overhead:
+    """
+    Cost of kbench's own sampling: how long every metric's sample()
+    and every result fetch took, how much CPU time the sampler thread
+    and the kbench process as a whole used, and how many sampling
+    deadlines were hit late or missed.
+    """
+
+    def __init__(self) -> None:
+        self.sampleLatency: Dict[str, LatencyHistogram] = {}
+        self.fetchLatency = LatencyHistogram()
+        self.reset()
+
+    def reset(self) -> None:
+        for h in self.sampleLatency.values():
+            h.reset()
+        self.fetchLatency.reset()
+        self.samplerCpu = 0.0
+        self.late = 0
+        self.missed = 0
+        self.cpuStart = time.process_time()
+        self.wallStart = time.monotonic()
+
+    def timeSample(self, label: str, metric, ts: float) -> None:
+        start = time.perf_counter()
+        metric.sample(ts)
+        elapsed = time.perf_counter() - start
+
+        h = self.sampleLatency.get(label)
+        if h is None:
+            h = self.sampleLatency[label] = LatencyHistogram()
+        h.record(elapsed)
+
+    def getResults(self) -> Dict[str, Any]:
+        cpu = time.process_time() - self.cpuStart
+        elapsed = time.monotonic() - self.wallStart
+        return {
+            "elapsed": elapsed,
+            "process_cpu": cpu,
+            "cpu_fraction": cpu / elapsed if elapsed > 0 else 0.0,
+            "sampler_cpu": self.samplerCpu,
+            "late": self.late,
+            "missed": self.missed,
+            "sample_latency": {label: h.view() for label, h in self.sampleLatency.items()},
+            "fetch_latency": self.fetchLatency.view(),
+        }
@@ -0,0 +1,312 @@
+import os
+import hmac
+import json
+import socket
+import logging as log
+
+from argparse import Namespace
+from datetime import datetime
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, List, Tuple
+
+import core.actions
+
+from core.cache import SourceCache
+from core.config import RunConfig
+from core.results import ResultSink
+from core.series import jsonDefault
+
+
+# Protocol: newline-delimited JSON over a TCP or Unix stream socket.
+# The controller sends a single request,
+#   {"op": "run" | "monitor", "config": <name>, "offline": bool, "token": <token>}
+# where the config names a file in the agent's own config directory,
+# and the agent streams back the same records a results file would hold
+# ("meta", "samples", "iteration", "workload"), ending the session with
+# {"type": "done"} or {"type": "error", "message": ...}. Sending
+# {"op": "stop"} or closing the connection ends a 'monitor' session.
+ops = ["run", "monitor"]
+
+# Environment variable holding the shared agent token
+tokenVariable = "KBENCH_TOKEN"
+
+# Stream 'monitor' samples to controllers at least this often (seconds)
+streamInterval = 1.0
+
+
+def parseAddress(address: str) -> Tuple[int, Any]:
+    """
+    Parse 'unix:<path>' or '<host>:<port>' into a socket family and address.
+    Without a host, e.g. ':9000', only the loopback interface is used.
+    """
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, sep, port = address.rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError(f"Invalid agent address '{address}', expected 'unix:<path>' or '<host>:<port>'")
+    return socket.AF_INET6 if ":" in host else socket.AF_INET, (host.strip("[]") or "127.0.0.1", int(port))
+
+
+def connect(address: str) -> socket.socket:
+    family, addr = parseAddress(address)
+    if family == socket.AF_UNIX:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(addr)
+        return sock
+    return socket.create_connection(addr)
+
+
+def sendRecord(sock: socket.socket, record: Dict[str, Any]) -> None:
+    sock.sendall(json.dumps(record, default=jsonDefault).encode() + b"\n")
+
+
+class StreamSink(ResultSink):
+    """
+    Result sink streaming records to a controller instead of a file.
+    """
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.lock = Lock()
+        self.index = []
+
+    def write(self, record: Dict[str, Any]) -> None:
+        with self.lock:
+            sendRecord(self.sock, record)
+
+    def sync(self, force: bool = False) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class Agent:
+    """
+    Serves kbench actions to controllers. Every session runs in a
+    forked child, so each starts from freshly loaded registries and
+    a crashed session does not take down the agent.
+    """
+
+    def __init__(self, address: str, token: str | None = None, configDir: str = "./config") -> None:
+        if parseAddress(address)[0] != socket.AF_UNIX and not token:
+            raise ValueError(f"Agents listening on TCP require a token (--token or {tokenVariable})")
+        self.address = address
+        self.token = token
+        self.configDir = os.path.realpath(configDir)
+        self.children = set()
+
+    def configPath(self, name: str | None) -> str:
+        """
+        Resolve a configuration name sent by a controller. Only files
+        directly in the agent's config directory can be used.
+        """
+        if name is None:
+            return RunConfig.defaultConfigPath
+        if not isinstance(name, str) or name != os.path.basename(name) or name.startswith("."):
+            raise ValueError(f"Invalid configuration name '{name}', expected a file in '{self.configDir}'")
+        if not name.endswith(".toml"):
+            name += ".toml"
+        path = os.path.realpath(os.path.join(self.configDir, name))
+        if os.path.dirname(path) != self.configDir or not os.path.isfile(path):
+            raise ValueError(f"No configuration '{name}' in '{self.configDir}'")
+        return path
+
+    def authorize(self, request: Dict[str, Any]) -> None:
+        if self.token is None:
+            return
+        token = request.get("token")
+        if not isinstance(token, str) or not hmac.compare_digest(token.encode(), self.token.encode()):
+            raise PermissionError("Invalid agent token")
+
+    def listen(self) -> socket.socket:
+        family, addr = parseAddress(self.address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(addr):
+                os.unlink(addr)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.bind(addr)
+            sock.listen()
+            return sock
+        return socket.create_server(addr, family=family)
+
+    def reap(self) -> None:
+        for pid in list(self.children):
+            done, status = os.waitpid(pid, os.WNOHANG)
+            if done:
+                self.children.discard(pid)
+                if os.waitstatus_to_exitcode(status) != 0:
+                    log.warning(f"Agent session {pid} exited with status {os.waitstatus_to_exitcode(status)}")
+
+    def serve(self, stopEvent: Event) -> None:
+        server = self.listen()
+        server.settimeout(1.0)
+        log.info(f"Agent listening on '{self.address}'")
+        try:
+            while not stopEvent.is_set():
+                self.reap()
+                try:
+                    conn, peer = server.accept()
+                except socket.timeout:
+                    continue
+                conn.settimeout(None)
+
+                pid = os.fork()
+                if pid == 0:
+                    status = 1
+                    try:
+                        server.close()
+                        status = self.session(conn)
+                    finally:
+                        os._exit(status)
+                conn.close()
+                self.children.add(pid)
+                log.debug(f"Agent session {pid} started for '{peer or 'local'}'")
+        finally:
+            server.close()
+            if parseAddress(self.address)[0] == socket.AF_UNIX:
+                os.unlink(parseAddress(self.address)[1])
+
+    def session(self, conn: socket.socket) -> int:
+        reader = conn.makefile("rb")
+        stopEvent = Event()
+        try:
+            request = json.loads(reader.readline() or b"null")
+            if not isinstance(request, dict) or request.get("op") not in ops:
+                raise ValueError("Invalid agent request")
+            self.authorize(request)
+            configPath = self.configPath(request.get("config"))
+
+            def waitStop():
+                # Stop on request or when the controller goes away,
+                # a line that is not a request ends the session too
+                try:
+                    for line in reader:
+                        if json.loads(line).get("op") == "stop":
+                            break
+                except (ValueError, AttributeError, OSError) as e:
+                    log.warning(f"Stopping agent session: {e}")
+                finally:
+                    stopEvent.set()
+            Thread(target=waitStop, daemon=True).start()
+
+            args = Namespace(action=request["op"], config=configPath, offline=request.get("offline", False))
+            config = RunConfig(args)
+            SourceCache.configure(config.cacheDir, config.offline)
+
+            sink = StreamSink(conn)
+            metadata = core.actions.metadata(config)
+            metadata["host"] = socket.gethostname()
+            metadata["agent"] = self.address
+            match config.action:
+                case "run":
+                    core.actions.run(config, sink, metadata)
+                case "monitor":
+                    interval = min(config.flushInterval, streamInterval)
+                    core.actions.monitor(config, sink, metadata, stopEvent, interval)
+            sendRecord(conn, {"type": "done"})
+            return 0
+        except Exception as e:
+            log.exception(e, exc_info=True)
+            try:
+                sendRecord(conn, {"type": "error", "message": str(e)})
+            except OSError:
+                pass
+            return 1
+        finally:
+            conn.close()
+
+
+class Controller:
+    """
+    Drives several agents in parallel, writing the records each one
+    streams back to its own local results file.
+    """
+
+    def __init__(self, agents: List[str], request: Dict[str, Any], sinkFactory: Callable[[str], ResultSink]) -> None:
+        self.agents = agents
+        self.request = request
+        self.sinkFactory = sinkFactory
+        self.socks: Dict[str, socket.socket] = {}
+        self.errors: Dict[str, str] = {}
+        self.lock = Lock()
+
+    def session(self, agent: str) -> None:
+        try:
+            sock = connect(agent)
+        except OSError as e:
+            self.errors[agent] = f"cannot connect: {e}"
+            return
+        with self.lock:
+            self.socks[agent] = sock
+
+        sink = self.sinkFactory(agent)
+        try:
+            sendRecord(sock, self.request)
+            for line in sock.makefile("rb"):
+                record = json.loads(line)
+                match record["type"]:
+                    case "done":
+                        return
+                    case "error":
+                        self.errors[agent] = record["message"]
+                        return
+                sink.write(record)
+            self.errors[agent] = "connection closed before the session finished"
+        except OSError as e:
+            self.errors[agent] = str(e)
+        finally:
+            sink.close()
+            with self.lock:
+                del self.socks[agent]
+            sock.close()
+
+    def stop(self) -> None:
+        with self.lock:
+            for sock in self.socks.values():
+                try:
+                    sendRecord(sock, {"op": "stop"})
+                except OSError:
+                    pass
+
+    def run(self, stopEvent: Event) -> None:
+        threads = [Thread(target=self.session, args=(agent,), name=f"agent:{agent}") for agent in self.agents]
+        for t in threads:
+            t.start()
+
+        # Forward a stop request, e.g. on SIGINT, to every agent
+        while any(t.is_alive() for t in threads):
+            if stopEvent.wait(0.5):
+                self.stop()
+                break
+        for t in threads:
+            t.join()
+
+        for agent, message in self.errors.items():
+            log.error(f"Agent '{agent}': {message}")
+        if self.errors:
+            raise RuntimeError(f"{len(self.errors)} of {len(self.agents)} agent sessions failed")
+
+
+def control(config: RunConfig, agents: List[str], op: str, stopEvent: Event, token: str | None = None) -> List[str]:
+    """
+    Run 'op' on every agent with the given configuration, which must
+    exist under the same name in the agents' config directories.
+    Returns the results files written.
+    """
+    sinkClass, ext = core.actions.sinkClass(config)
+    configName = os.path.splitext(os.path.basename(config.configPath))[0]
+    t = datetime.now()
+    paths = []
+
+    def sinkFactory(agent: str) -> ResultSink:
+        label = agent.replace("unix:", "").replace("/", "_").replace(":", "_").strip("_")
+        path = os.path.join("./results", f"{configName}-{label}-{t.strftime('%d%m%Y-%H%M')}.{ext}")
+        paths.append(path)
+        return sinkClass(path)
+
+    request = {"op": op, "config": os.path.basename(config.configPath), "offline": config.offline}
+    if token:
+        request["token"] = token
+    Controller(agents, request, sinkFactory).run(stopEvent)
+    return paths
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import logging as log
+
+from typing import Any, Dict, Iterator
+
+from core.series import jsonDefault
+
+
+class Defaults:
+    fsyncInterval = 5.0
+
+
+class ResultSink:
+    """
+    Append-only JSON Lines results file.
+
+    Records are written as soon as they are produced and the file is
+    fsync'ed periodically, so a crashed or killed run leaves behind
+    every record written up to that point. Closing the sink appends a
+    summary record with the byte offset of every other record.
+    """
+
+    def __init__(self, path: str, fsyncInterval: float = Defaults.fsyncInterval) -> None:
+        self.path = path
+        self.file = open(path, "ab")
+        self.fsyncInterval = fsyncInterval
+        self.lastSync = time.monotonic()
+        self.index = []
+
+    def write(self, record: Dict[str, Any]) -> None:
+        offset = self.file.tell()
+        self.file.write(json.dumps(record, default=jsonDefault).encode())
+        self.file.write(b"\n")
+        self.file.flush()
+
+        entry = {"type": record["type"], "offset": offset}
+        for key in ("workload", "iteration"):
+            if key in record:
+                entry[key] = record[key]
+        self.index.append(entry)
+        self.sync()
+
+    def sync(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if force or now - self.lastSync >= self.fsyncInterval:
+            os.fsync(self.file.fileno())
+            self.lastSync = now
+
+    def writeMetadata(self, metadata: Dict[str, Any]) -> None:
+        self.write({"type": "meta", **metadata})
+
+    def writeSamples(self, metrics: Dict[str, Any], overhead: Dict[str, Any] | None = None) -> None:
+        record = {"type": "samples", "metrics": metrics}
+        if overhead is not None:
+            record["kbench_overhead"] = overhead
+        self.write(record)
+
+    def writeIteration(self, workload: str, iteration: int, result: Dict[str, Any]) -> None:
+        self.write({"type": "iteration", "workload": workload, "iteration": iteration, **result})
+
+    def writeWorkload(self, workload: str, summary: Dict[str, Any]) -> None:
+        self.write({"type": "workload", "workload": workload, **summary})
+
+    def close(self) -> None:
+        summary = {"type": "summary", "records": len(self.index), "index": self.index}
+        self.file.write(json.dumps(summary).encode())
+        self.file.write(b"\n")
+        self.file.flush()
+        self.sync(force=True)
+        self.file.close()
+        log.debug(f"Closed results file '{self.path}' ({len(self.index)} records)")
+
+
+def readRecords(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Yield every complete record of a JSON Lines results file.
+    A truncated trailing record, e.g. from a killed run, is skipped.
+    """
+    with open(path, "rb") as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                log.warning(f"'{path}': skipping truncated record")
+                return
+
+
+def _extendSeries(dst: Dict[str, Any], src: Dict[str, Any]) -> None:
+    # Views only carry a count when it differs from the samples they hold
+    count = dst.get("count", len(dst["timestamps"])) + src.get("count", len(src["timestamps"]))
+    for key in ("timestamps", "values", "runs"):
+        if key in src:
+            dst.setdefault(key, []).extend(src[key])
+    if count != len(dst["timestamps"]):
+        dst["count"] = count
+    if "stride" in src:
+        dst["stride"] = max(dst.get("stride", 1), src["stride"])
+    if src.get("end") is not None:
+        dst["end"] = src["end"]
+
+
+def _extendMetrics(dst: Dict[str, Any], src: Dict[str, Any]) -> None:
+    for key, value in src.items():
+        if key not in dst:
+            dst[key] = value
+        elif isinstance(value, dict) and "timestamps" in value and "values" in value:
+            _extendSeries(dst[key], value)
+        elif isinstance(value, dict):
+            _extendMetrics(dst[key], value)
+        elif isinstance(value, list):
+            dst[key].extend(value)
+        else:
+            dst[key] = value
+
+
+def recover(path: str) -> Dict[str, Any]:
+    """
+    Rebuild the nested results dictionary from a (possibly partial)
+    JSON Lines results file.
+    """
+    results = {}
+    for record in readRecords(path):
+        match record.pop("type"):
+            case "meta":
+                results.update(record)
+            case "samples":
+                _extendMetrics(results.setdefault("metrics", {}), record["metrics"])
+            case "iteration":
+                workload = record.pop("workload")
+                iteration = record.pop("iteration")
+                results.setdefault(workload, {})[iteration] = record
+            case "workload":
+                workload = record.pop("workload")
+                results.setdefault(workload, {}).update(record)
+    return results
@@ -3,8 +3,9 @@ import shutil
 import subprocess
 import logging as log
 
+from typing import Dict, List, Tuple
+
 from core.config import SysInfo
-from util.os import pushd
 
 class MakeRunner:
     def __init__(self, makeConfig, cwd):
@@ -20,18 +21,27 @@ class MakeRunner:
             log.info(f"Creating build directory '{self.builddir}'")
             os.makedirs(self.builddir)
 
-    def run(self, args, silent=False):
+    def verify(self):
+        """
+        Check that the outputs of the last setup are still there.
+        """
+        if self.builddir and not os.path.isdir(self.builddir):
+            raise FileNotFoundError(f"cannot find build directory {self.builddir}")
+
+    def command(self, args) -> Tuple[List[str], Dict[str, str] | None, str]:
+        """
+        Return the argument vector, environment and working directory to run 'args' with.
+        """
         log.debug("env: %s, rootdir: %s", str(self.envvar), str(self.rootdir))
-        if self.rootdir:
-            os.chdir(self.rootdir)
+        return ["make", f"-j{self.ncpu}", *args], self.envvar, self.rootdir
 
+    def run(self, args, silent=False):
+        argv, env, cwd = self.command(args)
         stdout = None
         if silent:
             stdout = subprocess.DEVNULL
 
-        subprocess.run(
-            ["make", f"-j{self.ncpu}", *args], env=self.envvar, stdout=stdout
-        )
+        subprocess.run(argv, env=env, stdout=stdout, cwd=cwd)
 
 class ExecRunner:
     def __init__(self, execConfig, cwd):
@@ -40,19 +50,26 @@ class ExecRunner:
         self.cwd = cwd
 
     def setup(self):
+        self.verify()
+
+    def verify(self):
         for cmd in self.cmds:
-            if not os.path.exists(cmd):
-                raise Exception(f"cannot find benchmark binary {cmd}")
+            if not os.path.exists(os.path.join(self.cwd, cmd)):
+                raise FileNotFoundError(f"cannot find benchmark binary {cmd}")
 
-    def run(self, args, silent=False):
+    def command(self, args) -> Tuple[List[str], Dict[str, str] | None, str]:
+        """
+        Return the argument vector, environment and working directory to run 'args' with.
+        """
         if args[0] not in self.cmds:
             raise Exception("exec: executable {} is not a part of the benchmark".format(args[0]))
+        args = [os.path.join(self.cwd, args[0]), *args[1:]]
+        log.debug("exec: cwd: %s env: %s, args: %s", self.cwd, str(self.envvar), args)
+        return args, self.envvar, self.cwd
+
+    def run(self, args, silent=False):
+        argv, env, cwd = self.command(args)
         stdout = None
         if silent:
             stdout = subprocess.DEVNULL
-        args[0] = os.path.join(self.cwd, args[0])
-        with pushd(self.cwd):
-            log.debug("exec: cwd: %s env: %s, args: %s", os.getcwd(), str(self.envvar), args)
-            subprocess.run(
-                args, env=self.envvar, stdout=stdout
-            )
+        subprocess.run(argv, env=env, stdout=stdout, cwd=cwd)
@@ -0,0 +1,190 @@
+import time
+import heapq
+import logging as log
+
+from typing import List
+from threading import Thread, Event, Lock
+
+from core.overhead import Overhead
+from core.series import SampleSeries
+
+
+class SamplingGroup:
+    """
+    Metrics sharing the same sampling period.
+    Keeps the lateness of every sample it took.
+    """
+
+    # Samples taken later than this fraction of the period count as late
+    lateThreshold = 0.1
+
+    def __init__(self, periodMs: int, metrics: List, overhead: Overhead | None = None) -> None:
+        self.name = f"{periodMs}ms"
+        self.period = periodMs / 1000.0
+        self.metrics = metrics
+        self.overhead = overhead
+        self.lateness = SampleSeries()
+        self.missed = 0
+        self.late = 0
+
+    def sample(self, epoch: float, deadline: float) -> None:
+        ts = time.monotonic()
+        for m in self.metrics:
+            if self.overhead:
+                self.overhead.timeSample(m.label(), m, ts - epoch)
+            else:
+                m.sample(ts - epoch)
+        self.lateness.append(ts - epoch, ts - deadline)
+        if ts - deadline > self.period * SamplingGroup.lateThreshold:
+            self.late += 1
+            if self.overhead:
+                self.overhead.late += 1
+
+    def getResults(self, resultsDict, window=None) -> None:
+        resultsDict["schedule"][self.name] = {
+            "period": self.period,
+            "lateness": self.lateness.view(window),
+            "missed": self.missed,
+            "late": self.late,
+        }
+
+    def reset(self) -> None:
+        self.lateness.reset()
+        self.missed = 0
+        self.late = 0
+
+    def discard(self, before: float) -> None:
+        self.lateness.discard(before)
+
+
+class AdaptiveSamplingGroup(SamplingGroup):
+    """
+    Sampling group whose period follows how quickly its metrics change.
+    The period is halved whenever a sample differs from the previous one
+    and doubled after 'backoff' unchanged samples in a row, staying
+    between the configured bounds. Keeps the period every sample was
+    taken at.
+    """
+
+    # Unchanged samples in a row before the period is doubled
+    backoff = 4
+
+    def __init__(
+        self, name: str, minPeriodMs: int, maxPeriodMs: int, metrics: List, overhead: Overhead | None = None
+    ) -> None:
+        super().__init__(minPeriodMs, metrics, overhead)
+        self.name = name
+        self.minPeriod = minPeriodMs / 1000.0
+        self.maxPeriod = maxPeriodMs / 1000.0
+        self.steady = 0
+        self.periods = SampleSeries(encoding="rle")
+
+    def sample(self, epoch: float, deadline: float) -> None:
+        super().sample(epoch, deadline)
+        self.periods.append(deadline - epoch, self.period)
+
+        if any(m.changed for m in self.metrics):
+            self.period = max(self.period / 2, self.minPeriod)
+            self.steady = 0
+        else:
+            self.steady += 1
+            if self.steady >= AdaptiveSamplingGroup.backoff:
+                self.period = min(self.period * 2, self.maxPeriod)
+                self.steady = 0
+
+    def getResults(self, resultsDict, window=None) -> None:
+        super().getResults(resultsDict, window)
+        resultsDict["schedule"][self.name]["periods"] = self.periods.view(window)
+
+    def reset(self) -> None:
+        super().reset()
+        self.periods.reset()
+
+    def discard(self, before: float) -> None:
+        super().discard(before)
+        self.periods.discard(before)
+
+
+class SamplingScheduler:
+    """
+    Samples all continuous metric groups from a single thread.
+
+    Deadlines are kept in a heap and lie on a fixed grid anchored at
+    the scheduler's start time, so the time spent sampling does not
+    make the period drift. Groups whose deadlines coincide are sampled
+    in the same wakeup.
+    """
+
+    # Deadlines closer than this are considered coincident
+    mergeWindow = 0.001
+
+    def __init__(self, groups: List[SamplingGroup], lock: Lock) -> None:
+        self.groups = groups
+        # Held while sampling so results can be fetched concurrently
+        self.lock = lock
+        self.stopEvent = Event()
+        self.thread = None
+        self.epoch = 0.0
+        self.overhead = groups[0].overhead if groups else None
+
+    def start(self, epoch: float) -> None:
+        self.stopEvent.clear()
+        self.epoch = epoch
+        heap = [(self.epoch + g.period, i, g) for i, g in enumerate(self.groups)]
+        heapq.heapify(heap)
+
+        self.thread = Thread(target=self._loop, args=(heap,), name="kbench-sampler")
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.thread is None:
+            return
+        self.stopEvent.set()
+        self.thread.join()
+        self.thread = None
+
+    def _loop(self, heap) -> None:
+        cpuTime = time.thread_time()
+        while heap:
+            timeout = heap[0][0] - time.monotonic()
+            if self.stopEvent.wait(max(timeout, 0)):
+                break
+
+            now = time.monotonic()
+            due = []
+            while heap and heap[0][0] <= now + SamplingScheduler.mergeWindow:
+                due.append(heapq.heappop(heap))
+
+            for deadline, seq, group in due:
+                with self.lock:
+                    group.sample(self.epoch, deadline)
+
+                # Stay on the grid, skipping (and counting) ticks we overran
+                nextDeadline = deadline + group.period
+                now = time.monotonic()
+                if nextDeadline <= now:
+                    skipped = int((now - nextDeadline) // group.period) + 1
+                    nextDeadline += skipped * group.period
+                    group.missed += skipped
+                    if group.overhead:
+                        group.overhead.missed += skipped
+                    log.debug(f"Sampling group '{group.name}' missed {skipped} deadline(s)")
+                heapq.heappush(heap, (nextDeadline, seq, group))
+
+            if self.overhead:
+                now = time.thread_time()
+                with self.lock:
+                    self.overhead.samplerCpu += now - cpuTime
+                cpuTime = now
+
+    def getResults(self, resultsDict, window=None) -> None:
+        for g in self.groups:
+            g.getResults(resultsDict, window)
+
+    def reset(self) -> None:
+        for g in self.groups:
+            g.reset()
+
+    def discard(self, before: float) -> None:
+        for g in self.groups:
+            g.discard(before)
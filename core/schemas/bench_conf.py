@@ -17,6 +17,7 @@ schema = {
                 "type": "dict",
                 "schema": {
                     "url": {"required": True, "type": "string"},
+                    "sha256": {"required": False, "type": "string", "regex": "[0-9a-fA-F]{64}"},
                 },
             },
             "git": {
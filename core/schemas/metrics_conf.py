@@ -8,6 +8,21 @@ schema = {
                 "mode": {"required": False, "type": "string"},
                 "sampling_rate": {"required": False, "type": "integer"},
                 "oids": {"required": True, "type": "list"},
+                "capacity": {"required": False, "type": "integer", "min": 1},
+                "overflow": {
+                    "required": False,
+                    "type": "string",
+                    "allowed": ["ring", "downsample"],
+                },
+                "encoding": {"required": False, "type": "string", "allowed": ["raw", "rle"]},
+                "adaptive": {
+                    "required": False,
+                    "type": "dict",
+                    "schema": {
+                        "min_period": {"required": True, "type": "integer", "min": 1},
+                        "max_period": {"required": True, "type": "integer", "min": 1},
+                    },
+                },
             },
         },
     },
@@ -18,6 +33,57 @@ schema = {
             "schema": {
                 "command": {"required": True, "type": "string"},
                 "stats": {"required": True, "type": "list"},
+                "sampling_rate": {"required": False, "type": "integer"},
+                "capacity": {"required": False, "type": "integer", "min": 1},
+                "overflow": {
+                    "required": False,
+                    "type": "string",
+                    "allowed": ["ring", "downsample"],
+                },
+                "encoding": {"required": False, "type": "string", "allowed": ["raw", "rle"]},
+                "adaptive": {
+                    "required": False,
+                    "type": "dict",
+                    "schema": {
+                        "min_period": {"required": True, "type": "integer", "min": 1},
+                        "max_period": {"required": True, "type": "integer", "min": 1},
+                    },
+                },
+            },
+        },
+    },
+    # Long-lived commands whose periodic output is parsed into series
+    "collector": {
+        "type": "list",
+        "schema": {
+            "type": "dict",
+            "schema": {
+                "name": {"required": True, "type": "string"},
+                "command": {"required": True, "type": "list", "schema": {"type": "string"}},
+                # Whitespace-separated column names, "-" skips a column
+                "columns": {"required": False, "type": "list", "schema": {"type": "string"}},
+                # Regex parsers, alternatively to 'columns'
+                "extract": {
+                    "required": False,
+                    "type": "list",
+                    "schema": {
+                        "type": "dict",
+                        "schema": {
+                            "name": {"required": True, "type": "string"},
+                            "regex": {"required": True, "type": "string"},
+                            "type": {"required": False, "type": "string", "allowed": ["float", "int"]},
+                        },
+                    },
+                },
+                # Data lines to drop at the start
+                "skip": {"required": False, "type": "integer", "min": 0},
+                "capacity": {"required": False, "type": "integer", "min": 1},
+                "overflow": {
+                    "required": False,
+                    "type": "string",
+                    "allowed": ["ring", "downsample"],
+                },
+                "encoding": {"required": False, "type": "string", "allowed": ["raw", "rle"]},
             },
         },
     },
@@ -30,6 +96,10 @@ schema = {
                     "required": True,
                     "type": "string",
                 },
+                # Milliseconds between aggregation dumps
+                "sampling_rate": {"required": False, "type": "integer", "min": 1},
+                # DTrace binary, or a stand-in with the same interface
+                "tracer": {"required": False, "type": "string"},
                 "scripts": {
                     "required": True,
                     "type": "list",
@@ -38,9 +108,47 @@ schema = {
                         "schema": {
                             "name": {"required": True, "type": "string"},
                             "src": {"type": "string"},
+                            # How trace() values are aggregated per period
+                            "aggregation": {
+                                "required": False,
+                                "type": "string",
+                                "allowed": ["count", "sum", "min", "max", "avg"],
+                            },
                         },
                     },
                 },
+                "capacity": {"required": False, "type": "integer", "min": 1},
+                "overflow": {
+                    "required": False,
+                    "type": "string",
+                    "allowed": ["ring", "downsample"],
+                },
+                "encoding": {"required": False, "type": "string", "allowed": ["raw", "rle"]},
+            },
+        },
+    },
+    # Post-processing of fetched series, run in declaration order
+    "derived": {
+        "type": "list",
+        "schema": {
+            "type": "dict",
+            "schema": {
+                "name": {"required": True, "type": "string"},
+                "type": {
+                    "required": True,
+                    "type": "string",
+                    "allowed": ["rate", "diff", "summary", "expr"],
+                },
+                # Path of the input series, e.g. "sysctl/vm.pmap.pde.promotions"
+                "source": {"required": False, "type": "string"},
+                "quantiles": {
+                    "required": False,
+                    "type": "list",
+                    "schema": {"type": "number", "min": 0, "max": 1},
+                },
+                "compression": {"required": False, "type": "integer", "min": 10},
+                "expr": {"required": False, "type": "string"},
+                "vars": {"required": False, "type": "dict", "valuesrules": {"type": "string"}},
             },
         },
     },
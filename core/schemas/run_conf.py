@@ -8,4 +8,29 @@ schema = {
         "required": True,
         "type": "string",
     },
+    # Seconds between writing monitoring samples to the results file
+    "flush_interval": {"required": False, "type": "number", "min": 0.1},
+    # Results file format
+    "format": {"required": False, "type": "string", "allowed": ["json", "binary"]},
+    # Number of benchmarks built concurrently
+    "build_jobs": {"required": False, "type": "integer", "min": 1},
+    # Shared download and git mirror cache
+    "cache_dir": {"required": False, "type": "string"},
+    # Fail instead of downloading anything missing from the cache
+    "offline": {"required": False, "type": "boolean"},
+    # Run workloads concurrently on disjoint CPU sets
+    "concurrent": {"required": False, "type": "boolean"},
+    # CPU lists use the cpuset(1) syntax, e.g. "2-7,10"
+    "affinity": {
+        "required": False,
+        "type": "dict",
+        "schema": {
+            # CPUs benchmark processes are pinned to
+            "workload_cpus": {"required": False, "type": "string", "regex": r"[0-9,\- ]+"},
+            # CPUs kbench itself and its sampler are pinned to
+            "housekeeping_cpus": {"required": False, "type": "string", "regex": r"[0-9,\- ]+"},
+            # NUMA domain benchmark memory is allocated from
+            "numa_domain": {"required": False, "type": "integer", "min": 0},
+        },
+    },
 }
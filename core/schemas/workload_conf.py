@@ -11,6 +11,26 @@ schema = {
             "exec_post": {"required": False, "type": "string"},
             "run_args": {"required": True, "type": "string"},
             "iterations": {"required": False, "type": "integer", "default": 1},
+            "min_iterations": {"required": False, "type": "integer", "min": 1},
+            "max_iterations": {"required": False, "type": "integer", "min": 1},
+            "warmup": {"required": False, "type": "integer", "min": 0, "default": 0},
+            "target_ci": {"required": False, "type": "number", "min": 0},
+            # Resources reserved when running concurrently with other workloads
+            "cpus": {"required": False, "type": "integer", "min": 1},
+            "memory": {"required": False, "type": "integer", "min": 0},
         },
-    }
+    },
+    # Values parsed from the benchmark's standard output
+    "extract": {
+        "required": False,
+        "type": "list",
+        "schema": {
+            "type": "dict",
+            "schema": {
+                "name": {"required": True, "type": "string"},
+                "regex": {"required": True, "type": "string"},
+                "type": {"required": False, "type": "string", "allowed": ["float", "int"]},
+            },
+        },
+    },
 }
@@ -0,0 +1,292 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Tuple
+
+
+class SampleSeries:
+    """
+    Columnar storage for a single timestamped metric series.
+
+    Timestamps and numeric values are kept in typed arrays instead of
+    lists of boxed Python objects. Values that do not fit a typed array
+    (strings, tuples, integers above 2^63) make the value column fall
+    back to a plain list.
+
+    A series can optionally be bounded to 'capacity' samples. Once full,
+    'ring' overflow overwrites the oldest samples while 'downsample'
+    overflow halves the resolution of the whole series and keeps every
+    other sample from then on.
+
+    With 'rle' encoding, samples equal to the previous one only bump
+    the run length of the stored sample, so a flat counter costs one
+    entry no matter how often it is sampled. The series then holds
+    the points where the value changed, how many samples each value
+    lasted for and the timestamp of the last sample.
+    """
+
+    overflowModes = ["ring", "downsample"]
+    encodings = ["raw", "rle"]
+
+    def __init__(
+        self, capacity: int | None = None, overflow: str = "ring", encoding: str = "raw"
+    ) -> None:
+        if overflow not in SampleSeries.overflowModes:
+            raise ValueError(f"Unknown series overflow mode '{overflow}'")
+        if encoding not in SampleSeries.encodings:
+            raise ValueError(f"Unknown series encoding '{encoding}'")
+
+        self.capacity = capacity
+        self.overflow = overflow
+        self.encoding = encoding
+        self._init()
+
+    def _init(self) -> None:
+        self.ts = array("d")
+        self.values = None
+        self.count = 0
+        # Index of the oldest sample once a ring buffer wrapped around
+        self.head = 0
+        # Downsampling state
+        self.stride = 1
+        self.skip = 0
+        # Run lengths and last sample for 'rle' encoding
+        self.runs = array("q") if self.encoding == "rle" else None
+        self.last = None
+        self.end = None
+
+    @staticmethod
+    def _column(value: Any):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return []
+        return array("q" if isinstance(value, int) else "d")
+
+    def _demote(self) -> None:
+        # Value does not fit the typed column, fall back to a list
+        self.values = self.values.tolist()
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def append(self, ts: float, value: Any) -> None:
+        self.count += 1
+        if self.stride > 1:
+            self.skip += 1
+            if self.skip < self.stride:
+                if self.runs is not None and len(self.ts):
+                    # Run lengths count every sample, kept or not
+                    self.runs[self.head - 1] += 1
+                    self.end = ts
+                return
+            self.skip = 0
+
+        if self.values is None:
+            self.values = SampleSeries._column(value)
+
+        if self.runs is not None:
+            self.end = ts
+            if len(self.ts) and value == self.last:
+                # The newest entry sits right before the ring's head
+                self.runs[self.head - 1] += 1
+                return
+            self.last = value
+
+        if self.capacity and len(self.ts) >= self.capacity:
+            if self.overflow == "ring":
+                self._overwrite(ts, value)
+                return
+            self._decimate()
+
+        self.ts.append(ts)
+        if self.runs is not None:
+            self.runs.append(1)
+        try:
+            self.values.append(value)
+        except (OverflowError, TypeError):
+            self._demote()
+            self.values.append(value)
+
+    def _overwrite(self, ts: float, value: Any) -> None:
+        self.ts[self.head] = ts
+        if self.runs is not None:
+            self.runs[self.head] = 1
+        try:
+            self.values[self.head] = value
+        except (OverflowError, TypeError):
+            self._demote()
+            self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+
+    def _decimate(self) -> None:
+        if self.runs is not None:
+            # Every kept entry absorbs the runs of the one dropped after it
+            runs = self.runs[::2]
+            for i, n in enumerate(self.runs[1::2]):
+                runs[i] += n
+            self.runs = runs
+        self.ts = self.ts[::2]
+        self.values = self.values[::2]
+        self.stride *= 2
+        # The sample being appended lines up with the new stride
+        self.skip = 0
+
+    def timestamps(self):
+        """
+        Return the timestamps in order, without copying them
+        unless a ring buffer has wrapped around.
+        """
+        if self.head:
+            return self.ts[self.head :] + self.ts[: self.head]
+        return memoryview(self.ts)
+
+    def samples(self):
+        """
+        Return the values in order, without copying them
+        unless a ring buffer has wrapped around.
+        """
+        if self.values is None:
+            return []
+        if self.head:
+            return self.values[self.head :] + self.values[: self.head]
+        if isinstance(self.values, array):
+            return memoryview(self.values)
+        return self.values
+
+    def runLengths(self):
+        """
+        Return the number of samples every stored value lasted for,
+        for 'rle' encoded series.
+        """
+        if self.head:
+            return self.runs[self.head :] + self.runs[: self.head]
+        return memoryview(self.runs)
+
+    def _ordered(self):
+        # Columns in timestamp order, never exported as memoryviews so
+        # sampling can keep appending to them
+        if self.head:
+            return (
+                self.ts[self.head :] + self.ts[: self.head],
+                self.values[self.head :] + self.values[: self.head],
+                None if self.runs is None else self.runs[self.head :] + self.runs[: self.head],
+            )
+        return self.ts, self.values if self.values is not None else [], self.runs
+
+    def window(self, start: float, end: float) -> Dict[str, Any]:
+        """
+        Return a copy of the samples taken between 'start' and 'end'.
+        """
+        ts, values, runs = self._ordered()
+        lo = bisect_left(ts, start)
+        hi = bisect_right(ts, end)
+        if runs is not None and lo > 0:
+            # Include the run still in effect when the window opened
+            lo -= 1
+        result = {"timestamps": ts[lo:hi], "values": values[lo:hi]}
+        if runs is not None:
+            self._clipRuns(result, ts, runs, lo, hi, start, end)
+        if self.stride > 1:
+            result["stride"] = self.stride
+        return result
+
+    def _runStep(self, ts, runs, i: int) -> float:
+        # Spacing of the samples folded into run 'i', as in expandRuns()
+        if i + 1 < len(ts):
+            return (ts[i + 1] - ts[i]) / runs[i]
+        if runs[i] > 1 and self.end is not None:
+            return (self.end - ts[i]) / (runs[i] - 1)
+        return 0.0
+
+    def _clipRuns(self, result: Dict[str, Any], ts, runs, lo: int, hi: int, start: float, end: float) -> None:
+        # Keep only the samples of the first and last runs taken
+        # between 'start' and 'end'
+        result["runs"] = runs[lo:hi]
+        if hi <= lo:
+            return
+        first = ts[lo]
+        if first < start:
+            step = self._runStep(ts, runs, lo)
+            skip = int(-(-(start - first) // step)) if step > 0 else runs[lo]
+            if skip >= runs[lo]:
+                # None of its samples fall into the window
+                for key in ("timestamps", "values", "runs"):
+                    result[key] = result[key][1:]
+                lo += 1
+            else:
+                result["timestamps"][0] = first + skip * step
+                result["runs"][0] -= skip
+        if hi <= lo:
+            return
+
+        step = self._runStep(ts, runs, hi - 1)
+        last = result["timestamps"][-1]
+        if step > 0:
+            keep = min(int((end - last) // step) + 1, result["runs"][-1])
+            result["runs"][-1] = keep
+            result["end"] = last + (keep - 1) * step
+        else:
+            result["end"] = last
+
+    def discard(self, before: float) -> None:
+        """
+        Drop all samples taken before 'before'. For 'rle' series the
+        run in effect at 'before' is kept, later windows start in it.
+        """
+        ts, values, runs = self._ordered()
+        n = bisect_left(ts, before)
+        if runs is not None and n > 0 and (n == len(ts) or ts[n] > before):
+            n -= 1
+        if n == 0:
+            return
+        self.ts = ts[n:]
+        self.values = values[n:]
+        if runs is not None:
+            self.runs = runs[n:]
+        self.head = 0
+        self.count = max(self.count - n * self.stride, len(self.ts))
+
+    def view(self, window: Tuple[float, float] | None = None) -> Dict[str, Any]:
+        if window is not None:
+            return self.window(*window)
+        result = {"timestamps": self.timestamps(), "values": self.samples()}
+        if self.runs is not None:
+            result["runs"] = self.runLengths()
+            result["end"] = self.end
+        if self.count != len(self.ts):
+            result["count"] = self.count
+        if self.stride > 1:
+            result["stride"] = self.stride
+        return result
+
+    def reset(self) -> None:
+        # Hand the current columns over to any outstanding views
+        # and start with fresh ones instead of clearing them in place
+        self._init()
+
+
+def expandRuns(ts, values, runs, end: float | None = None) -> Tuple[Any, Any]:
+    """
+    Expand an 'rle' encoded series back into one entry per sample.
+    The samples folded into a run are taken to be evenly spaced up
+    to the next change, or up to the last sample at 'end'.
+    """
+    outTs = array("d")
+    outValues = array(values.typecode) if isinstance(values, array) else []
+    for i, (t, value, n) in enumerate(zip(ts, values, runs)):
+        if i + 1 < len(ts):
+            step = (ts[i + 1] - t) / n
+        elif n > 1 and end is not None:
+            step = (end - t) / (n - 1)
+        else:
+            step = 0.0
+        outTs.extend(t + k * step for k in range(n))
+        outValues.extend([value] * n)
+    return outTs, outValues
+
+
+def jsonDefault(obj: Any) -> Any:
+    """
+    'default' hook for json.dump() serializing series views.
+    """
+    if isinstance(obj, (memoryview, array)):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
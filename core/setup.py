@@ -1,5 +1,6 @@
 import os
 import shutil
+import tarfile
 import pathlib
 import subprocess
 
@@ -7,48 +8,131 @@ import logging as log
 
 from abc import ABC, abstractmethod
 
+from core.cache import SourceCache
+
 
 class SrcHandler(ABC):
+    """
+    Fetches a benchmark's source files into '<cwd>/src'.
+    All paths are absolute so handlers can run concurrently
+    without touching the process-wide working directory.
+    """
+
+    @abstractmethod
+    def fetch(self):
+        pass
+
     @abstractmethod
-    def run(self):
+    def unpack(self):
         pass
 
     @abstractmethod
     def cleanup(self):
         pass
 
+    def digest(self) -> str | None:
+        """
+        Return a checksum or revision identifying the fetched sources
+        without reading them, or None if it is not known.
+        """
+        return None
+
+
+class ProgressReader:
+    """
+    File wrapper logging how much of an archive was consumed.
+    """
+
+    def __init__(self, file, total, name) -> None:
+        self.file = file
+        self.total = total
+        self.name = name
+        self.done = 0
+        self.nextReport = 0.1
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.done += len(data)
+        if self.total and self.done / self.total >= self.nextReport:
+            log.info(f"'{self.name}': {self.done * 100 // self.total}% unpacked")
+            self.nextReport += 0.1
+        return data
+
+
+def unpackArchive(path, dest):
+    """
+    Unpack 'path' into 'dest'. Tar archives are streamed member by
+    member instead of being scanned up front.
+    """
+    if not tarfile.is_tarfile(path):
+        shutil.unpack_archive(path, dest)
+        return
+
+    name = os.path.basename(path)
+    with open(path, "rb") as file:
+        reader = ProgressReader(file, os.path.getsize(path), name)
+        # Extraction filters are only available on newer Python releases
+        kwargs = {"filter": "tar"} if hasattr(tarfile, "tar_filter") else {}
+        with tarfile.open(fileobj=reader, mode="r|*") as tar:
+            for member in tar:
+                tar.extract(member, dest, **kwargs)
+
 
 class FetchSrcHandler(SrcHandler):
-    def __init__(self, url, cwd):
+    def __init__(self, url, cwd, sha256=None):
         self.url = url
-        self.filename = pathlib.Path(url).name
+        self.sha256 = sha256
+        self.archive = None
 
-        if not self.filename:
+        if not pathlib.Path(url).name:
             raise ValueError(
                 f"Invalid source url provided - unable to parse archive name from '{self.url}'"
             )
+        self.srcdir = os.path.join(cwd, "src")
 
-    def run(self):
-        # Do not download if file is already present
-        if not os.path.isfile(self.filename):
-            log.info(f"Downloading '{self.url}'")
-            subprocess.run(["fetch", "-o", self.filename, self.url], check=True)
+    def fetch(self):
+        # Downloads are shared through the source cache
+        self.archive = SourceCache.fetch(self.url, self.sha256)
 
-        log.info(f"Unpacking file '{self.filename}'")
-        shutil.unpack_archive(self.filename, "./src")
+    def unpack(self):
+        log.info(f"Unpacking file '{self.archive}'")
+        unpackArchive(self.archive, self.srcdir)
 
     def cleanup(self):
-        os.remove(self.filename)
+        shutil.rmtree(self.srcdir)
+
+    def digest(self):
+        if self.sha256:
+            return self.sha256.lower()
+        return SourceCache.cachedDigest(self.url)
+
 
 class GitSrcHandler(SrcHandler):
     def __init__(self, url, cwd):
         self.url = url
-        self.repo_dir = pathlib.Path(url).name
+        self.repo_dir = os.path.join(cwd, "src")
 
-    def run(self):
-        # TODO: use rev-parse to check if repo exists
+    def fetch(self):
+        # Clone locally from a cached mirror, then point the clone back upstream
+        mirror = SourceCache.mirror(self.url)
         log.info(f"Cloning repo '{self.url}'")
-        subprocess.run(["git", "clone", self.url, repo_dir], check=True)
+        subprocess.run(["git", "clone", mirror, self.repo_dir], check=True)
+        subprocess.run(
+            ["git", "-C", self.repo_dir, "remote", "set-url", "origin", self.url], check=True
+        )
+
+    def unpack(self):
+        pass
 
     def cleanup(self):
-        os.remove(self.repo_dir)
+        shutil.rmtree(self.repo_dir)
+
+    def digest(self):
+        result = subprocess.run(
+            ["git", "-C", self.repo_dir, "rev-parse", "HEAD"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        if result.returncode != 0:
+            return None
+        return result.stdout.decode().strip()
@@ -1,46 +1,116 @@
 import os
-import sys
 import glob
-import time
-import tomllib
-import cerberus
 import logging as log
 
-from multiprocessing import Process, Semaphore
+from statistics import fmean
+from threading import Condition, Lock, Thread
 from typing import Dict, Set, List
 
 from core.benchmark import BenchmarkRegistry, BenchmarkBase
 from core.metric import MetricRegistry, SysctlMetric
+from core.results import ResultSink
+from core.extract import Extractor, OutputParser
 
+import util.affinity
+import util.os
 import util.runners as runners
-import core.schemas.workload_conf
+import util.spawn
+import analysis.stats
+import core.config
+from core.config import ConfigLoader
 
 
 class Workload:
-    def __init__(self, configPath: str) -> None:
-        with open(configPath, mode="rb") as file:
-            config = tomllib.load(file)
-
-        v = cerberus.Validator(core.schemas.workload_conf.schema)
-        if not v.validate(config):
-            raise ValueError(f"invalid workload configuration: {v.errors}")
-        config = v.normalized(config)
+    def __init__(self, configPath: str, config: Dict | None = None) -> None:
+        if config is None:
+            config = ConfigLoader.load(configPath, "workload")
 
         self.name = config["info"]["name"]
         self.benchmark = config["info"]["benchmark"]
         self.iterations = config["info"].get("iterations", 1)
+
+        # Adaptive iteration control: run between 'min_iterations' and
+        # 'max_iterations' times, stopping once the relative width of the
+        # wall time's 95% confidence interval drops below 'target_ci'
+        self.warmup = config["info"]["warmup"]
+        self.targetCI = config["info"].get("target_ci")
+        if self.targetCI is None:
+            self.maxIterations = config["info"].get("max_iterations", self.iterations)
+            self.minIterations = config["info"].get("min_iterations", self.maxIterations)
+        else:
+            self.maxIterations = config["info"].get(
+                "max_iterations", core.config.Defaults.maxIterations
+            )
+            self.minIterations = config["info"].get(
+                "min_iterations", min(core.config.Defaults.minIterations, self.maxIterations)
+            )
+        if self.minIterations > self.maxIterations:
+            raise ValueError(
+                f"Workload {self.name}: 'min_iterations' exceeds 'max_iterations'"
+            )
         self.run_args = config["info"]["run_args"]
         if "cmdname" in config["info"]:
             self.run_args = config["info"]["cmdname"]+ " " + self.run_args
 
         self.run_args = self.run_args.split(" ")
 
+        # CPUs and memory (MiB) needed when running concurrently
+        self.cpus = config["info"].get("cpus", 1)
+        self.memory = config["info"].get("memory", 0)
+
+        # Values the benchmark reports on its standard output
+        self.extractors = [Extractor(e) for e in config.get("extract", [])]
+
+
+class ResourcePool:
+    """
+    CPUs and memory handed out to concurrently running workloads.
+    Every workload gets a CPU set disjoint from all others.
+    """
+
+    def __init__(self, cpus: Set[int], memory: int) -> None:
+        self.cpus = set(cpus)
+        self.free = set(cpus)
+        self.memory = memory
+        self.freeMemory = memory
+        self.cond = Condition()
+
+    def check(self, w: Workload) -> None:
+        if w.cpus > len(self.cpus):
+            raise ValueError(
+                f"Workload {w.name} needs {w.cpus} CPUs, only {len(self.cpus)} available"
+            )
+        if w.memory > self.memory:
+            raise ValueError(
+                f"Workload {w.name} needs {w.memory} MiB of memory, only {self.memory} MiB available"
+            )
+
+    def fits(self, w: Workload) -> bool:
+        return w.cpus <= len(self.free) and w.memory <= self.freeMemory
+
+    def acquire(self, w: Workload) -> Set[int]:
+        cpus = set(sorted(self.free)[: w.cpus])
+        self.free -= cpus
+        self.freeMemory -= w.memory
+        return cpus
+
+    def release(self, w: Workload, cpus: Set[int]) -> None:
+        with self.cond:
+            self.free |= cpus
+            self.freeMemory += w.memory
+            self.cond.notify_all()
+
+
 class WorkloadRegistry:
     workloads: Dict[str, Workload] = dict()
     targetBenchmarks: Set[BenchmarkBase] = set()
+    # CPUs benchmark processes are pinned to, if any
+    cpus: Set[int] | None = None
+    # NUMA domain benchmark memory is bound to, if any
+    numaDomain: int | None = None
 
     @staticmethod
-    def loadWorkloads(workloadDirPath: str) -> None:
+    def loadWorkloads(workloadDirPath: str, benchmarkSet: Set[str] | None = None) -> None:
         loadedBenchmarks = BenchmarkRegistry.getLoadedBenchmarkNames()
 
         for file in glob.glob(os.path.join(workloadDirPath, "*.toml")):
@@ -53,62 +123,211 @@ class WorkloadRegistry:
                     f"Workload {w.name} specified non-existent benchmark {w.benchmark}"
                 )
 
+            # Skip workloads of benchmarks the run config did not select
+            if benchmarkSet and w.benchmark not in benchmarkSet:
+                log.debug(f"Skipping '{w.name}' workload")
+                continue
+
             WorkloadRegistry.workloads[w.name] = w
             WorkloadRegistry.targetBenchmarks.add(w.benchmark)
 
             log.info(f"Registered '{w.name}' workload")
 
     @staticmethod
-    def runWorkloads() -> Dict:
-        cwd = os.getcwd()
-        func = None
-        sema = Semaphore(1)
-
-        def pausedProc(runner, sema, args, kwargs):
-            sema.acquire()
-            f = open(os.devnull, "w")
-            sys.stdout = f
-            runner.run(*args, silent=True)
-            sema.release()
+    def runIteration(
+        w: Workload,
+        benchmark: BenchmarkBase,
+        cpus: Set[int] | None = None,
+        windowed: bool = False,
+    ) -> Dict:
+        """
+        Run a single iteration of a workload, pinned to 'cpus' if given.
+        Windowed iterations run concurrently with others and only collect
+        the samples taken while they ran instead of starting and stopping
+        sampling.
+        """
+        affinity = util.affinity.defaultBackend()
+        domain = WorkloadRegistry.numaDomain
+        # Without a way to bind another process, bind this thread
+        # around the spawn and let the child inherit its policy
+        bindThread = domain is not None and not affinity.bindsByPid
 
-        results = {}
+        result = {}
+        benchmark.preRun()
+        argv, env, cwd = benchmark.runner.command(w.run_args)
 
-        for name, w in WorkloadRegistry.workloads.items():
-            benchmark = BenchmarkRegistry.registry[w.benchmark]
-            runResults = {}
+        # Stream the output through the workload's extractors, if any
+        parser = None
+        if w.extractors:
+            parser = OutputParser(w.extractors, MetricRegistry.clock)
+            outputFd, stdout = os.pipe()
+        else:
+            stdout = os.open(os.devnull, os.O_WRONLY)
+        try:
+            if bindThread:
+                affinity.bindMemory(0, domain)
+            try:
+                process = util.spawn.SpawnedProcess(argv, env, cwd, stdout)
+            finally:
+                if bindThread:
+                    affinity.bindMemory(0, None)
+        finally:
+            os.close(stdout)
+        if parser:
+            parser.start(outputFd)
 
-            for i in range(0, w.iterations):
-                runResults[i] = {}
+        # Pin the child while it waits for us, before it runs anything
+        try:
+            if cpus is not None:
+                affinity.setAffinity(process.pid, cpus)
+            if domain is not None and affinity.bindsByPid:
+                affinity.bindMemory(process.pid, domain)
+        except OSError:
+            process.kill()
+            raise
+        if cpus is not None:
+            result["cpus"] = util.affinity.formatCpus(affinity.getAffinity(process.pid))
 
-                benchmark.preRun()
-                process = Process(
-                    target=pausedProc,
-                    args=(benchmark.runner, sema, [w.run_args], {}),
-                )
+        if not windowed:
+            MetricRegistry.startSamplingThreads()
+            # Sample diffs before we start the process
+            MetricRegistry.sampleDiffMetrics()
+        else:
+            window = MetricRegistry.openWindow(w.name)
+
+        process.release()
+        status = process.wait()
+        result["time"] = status["time"]
+        result["rusage"] = status["rusage"]
+        if status["status"] != 0:
+            log.warning(f"'{w.name}' exited with status {status['status']}")
+            result["status"] = status["status"]
+
+        if not windowed:
+            MetricRegistry.stopSamplingThreads()
+            # Sample diffs after the process finished
+            MetricRegistry.sampleDiffMetrics()
+            result["metrics"] = MetricRegistry.fetchResults()
+        else:
+            result["metrics"], result["window"] = MetricRegistry.closeWindow(window)
+        if parser:
+            parser.join()
+            parser.getResults(result["metrics"])
+        result["kbench_overhead"] = MetricRegistry.fetchOverhead(reset=not windowed)
+        benchmark.postRun()
+        return result
+
+    @staticmethod
+    def runWorkload(
+        w: Workload,
+        sink: ResultSink | None,
+        sinkLock: Lock,
+        cpus: Set[int] | None = None,
+        windowed: bool = False,
+    ) -> Dict:
+        """
+        Run the warmup and measured iterations of a single workload.
+        """
+        benchmark = BenchmarkRegistry.get(w.benchmark)
+        runResults = {}
+
+        for i in range(0, w.warmup):
+            log.info(f"Running '{w.name}', warmup run #{i+1}")
+            WorkloadRegistry.runIteration(w, benchmark, cpus, windowed)
 
-                log.info(f"Running '{w.name}', run #{i+1}")
+        times = []
+        summary = {"warmup": w.warmup, "stop_reason": "max_iterations"}
+        for i in range(0, w.maxIterations):
+            log.info(f"Running '{w.name}', run #{i+1}")
+            runResults[i] = WorkloadRegistry.runIteration(w, benchmark, cpus, windowed)
+            times.append(runResults[i]["time"])
+            if sink:
+                with sinkLock:
+                    sink.writeIteration(w.name, i, runResults.pop(i))
 
-                sema.acquire()
-                process.start()
+            # Stop once the wall time estimate is stable enough
+            if w.targetCI is not None and len(times) >= max(w.minIterations, 2):
+                low, high = analysis.stats.meanCI(times)
+                summary["ci_width"] = (high - low) / fmean(times)
+                if summary["ci_width"] <= w.targetCI:
+                    summary["stop_reason"] = "converged"
+                    break
 
-                MetricRegistry.startSamplingThreads()
-                # Sample diffs before we start the process
-                MetricRegistry.sampleDiffMetrics()
+        summary["iterations"] = len(times)
+        log.info(
+            f"Finished '{w.name}' after {len(times)} run(s) ({summary['stop_reason']})"
+        )
+        if sink:
+            with sinkLock:
+                sink.writeWorkload(w.name, summary)
+        else:
+            runResults["summary"] = summary
+        return runResults
+
+    @staticmethod
+    def runWorkloads(sink: ResultSink | None = None, concurrent: bool = False) -> Dict:
+        """
+        Run all registered workloads.
+        Iteration results are streamed to 'sink' if one is given,
+        otherwise they are collected and returned.
+        """
+        if concurrent:
+            return WorkloadRegistry.runConcurrently(sink)
 
-                startTs = time.perf_counter()
-                sema.release()
+        sinkLock = Lock()
+        results = {}
+        for name, w in WorkloadRegistry.workloads.items():
+            results[w.name] = WorkloadRegistry.runWorkload(
+                w, sink, sinkLock, WorkloadRegistry.cpus
+            )
+        return results
+
+    @staticmethod
+    def runConcurrently(sink: ResultSink | None = None) -> Dict:
+        """
+        Run workloads side by side, each pinned to its own set of CPUs.
+        Workloads are started in order as soon as enough CPUs and
+        memory are free for them.
+        """
+        cpus = WorkloadRegistry.cpus or util.affinity.defaultBackend().getAffinity(0)
+        pool = ResourcePool(cpus, util.os.physicalMemory() // (1 << 20))
+        pending = list(WorkloadRegistry.workloads.values())
+        for w in pending:
+            pool.check(w)
+
+        sinkLock = Lock()
+        results = {}
+        errors = []
 
-                process.join()
-                endTs = time.perf_counter()
-                runResults[i]["time"] = endTs - startTs
+        def run(w: Workload, cpus: Set[int]) -> None:
+            try:
+                results[w.name] = WorkloadRegistry.runWorkload(w, sink, sinkLock, cpus, True)
+            except Exception as e:
+                log.error(f"Workload '{w.name}' failed: {e}")
+                errors.append(e)
+            finally:
+                pool.release(w, cpus)
 
-                MetricRegistry.stopSamplingThreads()
-                # Sample diffs after the process finished
-                MetricRegistry.sampleDiffMetrics()
+        MetricRegistry.startSamplingThreads()
+        threads = []
+        with pool.cond:
+            while pending:
+                w = next((w for w in pending if pool.fits(w)), None)
+                if w is None:
+                    pool.cond.wait()
+                    continue
 
-                # Save results
-                runResults[i]["metrics"] = MetricRegistry.fetchResults()
+                pending.remove(w)
+                cpus = pool.acquire(w)
+                log.info(f"Starting '{w.name}' on CPUs {util.affinity.formatCpus(cpus)}")
+                t = Thread(target=run, args=(w, cpus), name=f"kbench-{w.name}")
+                t.start()
+                threads.append(t)
 
-        results[w.name] = runResults
+        for t in threads:
+            t.join()
+        MetricRegistry.stopSamplingThreads()
 
+        if errors:
+            raise errors[0]
         return results
@@ -8,23 +8,98 @@ import logging as log
 from threading import Event
 from datetime import datetime
 
-from core.benchmark import BenchmarkRegistry
-from core.workload import WorkloadRegistry
-from core.metric import MetricRegistry
 from core.config import SysInfo, RunConfig
+from core.cache import SourceCache
+
+import core.actions
+import core.remote
+import analysis.compare
+import analysis.index
+import analysis.changepoint
 
 coloredlogs.install(level="INFO")
 
 parser = argparse.ArgumentParser()
 requiredArgs = parser.add_argument_group("required arguments")
 requiredArgs.add_argument(
-    "-a", "--action", choices=["build", "run", "clean", "monitor"], help="action", required=True
+    "-a",
+    "--action",
+    choices=["build", "run", "clean", "monitor", "compare", "agent", "control", "import", "query", "detect"],
+    help="action",
+    required=True,
 )
 
 parser.add_argument(
     "-c", "--config", type=str, help="configuration file for benchmark run"
 )
 
+parser.add_argument(
+    "-o", "--output", type=str, help="output file for the 'compare' and 'query' actions"
+)
+
+parser.add_argument(
+    "results",
+    nargs="*",
+    help="baseline and patched results files for the 'compare' action, files to index for 'import'",
+)
+
+parser.add_argument(
+    "--db", type=str, default=analysis.index.defaultPath, help="results index for the 'import' and 'query' actions"
+)
+
+parser.add_argument("--workload", type=str, help="workload to query")
+
+parser.add_argument(
+    "--metric", type=str, help="value to query (default 'time') or check for changes (default all), e.g. 'rusage/maxrss' or 'sysctl/<oid>'"
+)
+
+parser.add_argument(
+    "--match", type=str, action="append", default=[], help="only query runs whose uname, config or host contains the text, e.g. 'uname=main-n'"
+)
+
+parser.add_argument("--limit", type=int, help="only query the latest runs")
+
+parser.add_argument(
+    "--penalty",
+    type=float,
+    default=analysis.changepoint.defaultPenalty,
+    help="change point penalty for 'detect', in units of noise variance times log(runs)",
+)
+
+parser.add_argument(
+    "--min-change",
+    type=float,
+    default=analysis.changepoint.defaultMinChange,
+    help="smallest relative change 'detect' reports",
+)
+
+parser.add_argument(
+    "--listen", type=str, help="address the 'agent' action serves on, 'unix:<path>' or '<host>:<port>'"
+)
+
+parser.add_argument(
+    "--agents", type=str, help="comma-separated agent addresses for the 'control' action"
+)
+
+parser.add_argument(
+    "--token",
+    type=str,
+    default=os.environ.get(core.remote.tokenVariable),
+    help=f"shared secret for 'agent' and 'control' (default ${core.remote.tokenVariable}), required over TCP",
+)
+
+parser.add_argument(
+    "--remote-action", choices=core.remote.ops, default="run", help="action the 'control' action runs on its agents"
+)
+
+parser.add_argument(
+    "--offline", action="store_true", help="only use cached benchmark sources"
+)
+
+parser.add_argument(
+    "--verify-cache", action="store_true", help="hash cached benchmark sources again before using them"
+)
+
 parser.add_argument("-v", "--verbose", action="store_true", help="increase verbosity")
 
 args = parser.parse_args()
@@ -36,7 +111,7 @@ monitorEvent = Event()
 
 def handler(signum, frame):
     # Signal termination to sampling loop
-    if args.action == "monitor":
+    if args.action in ("monitor", "agent") or (args.action == "control" and args.remote_action == "monitor"):
         monitorEvent.set()
     else:
         exit(-1)
@@ -44,44 +119,83 @@ signal.signal(signal.SIGINT, handler)
 
 try:
     config = RunConfig(args)
+    SourceCache.configure(config.cacheDir, config.offline, args.verify_cache)
     t = datetime.now()
+    sinkClass, ext = core.actions.sinkClass(config)
     configName = os.path.splitext(os.path.basename(config.configPath))[0]
-    resultFilename = f"{configName}-{t.strftime('%d%m%Y-%H%M')}.json"
+    resultFilename = f"{configName}-{t.strftime('%d%m%Y-%H%M')}.{ext}"
+    metadata = core.actions.metadata(config)
 
     match config.action:
         case "build":
-            # Load all benchmarks and register them
-            BenchmarkRegistry.loadBenchmarks("./benchmarks")
-            WorkloadRegistry.loadWorkloads("./workloads")
-            BenchmarkRegistry.buildBenchmarks()
+            core.actions.build(config)
         case "run":
-            # Load all benchmarks and register them
-            BenchmarkRegistry.loadBenchmarks("./benchmarks")
-            WorkloadRegistry.loadWorkloads("./workloads")
-
-            # Load specified metrics
-            MetricRegistry.loadMetrics(config.metricsPath)
-            BenchmarkRegistry.buildBenchmarks(WorkloadRegistry.targetBenchmarks)
-            results = WorkloadRegistry.runWorkloads()
-
-            # Add metadata
-            results["uname"] = os.uname().version
-
-            with open(os.path.join("./results", resultFilename), "w") as file:
-                json.dump(results, file)
+            sink = sinkClass(os.path.join("./results", resultFilename))
+            core.actions.run(config, sink, metadata)
+            sink.close()
             log.info("Wrote benchmarking results to '%s'", resultFilename)
         case "monitor":
-            MetricRegistry.loadMetrics(config.metricsPath)
-            MetricRegistry.startSamplingThreads();
-            monitorEvent.wait()
-            MetricRegistry.stopSamplingThreads();
-            results = MetricRegistry.fetchResults()
-            # Add metadata
-            results["uname"] = os.uname().version
-
-            with open(os.path.join("./results", resultFilename), "w") as file:
-                json.dump(results, file)
+            sink = sinkClass(os.path.join("./results", resultFilename))
+            core.actions.monitor(config, sink, metadata, monitorEvent)
+            sink.close()
             log.info("Wrote monitoring results to '%s'", resultFilename)
+        case "agent":
+            if not args.listen:
+                raise ValueError("'agent' expects an address to listen on (--listen)")
+            core.remote.Agent(args.listen, args.token).serve(monitorEvent)
+        case "control":
+            if not args.agents:
+                raise ValueError("'control' expects agent addresses (--agents)")
+            paths = core.remote.control(config, args.agents.split(","), args.remote_action, monitorEvent, args.token)
+            log.info("Wrote agent results to %s", ", ".join(f"'{p}'" for p in paths))
+        case "import":
+            paths = args.results
+            if not paths:
+                paths = [
+                    os.path.join("./results", name)
+                    for name in sorted(os.listdir("./results"))
+                    if name.endswith((".json", ".jsonl", ".kbc")) and not name.startswith("compare-")
+                ]
+            with analysis.index.ResultsIndex(args.db) as index:
+                imported = index.importFiles(paths)
+            log.info(f"Imported {imported} of {len(paths)} results files into '{args.db}'")
+        case "query":
+            filters = {}
+            for match in args.match:
+                column, sep, text = match.partition("=")
+                if not sep or column not in ("uname", "config", "host"):
+                    raise ValueError(f"Invalid match '{match}', expected 'uname=', 'config=' or 'host=<text>'")
+                filters[column] = text
+            with analysis.index.ResultsIndex(args.db) as index:
+                rows = index.trend(args.workload, args.metric or "time", args.limit, **filters)
+            print(analysis.index.formatTrend(rows))
+            if args.output:
+                with open(args.output, "w") as file:
+                    json.dump(rows, file, indent=2)
+                log.info(f"Wrote query results to '{args.output}'")
+        case "detect":
+            with analysis.index.ResultsIndex(args.db) as index:
+                changes = analysis.changepoint.detectHistory(
+                    index, args.workload, args.metric, args.penalty, args.min_change, args.limit
+                )
+            print(analysis.changepoint.formatChanges(changes))
+            if args.output:
+                with open(args.output, "w") as file:
+                    json.dump(analysis.compare.finite(changes), file, indent=2, allow_nan=False)
+                log.info(f"Wrote change points to '{args.output}'")
+        case "compare":
+            if len(args.results) != 2:
+                raise ValueError("'compare' expects a baseline and a patched results file")
+
+            report = analysis.compare.compare(*args.results)
+            print(analysis.compare.formatTable(report))
+
+            outPath = args.output
+            if not outPath:
+                outPath = os.path.join("./results", f"compare-{t.strftime('%d%m%Y-%H%M')}.json")
+            with open(outPath, "w") as file:
+                json.dump(report, file, indent=2, allow_nan=False)
+            log.info("Wrote comparison to '%s'", outPath)
 
 except Exception as e:
     log.exception(e, exc_info=True)
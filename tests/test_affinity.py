@@ -0,0 +1,59 @@
+import sys
+
+import pytest
+
+from util.affinity import FakeAffinityBackend, LinuxAffinityBackend, formatCpus, parseCpus
+from util.spawn import SpawnedProcess
+
+
+def testFakeBindsByPid():
+    backend = FakeAffinityBackend(4)
+    backend.bindMemory(42, 1)
+    assert backend.domains == {42: 1}
+
+
+def testFakeBindsCallingThreadOnly():
+    backend = FakeAffinityBackend(4, bindsByPid=False)
+    with pytest.raises(OSError):
+        backend.bindMemory(42, 1)
+    backend.bindMemory(0, 1)
+    backend.bindMemory(0, None)
+    assert backend.domains == {0: None}
+
+
+@pytest.mark.parametrize("spec,cpus", [("0", {0}), ("0-3,8", {0, 1, 2, 3, 8}), ("2-3, 5", {2, 3, 5})])
+def testParseAndFormatCpus(spec, cpus):
+    assert parseCpus(spec) == cpus
+    assert parseCpus(formatCpus(cpus)) == cpus
+
+
+def testFormatCpusMergesRanges():
+    assert formatCpus([8, 0, 1, 2, 3, 5]) == "0-3,5,8"
+
+
+@pytest.mark.parametrize("spec", ["", "a", "1-", "-1", "0-b"])
+def testInvalidCpuList(spec):
+    with pytest.raises(ValueError):
+        parseCpus(spec)
+
+
+def testFakeAffinity():
+    backend = FakeAffinityBackend(4)
+    assert backend.getAffinity(0) == {0, 1, 2, 3}
+    backend.setAffinity(7, {1, 2})
+    assert backend.getAffinity(7) == {1, 2}
+    with pytest.raises(OSError):
+        backend.setAffinity(7, {4})
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="uses sched_setaffinity")
+def testLinuxAffinityOfChild():
+    backend = LinuxAffinityBackend()
+    cpus = backend.getAffinity(0)
+    process = SpawnedProcess(["true"])
+    try:
+        backend.setAffinity(process.pid, {min(cpus)})
+        assert backend.getAffinity(process.pid) == {min(cpus)}
+    finally:
+        process.kill()
+    assert backend.getAffinity(0) == cpus
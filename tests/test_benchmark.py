@@ -0,0 +1,85 @@
+import os
+import tarfile
+from types import SimpleNamespace
+
+import pytest
+
+from core.benchmark import BenchmarkRegistry
+from core.setup import unpackArchive
+
+
+def fakeBenchmark(path, name, setup):
+    os.makedirs(path)
+    return SimpleNamespace(
+        name=name,
+        path=str(path),
+        prebuilt=True,
+        config={"name": name},
+        runner=SimpleNamespace(setup=setup, verify=lambda: None, envvar={}),
+    )
+
+
+def testFailedBuildDoesNotStopOthers(tmp_path, monkeypatch):
+    built = []
+
+    def fail():
+        raise RuntimeError("setup failed")
+
+    benchmarks = {
+        "a": fakeBenchmark(tmp_path / "a", "a", lambda: built.append("a")),
+        "b": fakeBenchmark(tmp_path / "b", "b", fail),
+        "c": fakeBenchmark(tmp_path / "c", "c", lambda: built.append("c")),
+    }
+    monkeypatch.setattr(BenchmarkRegistry, "index", dict.fromkeys(benchmarks))
+    monkeypatch.setattr(BenchmarkRegistry, "get", staticmethod(benchmarks.get))
+
+    cwd = os.getcwd()
+    with pytest.raises(RuntimeError):
+        BenchmarkRegistry.buildBenchmarks(jobs=2)
+    assert sorted(built) == ["a", "c"]
+    assert os.getcwd() == cwd
+
+    # Unchanged benchmarks are not set up again
+    built.clear()
+    timings = BenchmarkRegistry.buildBenchmarks({"a", "c"}, jobs=2)
+    assert built == []
+    assert set(timings) == {"a", "c"}
+
+
+def testUnpackArchive(tmp_path):
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "Makefile").write_text("all:\n")
+    archive = tmp_path / "pkg.tar.gz"
+    with tarfile.open(archive, "w:gz") as tar:
+        tar.add(tmp_path / "pkg", arcname="pkg")
+
+    unpackArchive(str(archive), str(tmp_path / "src"))
+    assert (tmp_path / "src" / "pkg" / "Makefile").read_text() == "all:\n"
+
+
+def addBenchmark(benchmarkDir, name):
+    path = benchmarkDir / name
+    path.mkdir()
+    (path / "config.toml").write_text(f'[info]\nname = "{name}"\n')
+    # Importing the module would fail, so it must not happen while indexing
+    (path / f"{name}.py").write_text("raise ImportError\n")
+
+
+def testIndexIsCachedAndRebuilt(tmp_path, monkeypatch):
+    monkeypatch.setattr(BenchmarkRegistry, "index", {})
+    benchmarkDir = tmp_path / "benchmarks"
+    benchmarkDir.mkdir()
+    addBenchmark(benchmarkDir, "gups")
+
+    BenchmarkRegistry.loadBenchmarks(str(benchmarkDir))
+    assert BenchmarkRegistry.getLoadedBenchmarkNames() == {"gups"}
+    assert (benchmarkDir / BenchmarkRegistry.indexFilename).exists()
+
+    # A new benchmark invalidates the cached index
+    addBenchmark(benchmarkDir, "canneal")
+    BenchmarkRegistry.loadBenchmarks(str(benchmarkDir))
+    assert BenchmarkRegistry.getLoadedBenchmarkNames() == {"gups", "canneal"}
+    assert BenchmarkRegistry.index["canneal"]["module"].endswith("canneal.py")
+
+    with pytest.raises(ValueError):
+        BenchmarkRegistry.get("missing")
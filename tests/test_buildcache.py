@@ -0,0 +1,98 @@
+import os
+
+from types import SimpleNamespace
+
+import pytest
+
+import core.buildcache
+
+from core.benchmark import BenchmarkRegistry
+from core.buildcache import BuildManifest
+from core.runners import ExecRunner
+from core.setup import FetchSrcHandler
+
+
+def fakeBenchmark(path, sha256="ab" * 32, args="-O2"):
+    return SimpleNamespace(
+        name="fake",
+        path=str(path),
+        prebuilt=False,
+        config={"run": {"make": {"args": args}}},
+        runner=SimpleNamespace(envvar={}),
+        srcFileHandler=FetchSrcHandler("https://example.org/fake.tar.gz", str(path), sha256),
+    )
+
+
+def testUnchangedBuildIsSkipped(tmp_path):
+    manifest = BuildManifest(fakeBenchmark(tmp_path))
+    rebuild, reason, components = manifest.check()
+    assert rebuild and reason == "no previous build"
+    manifest.save(rebuild, reason, components)
+
+    # Touching the unpacked sources does not matter, only the archive does
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.c").write_text("int main() {}")
+    assert manifest.check()[:2] == (False, "unchanged")
+
+
+def testChecksumAndArgsInvalidate(tmp_path):
+    manifest = BuildManifest(fakeBenchmark(tmp_path))
+    manifest.save(*manifest.check())
+
+    assert BuildManifest(fakeBenchmark(tmp_path, sha256="cd" * 32)).check()[:2] == (True, "source changed")
+    assert BuildManifest(fakeBenchmark(tmp_path, args="-O3")).check()[:2] == (True, "config changed")
+
+
+def testToolchainAndEnvironmentInvalidate(tmp_path, monkeypatch):
+    monkeypatch.setattr(core.buildcache, "toolchainVersion", lambda: "cc 17.0.1")
+    monkeypatch.delenv("CFLAGS", raising=False)
+    manifest = BuildManifest(fakeBenchmark(tmp_path))
+    manifest.save(*manifest.check())
+    assert manifest.check()[:2] == (False, "unchanged")
+
+    monkeypatch.setattr(core.buildcache, "toolchainVersion", lambda: "cc 18.1.0")
+    assert manifest.check()[:2] == (True, "toolchain changed")
+    monkeypatch.setattr(core.buildcache, "toolchainVersion", lambda: "cc 17.0.1")
+
+    monkeypatch.setenv("CFLAGS", "-O3")
+    assert manifest.check()[:2] == (True, "environment changed")
+    monkeypatch.delenv("CFLAGS")
+
+    benchmark = fakeBenchmark(tmp_path)
+    benchmark.runner.envvar = {"OMP_NUM_THREADS": "4"}
+    assert BuildManifest(benchmark).check()[:2] == (True, "environment changed")
+
+
+def execBenchmark(path):
+    (path / "bin").mkdir(parents=True)
+    (path / "bin" / "bench").write_text("")
+    benchmark = fakeBenchmark(path)
+    benchmark.prebuilt = True
+    benchmark.runner = ExecRunner({"cmds": ["bin/bench"]}, str(path))
+    return benchmark
+
+
+def testBuildIsSkippedOnlyWhileUnchanged(tmp_path, monkeypatch):
+    benchmark = execBenchmark(tmp_path)
+    setups = []
+    setup = benchmark.runner.setup
+    monkeypatch.setattr(benchmark.runner, "setup", lambda: setups.append(1) or setup())
+
+    BenchmarkRegistry.buildBenchmark(benchmark)
+    BenchmarkRegistry.buildBenchmark(benchmark)
+    assert len(setups) == 1
+    assert BuildManifest(benchmark).load()["reason"] == "unchanged"
+
+    benchmark.config = {"run": {"exec": {"cmds": ["bin/bench"], "env": {"X": "1"}}}}
+    BenchmarkRegistry.buildBenchmark(benchmark)
+    assert len(setups) == 2
+    assert BuildManifest(benchmark).load()["reason"] == "config changed"
+
+
+def testMissingBinaryFailsUnchangedBuild(tmp_path):
+    benchmark = execBenchmark(tmp_path)
+    BenchmarkRegistry.buildBenchmark(benchmark)
+
+    os.unlink(tmp_path / "bin" / "bench")
+    with pytest.raises(FileNotFoundError, match="bin/bench"):
+        BenchmarkRegistry.buildBenchmark(benchmark)
@@ -0,0 +1,71 @@
+import json
+import math
+import random
+
+import pytest
+
+from analysis.changepoint import detect, detectHistory, noiseSigma, pelt
+from analysis.compare import finite
+from analysis.index import ResultsIndex
+from core.results import ResultSink
+
+
+def noisy(levels, n: int = 20, sigma: float = 0.5, seed: int = 0):
+    rng = random.Random(seed)
+    return [level + rng.gauss(0, sigma) for level in levels for _ in range(n)]
+
+
+def testNoiseSigmaIgnoresSteps():
+    values = noisy([100.0, 120.0], n=200)
+    assert noiseSigma(values) == pytest.approx(0.5, rel=0.2)
+    assert noiseSigma([5.0] * 10) == 0.0
+    assert noiseSigma([1.0]) == 0.0
+
+
+def testPeltFindsStepChanges():
+    values = [0.0] * 10 + [10.0] * 10 + [3.0] * 10
+    assert pelt(values, penalty=1.0) == [10, 20]
+    assert pelt(values, penalty=1e6) == []
+    assert pelt([1.0, 2.0, 3.0], penalty=1.0) == []
+
+
+def testDetectReportsSignificantChanges():
+    [change] = detect(noisy([100.0, 110.0]))
+    assert change["index"] == 20
+    assert change["before"] == pytest.approx(100.0, abs=0.5)
+    assert change["relative"] == pytest.approx(0.1, abs=0.01)
+    low, high = change["ci"]
+    assert low < change["delta"] < high
+    assert change["p"] < 0.01
+
+
+def testChangesFromZeroStayValidJson():
+    [change] = detect([0.0] * 10 + [5.0] * 10)
+    assert change["relative"] == math.inf
+    assert json.loads(json.dumps(finite(change), allow_nan=False))["relative"] is None
+
+
+def testDetectIgnoresNoiseAndOutliers():
+    assert detect(noisy([100.0])) == []
+    assert detect([100.0] * 10) == []
+
+    values = noisy([100.0], n=40)
+    values[20] = 200.0
+    assert detect(values) == []
+
+    # Significant but below the minimum relative change
+    assert detect(noisy([100.0, 100.5], sigma=0.05), minChange=0.01) == []
+
+
+def testDetectHistoryNamesTheRun(tmp_path):
+    with ResultsIndex(str(tmp_path / "index.sqlite")) as index:
+        for i, t in enumerate(noisy([10.0, 12.0], n=8, sigma=0.1)):
+            path = str(tmp_path / f"run{i:02}.jsonl")
+            sink = ResultSink(path)
+            sink.writeMetadata({"config": "nightly", "uname": f"n{i}", "started": f"2026-01-{i + 1:02}"})
+            sink.writeIteration("build", 0, {"time": t})
+            sink.close()
+            index.importFile(path)
+
+        [change] = detectHistory(index, "build", "time")
+        assert (change["workload"], change["name"], change["uname"], change["runs"]) == ("build", "time", "n8", 16)
@@ -0,0 +1,136 @@
+import time
+import random
+
+from array import array
+
+import pytest
+
+import core.columnar as columnar
+
+from core.columnar import BinaryResultSink, decodeColumn, decodeInts, encodeColumn, encodeInts
+from core.loader import load
+from core.results import ResultSink
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        [],
+        [0, 1, -1, 63, -64, 64, -65],
+        [2**62, -(2**63), 2**63 - 1, 0],
+        list(range(1000, 0, -7)),
+    ],
+)
+def testVarintRoundTrip(values):
+    decoded = decodeInts(encodeInts(values))
+    assert isinstance(decoded, array)
+    assert list(decoded) == values
+
+
+def testVarintBeyondInt64():
+    values = [1, 2**70, -(2**70)]
+    assert decodeInts(encodeInts(values)) == values
+    # Deltas overflowing 64 bits as well
+    values = [2**63 - 1, -(2**63)]
+    assert list(decodeInts(encodeInts(values))) == values
+
+
+def testVarintColumnsOfOlderFiles():
+    values = [0, 1, -1, 2**40, 7]
+    data = columnar._encodeVarints(values)
+    assert list(decodeInts(data)) == values
+    assert list(decodeColumn("varint", data)) == values
+
+
+def testDeltasKeepCountersSmall():
+    # A steadily growing counter costs less than a byte per sample
+    values = [10**12 + i for i in range(10000)]
+    assert len(encodeInts(values)) < len(array("q", values).tobytes()) // 8
+
+
+@pytest.mark.parametrize(
+    "values,encoding",
+    [
+        (array("q", [1, 2, 3]), "delta"),
+        (memoryview(array("q", [1, 2, 3])), "delta"),
+        (array("d", [0.5, 1.5]), "f64"),
+        ([1, 2.5], "f64"),
+        ([True, False], "json"),
+        (["a", (1, 2)], "json"),
+    ],
+)
+def testColumnEncodings(values, encoding):
+    enc, data = encodeColumn(values)
+    assert enc == encoding
+    expected = [list(v) if isinstance(v, tuple) else v for v in values]
+    assert list(decodeColumn(enc, data)) == expected
+
+
+def writeRun(path: str) -> BinaryResultSink:
+    sink = BinaryResultSink(path)
+    sink.writeMetadata({"config": "test"})
+    series = {"timestamps": array("d", [0.0, 0.5, 1.0]), "values": array("q", [5, 7, 6])}
+    sink.writeIteration("w", 0, {"time": 1.0, "metrics": {"sysctl": {"vm.x": series}}})
+    return sink
+
+
+def testBinaryRoundTrip(tmp_path):
+    path = str(tmp_path / "run.kbc")
+    writeRun(path).close()
+
+    with load(path) as result:
+        assert result.metadata["config"] == "test"
+        assert [r["time"] for r in result.iterations("w")] == [1.0]
+        ts, values = result.series("w", 0, "sysctl", "vm.x")
+    assert list(ts) == pytest.approx([0.0, 0.5, 1.0])
+    assert list(values) == [5, 7, 6]
+
+
+def testUnfinishedBinaryFileIsScanned(tmp_path):
+    path = str(tmp_path / "run.kbc")
+    sink = writeRun(path)
+    sink.file.flush()
+    # Killed before writing the index, with a partial block at the end
+    with open(path, "ab") as file:
+        file.write(b"\x10\x00")
+
+    with load(path) as result:
+        _, values = result.series("w", 0, "sysctl", "vm.x")
+    assert list(values) == [5, 7, 6]
+
+
+def testBinaryRecordsAreParsedOnce(tmp_path, monkeypatch):
+    path = str(tmp_path / "run.kbc")
+    writeRun(path).close()
+
+    with load(path) as result:
+        # Already parsed for the metadata when the file was opened
+        monkeypatch.setattr(result.reader, "records", lambda: pytest.fail("records parsed again"))
+        assert result.workloads() == ["w"]
+        assert len(result.iterations("w")) == 1
+
+
+def testBinaryLoadsFasterThanJson(tmp_path):
+    # A full load of the columnar file has to beat parsing the
+    # same results as JSON
+    n = 200_000
+    rng = random.Random(0)
+    ts = array("d", (i * 1e-3 + rng.random() * 1e-4 for i in range(n)))
+    values = array("q", (10**9 + 3 * i + rng.randrange(100) for i in range(n)))
+    elapsed = {}
+    for sinkClass, name in ((ResultSink, "run.jsonl"), (BinaryResultSink, "run.kbc")):
+        path = str(tmp_path / name)
+        sink = sinkClass(path)
+        series = {"timestamps": ts, "values": values}
+        sink.writeIteration("w", 0, {"time": 1.0, "metrics": {"sysctl": {"vm.x": series}}})
+        sink.close()
+
+        best = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            with load(path) as result:
+                loaded = [result.series(*key) for key in result.keys()]
+            best = min(best, time.perf_counter() - start)
+        assert list(loaded[0][1][-3:]) == list(values[-3:])
+        elapsed[name] = best
+    assert elapsed["run.kbc"] < elapsed["run.jsonl"]
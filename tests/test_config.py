@@ -0,0 +1,92 @@
+import os
+import shutil
+
+from argparse import Namespace
+
+import pytest
+
+from core.cache import SourceCache
+from core.config import ConfigLoader, RunConfig
+
+workload = os.path.join(os.path.dirname(__file__), "..", "workloads", "gups.toml")
+
+
+@pytest.fixture
+def cacheRoot(tmp_path, monkeypatch):
+    monkeypatch.setattr(SourceCache, "root", str(tmp_path / "cache"))
+    monkeypatch.setattr(ConfigLoader, "_cache", {})
+    path = str(tmp_path / "gups.toml")
+    shutil.copy(workload, path)
+    return path
+
+
+def testLoadReturnsCopies(cacheRoot):
+    config = ConfigLoader.load(cacheRoot, "workload")
+    config["info"]["name"] = "changed"
+    config["extract"].clear()
+
+    config = ConfigLoader.load(cacheRoot, "workload")
+    assert config["info"]["name"] == "gups"
+    assert len(config["extract"]) == 1
+
+
+def testDiskCacheIsPrivateJson(cacheRoot):
+    config = ConfigLoader.load(cacheRoot, "workload")
+    cacheDir = os.path.join(SourceCache.root, "configs")
+    assert os.stat(cacheDir).st_mode & 0o777 == 0o700
+    assert [name.endswith(".json") for name in os.listdir(cacheDir)] == [True]
+
+    # Loaded back from disk by a fresh process
+    ConfigLoader._cache.clear()
+    assert ConfigLoader.load(cacheRoot, "workload") == config
+
+
+def testSharedDiskCacheIsIgnored(cacheRoot):
+    cacheDir = os.path.join(SourceCache.root, "configs")
+    os.makedirs(cacheDir)
+    os.chmod(cacheDir, 0o777)
+    ConfigLoader.load(cacheRoot, "workload")
+    assert os.listdir(cacheDir) == []
+
+
+def testChangedFileIsReloaded(cacheRoot):
+    assert ConfigLoader.load(cacheRoot, "workload")["info"]["name"] == "gups"
+    with open(cacheRoot) as file:
+        text = file.read()
+    with open(cacheRoot, "w") as file:
+        file.write(text.replace('name = "gups"', 'name = "gups-large"'))
+    assert ConfigLoader.load(cacheRoot, "workload")["info"]["name"] == "gups-large"
+
+
+def testInvalidConfig(cacheRoot, tmp_path):
+    path = tmp_path / "broken.toml"
+    path.write_text('[info]\nname = 1\n')
+    with pytest.raises(ValueError):
+        ConfigLoader.load(str(path), "workload")
+
+
+def runConfig(tmp_path, body: str) -> RunConfig:
+    path = tmp_path / "run.toml"
+    path.write_text(f'name = "test"\nbenchmarks = ["gups"]\nmetrics = "vm.toml"\n{body}')
+    return RunConfig(Namespace(action="run", config=str(path), offline=False))
+
+
+def testRunConfigAffinity(cacheRoot, tmp_path):
+    config = runConfig(tmp_path, '[affinity]\nworkload_cpus = "2-5"\nhousekeeping_cpus = "0,1"\nnuma_domain = 1\n')
+    assert config.workloadCpus == {2, 3, 4, 5}
+    assert config.housekeepingCpus == {0, 1}
+    assert config.numaDomain == 1
+    assert config.benchmarkSet == {"gups"}
+
+
+def testRunConfigWithoutAffinity(cacheRoot, tmp_path):
+    config = runConfig(tmp_path, "")
+    assert config.workloadCpus is None and config.housekeepingCpus is None
+    assert config.numaDomain is None
+
+
+def testRunConfigRejectsCpuLists(cacheRoot, tmp_path):
+    with pytest.raises(ValueError):
+        runConfig(tmp_path, '[affinity]\nworkload_cpus = "all"\n')
+    with pytest.raises(ValueError):
+        runConfig(tmp_path, '[affinity]\nnuma_domain = -1\n')
@@ -0,0 +1,86 @@
+import math
+import random
+
+import pytest
+
+from core.derived import DerivedMetric, TDigest, compileExpression, derive
+
+
+def testTDigestQuantiles():
+    values = list(range(100000))
+    random.Random(1).shuffle(values)
+    digest = TDigest()
+    digest.update(values)
+
+    assert digest.quantile(0.5) == pytest.approx(50000, rel=0.01)
+    # The tails are kept at a much finer resolution
+    assert digest.quantile(0.999) == pytest.approx(99900, rel=0.001)
+    assert digest.quantile(0.0) == 0
+    assert digest.quantile(1.0) == 99999
+    assert len(digest.means) < 200
+
+
+def testTDigestMergeAndWeights():
+    low, high = TDigest(), TDigest()
+    low.update(range(0, 500))
+    high.update(range(500, 1000))
+    low.merge(high)
+    assert low.count == 1000
+    assert low.quantile(0.5) == pytest.approx(500, abs=10)
+
+    # A weighted value counts like as many separate ones
+    weighted = TDigest()
+    weighted.add(1.0, 99)
+    weighted.add(100.0, 1)
+    assert weighted.count == 100
+    assert weighted.sum == 199.0
+    assert weighted.quantile(0.25) == 1.0
+    assert weighted.quantile(0.5) < 2.0
+    assert math.isnan(TDigest().quantile(0.5))
+
+
+def testCompileExpression():
+    f = compileExpression("max(a, b) / (a + 1) - -sqrt(4)")
+    assert f({"a": 3, "b": 8}) == 4.0
+
+
+@pytest.mark.parametrize("expr", ["a.__class__", "__import__('os')", "[a]", "a if b else c", "a +"])
+def testExpressionsAreRestricted(expr):
+    with pytest.raises(ValueError):
+        compileExpression(expr)
+
+
+def testRateSkipsCounterResets():
+    series = {"timestamps": [0.0, 1.0, 2.0, 3.0], "values": [0, 10, 2, 6]}
+    rate = DerivedMetric.rate(series)
+    assert list(rate["timestamps"]) == [1.0, 3.0]
+    assert list(rate["values"]) == [10.0, 4.0]
+
+
+def testDeriveAddsEveryMetric():
+    results = {
+        "sysctl": {
+            "vm.a": {"timestamps": [0.0, 1.0, 2.0], "values": [1, 2, 4]},
+            "vm.b": {"timestamps": [0.5], "values": [2]},
+        }
+    }
+    metrics = [
+        DerivedMetric({"name": "diff", "type": "diff", "source": "sysctl/vm.a"}),
+        DerivedMetric({"name": "ratio", "type": "expr", "expr": "a / b", "vars": {"a": "sysctl/vm.a", "b": "sysctl/vm.b"}}),
+        DerivedMetric({"name": "missing", "type": "rate", "source": "sysctl/vm.c"}),
+    ]
+    derive(metrics, results)
+
+    derived = results["derived"]
+    assert derived["diff"] == 3
+    # No value of 'b' before 0.5, the latest one afterwards
+    assert list(derived["ratio"]["timestamps"]) == [1.0, 2.0]
+    assert list(derived["ratio"]["values"]) == [1.0, 2.0]
+    assert "missing" not in derived
+
+
+def testDerivedMetricConfig():
+    with pytest.raises(ValueError):
+        DerivedMetric({"name": "r", "type": "rate"})
+    with pytest.raises(ValueError):
+        DerivedMetric({"name": "e", "type": "expr", "expr": "a"})
@@ -0,0 +1,50 @@
+import os
+import itertools
+
+import pytest
+
+from core.extract import Extractor, OutputParser
+
+
+def testValueGroupAndConversions():
+    gups = Extractor({"name": "gups", "regex": r"(?i)gups\W+(?P<value>[0-9.]+(?:e[-+]?[0-9]+)?)"})
+    assert gups.match("GUPS = 1.5e-3\n") == pytest.approx(1.5e-3)
+    assert gups.match("no numbers here") is None
+
+    first = Extractor({"name": "n", "regex": r"(\d+) ops", "type": "int"})
+    assert first.match("done: 42 ops") == 42
+    whole = Extractor({"name": "n", "regex": r"\d+\.\d+"})
+    assert whole.match("took 3.25s") == 3.25
+
+
+def testUnparsableValue():
+    e = Extractor({"name": "n", "regex": r"ops: (\S+)", "type": "int"})
+    assert e.match("ops: many") is None
+
+
+def testInvalidRegex():
+    with pytest.raises(ValueError):
+        Extractor({"name": "n", "regex": "("})
+
+
+def testParserStreamsOutput():
+    extractors = [
+        Extractor({"name": "ops", "regex": r"ops (\d+)", "type": "int"}),
+        Extractor({"name": "lat", "regex": r"lat (\S+)"}),
+    ]
+    clock = itertools.count()
+    parser = OutputParser(extractors, lambda: float(next(clock)))
+    readFd, writeFd = os.pipe()
+    parser.start(readFd)
+    with open(writeFd, "w") as file:
+        file.write("ops 10 lat 0.5\nwarming up\nops 20\n")
+    parser.join()
+
+    results = {}
+    parser.getResults(results)
+    ops, lat = results["output"]["ops"], results["output"]["lat"]
+    assert list(ops["values"]) == [10, 20]
+    # Values from the same line share a timestamp
+    assert list(ops["timestamps"]) == [0.0, 1.0]
+    assert list(lat["values"]) == [0.5]
+    assert list(lat["timestamps"]) == [0.0]
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from analysis.index import ResultsIndex, chunkSize
+from core.results import ResultSink
+
+
+def writeRun(path: str, uname: str, started: str, times) -> None:
+    sink = ResultSink(path)
+    sink.writeMetadata({"config": "nightly", "uname": uname, "started": started})
+    for i, t in enumerate(times):
+        series = {"timestamps": [float(i), i + 0.5], "values": [i, i + 2]}
+        sink.writeIteration("build", i, {"time": t, "metrics": {"sysctl": {"vm.x": series}}})
+    sink.writeWorkload("build", {"iterations": len(times)})
+    sink.close()
+
+
+@pytest.fixture
+def index(tmp_path):
+    with ResultsIndex(str(tmp_path / "index.sqlite")) as index:
+        yield index
+
+
+def testImportSkipsUnchangedFiles(tmp_path, index):
+    path = str(tmp_path / "a.jsonl")
+    writeRun(path, "FreeBSD 15.0 main-n1", "2026-01-01T00:00:00", [1.0, 3.0])
+
+    assert index.importFile(path)
+    assert not index.importFile(path)
+    assert len(index.runs()) == 1
+
+    # A rewritten file replaces its previous import
+    writeRun(path, "FreeBSD 15.0 main-n1", "2026-01-01T00:00:00", [2.0, 4.0, 6.0])
+    os.utime(path, ns=(0, 0))
+    assert index.importFile(path)
+    [trend] = index.trend("build")
+    assert (trend["n"], trend["mean"]) == (3, 4.0)
+
+
+def testTrendOrdersRunsAndFilters(tmp_path, index):
+    writeRun(str(tmp_path / "b.jsonl"), "FreeBSD 15.0 stable-n2", "2026-01-02T00:00:00", [2.0])
+    writeRun(str(tmp_path / "a.jsonl"), "FreeBSD 15.0 main-n1", "2026-01-01T00:00:00", [1.0, 3.0])
+    assert index.importFiles([str(tmp_path / "a.jsonl"), str(tmp_path / "b.jsonl")]) == 2
+
+    trend = index.trend("build")
+    assert [(r["n"], r["mean"], r["min"], r["max"]) for r in trend] == [(2, 2.0, 1.0, 3.0), (1, 2.0, 2.0, 2.0)]
+    assert [r["mean"] for r in index.trend("build", uname="stable")] == [2.0]
+    assert [r["mean"] for r in index.trend("build", limit=1)] == [2.0]
+    assert index.trend("other") == []
+
+    # Numeric series are indexed by their mean
+    assert [r["mean"] for r in index.trend("build", "sysctl/vm.x")] == [1.5, 1.0]
+    assert ("build", "sysctl/vm.x") in index.names("build")
+
+
+def testSeriesRoundTripsAcrossChunks(tmp_path, index):
+    n = chunkSize + 10
+    series = {"timestamps": [i * 0.25 for i in range(n)], "values": list(range(n))}
+    path = str(tmp_path / "long.jsonl")
+    sink = ResultSink(path)
+    sink.writeMetadata({"config": "long"})
+    sink.writeIteration("build", 0, {"time": 1.0, "metrics": {"sysctl": {"vm.x": series}}})
+    sink.close()
+    index.importFile(path)
+
+    [run] = index.runs(workload="build")
+    ts, values = index.series(run["id"], "build", 0, "sysctl", "vm.x")
+    assert list(ts) == series["timestamps"]
+    assert list(values) == series["values"]
+    with pytest.raises(KeyError):
+        index.series(run["id"], "build", 0, "sysctl", "vm.y")
+
+
+def testImportFilesSkipsBrokenFiles(tmp_path, index):
+    path = tmp_path / "broken.json"
+    path.write_text("{")
+    assert index.importFiles([str(path), str(tmp_path / "missing.json")]) == 0
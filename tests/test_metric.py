@@ -0,0 +1,147 @@
+import time
+
+import pytest
+
+from core.metric import CollectorMetric, DTraceMetric, MetricRegistry
+
+
+def testOverlappingWindowsAreShared():
+    a = MetricRegistry.openWindow("a")
+    b = MetricRegistry.openWindow("b")
+    _, windowA = MetricRegistry.closeWindow(a)
+    c = MetricRegistry.openWindow("c")
+    _, windowB = MetricRegistry.closeWindow(b)
+    _, windowC = MetricRegistry.closeWindow(c)
+
+    assert windowA["scope"] == "system"
+    assert windowA["shared_with"] == ["b"]
+    assert windowB["shared_with"] == ["a", "c"]
+    assert windowC["shared_with"] == ["b"]
+
+    # Nothing is left open to overlap with later windows
+    d = MetricRegistry.openWindow("d")
+    assert MetricRegistry.closeWindow(d)[1]["shared_with"] == []
+
+
+def testCollectorParsesColumnsAndSkipsHeaders():
+    m = CollectorMetric(
+        {"name": "vmstat", "command": ["vmstat", "-w", "1"], "columns": ["r", "-", "free"], "skip": 1}
+    )
+    for ts, line in enumerate(
+        [" procs    memory", " r  b   free", " 9  0  1000", " 1  0  2048\n", " 2  0  4096 extra"]
+    ):
+        m.parseLine(float(ts), line)
+
+    results = {}
+    m.getResults(results)
+    series = results["collector"]["vmstat"]
+    assert set(series) == {"r", "free"}
+    assert list(series["r"]["timestamps"]) == [3.0, 4.0]
+    assert list(series["r"]["values"]) == [1, 2]
+    assert list(series["free"]["values"]) == [2048, 4096]
+
+
+def testCollectorExtractors():
+    m = CollectorMetric(
+        {
+            "name": "iostat",
+            "command": ["iostat", "-w", "1"],
+            "extract": [{"name": "tps", "regex": r"tps=(\d+)", "type": "int"}, {"name": "mbs", "regex": r"([\d.]+) MB/s"}],
+        }
+    )
+    m.parseLine(1.0, "tps=12 0.5 MB/s")
+    m.parseLine(2.0, "tps=13")
+    m.parseLine(3.0, "unrelated")
+
+    results = {}
+    m.getResults(results)
+    assert list(results["collector"]["iostat"]["tps"]["values"]) == [12, 13]
+    assert list(results["collector"]["iostat"]["mbs"]["values"]) == [0.5]
+
+
+def testCollectorNeedsOneParser():
+    with pytest.raises(ValueError):
+        CollectorMetric({"name": "x", "command": ["true"]})
+    with pytest.raises(ValueError):
+        CollectorMetric(
+            {"name": "x", "command": ["true"], "columns": ["a"], "extract": [{"name": "b", "regex": "b"}]}
+        )
+
+
+def testCollectorStreamsCommandOutput():
+    m = CollectorMetric({"name": "seq", "command": ["sh", "-c", "echo n; seq 3; exec sleep 30"], "columns": ["n"]})
+    m.start()
+    deadline = time.monotonic() + 5
+    while len(m.values["n"]) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Stopped with SIGTERM while still running
+    m.stop()
+
+    results = {}
+    m.getResults(results)
+    assert list(results["collector"]["seq"]["n"]["values"]) == [1, 2, 3]
+    assert m.process is None
+
+
+def testDTraceCompileScript():
+    clause, aggs = DTraceMetric.compileScript({"name": "compact", "src": "fbt::vm_compact_run:return { trace(arg1) }"})
+    assert aggs == {"compact": "sum"}
+    assert clause == "fbt::vm_compact_run:return\n{\n    @compact = sum(arg1);\n}\n"
+
+    _, aggs = DTraceMetric.compileScript({"name": "faults", "src": "fbt::vm_fault:entry {}"})
+    assert aggs == {"faults": "count"}
+    _, aggs = DTraceMetric.compileScript(
+        {"name": "lat", "src": "fbt::f:return { trace((arg1 - 1) * 2) }", "aggregation": "max"}
+    )
+    assert aggs == {"lat": "max"}
+
+    # Scripts updating aggregations are kept, anonymous ones named after the script
+    clause, aggs = DTraceMetric.compileScript(
+        {"name": "io", "src": "io:::start { @[execname] = count(); @bytes = sum(args[0]->b_bcount); }"}
+    )
+    assert aggs == {"io": "count", "bytes": "sum"}
+    assert "@io[execname] = count();" in clause
+
+
+@pytest.mark.parametrize(
+    "script",
+    [
+        {"name": "x", "src": "{ trace(arg0) }"},
+        {"name": "x", "src": "fbt::f:entry { trace(arg0); trace(arg1) }"},
+        {"name": "x", "src": "fbt::f:entry {}", "aggregation": "max"},
+        {"name": "x", "src": "fbt::f:entry { @q = quantize(arg0); }"},
+    ],
+)
+def testDTraceRejectsScripts(script):
+    with pytest.raises(ValueError):
+        DTraceMetric.compileScript(script)
+
+
+def testDTraceParsesAggregationDumps():
+    m = DTraceMetric(
+        {
+            "name": "vm",
+            "sampling_rate": 100,
+            "scripts": [
+                {"name": "faults", "src": "fbt::vm_fault:entry {}"},
+                {"name": "io", "src": "io:::start { @[execname] = count(); }"},
+            ],
+        }
+    )
+    assert "tick-100ms" in m.program
+    assert "clear(@faults);" in m.program
+
+    lines = ["kbench-begin", "kbench-tick", "kbench-agg faults", "   12", "kbench-agg io", "  make   3", "  cc  5"]
+    lines += ["kbench-end", "ignored 1", "kbench-tick", "kbench-agg faults", "   0", "garbage line", "kbench-end"]
+    for ts, line in enumerate(lines):
+        m.parseLine(float(ts), line + "\n")
+    assert m.ready.is_set()
+
+    results = {}
+    m.getResults(results)
+    series = results["dtrace"]["vm"]
+    assert set(series) == {"faults", "io/make", "io/cc"}
+    # Values are stamped with the tick that dumped them
+    assert list(series["faults"]["timestamps"]) == [1.0, 9.0]
+    assert list(series["faults"]["values"]) == [12, 0]
+    assert list(series["io/cc"]["values"]) == [5]
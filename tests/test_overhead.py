@@ -0,0 +1,61 @@
+import pytest
+
+from core.overhead import LatencyHistogram, Overhead
+
+
+def testBucketsArePowersOfTwo():
+    h = LatencyHistogram()
+    for seconds in (0.5e-6, 3e-6, 3.5e-6, 1e-3):
+        h.record(seconds)
+
+    view = h.view()
+    assert view["count"] == 4
+    # 3us and 3.5us both fall below 4us, 1ms below 1024us
+    assert view["buckets"] == {"<1us": 1, "<4us": 2, "<1024us": 1}
+    assert view["max"] == 1e-3
+    assert view["mean"] == pytest.approx((0.5e-6 + 3e-6 + 3.5e-6 + 1e-3) / 4)
+
+
+def testQuantilesAreBucketBounds():
+    h = LatencyHistogram()
+    for _ in range(99):
+        h.record(10e-6)
+    h.record(0.5)
+    assert h.quantile(0.5) == 16e-6
+    # Never above the largest duration seen
+    assert h.quantile(1.0) == 0.5
+    assert h.quantile(0.99) == 16e-6
+
+
+def testHugeDurationsLandInLastBucket():
+    h = LatencyHistogram()
+    h.record(1e6)
+    assert h.counts[LatencyHistogram.nbuckets - 1] == 1
+
+
+def testEmptyHistogram():
+    assert LatencyHistogram().view() == {"count": 0}
+
+
+class Sampled:
+    def __init__(self) -> None:
+        self.samples = []
+
+    def sample(self, ts: float) -> None:
+        self.samples.append(ts)
+
+
+def testOverheadTimesSamples():
+    overhead = Overhead()
+    metric = Sampled()
+    overhead.timeSample("sysctl:vm", metric, 1.0)
+    overhead.timeSample("sysctl:vm", metric, 2.0)
+    overhead.missed += 1
+
+    results = overhead.getResults()
+    assert metric.samples == [1.0, 2.0]
+    assert results["sample_latency"]["sysctl:vm"]["count"] == 2
+    assert results["missed"] == 1
+
+    overhead.reset()
+    assert overhead.getResults()["sample_latency"]["sysctl:vm"] == {"count": 0}
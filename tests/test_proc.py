@@ -0,0 +1,90 @@
+import os
+import sys
+import errno
+import ctypes
+
+import pytest
+
+import util.proc
+
+from util.proc import FakeProcBackend, FreeBSDProcBackend, KinfoProc, LinuxProcBackend, ProcStats
+
+
+def testProcStatsFollowsRestartedProcess():
+    backend = FakeProcBackend({"compactd": 10}, {10: {"time": 1.0}})
+    proc = ProcStats("compactd", backend)
+    assert proc.read() == {"time": 1.0}
+    assert proc.pid == 10
+
+    # The process exits and a new instance starts
+    del backend.stats[10]
+    backend.procs["compactd"] = 11
+    backend.stats[11] = {"time": 0.1}
+    assert proc.read() == {"time": 0.1}
+    assert proc.pid == 11
+
+    del backend.stats[11]
+    del backend.procs["compactd"]
+    assert proc.read() is None
+    assert proc.pid is None
+
+
+def testProcStatsWithoutProcess():
+    proc = ProcStats("missing", FakeProcBackend({}, {}))
+    assert proc.read() is None
+    proc.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc")
+def testLinuxBackendReadsAllStats():
+    backend = LinuxProcBackend()
+    handle = backend.open(os.getpid())
+    values = backend.read(handle)
+    backend.close(handle)
+    assert set(values) == set(util.proc.stats)
+    assert values["rss"] > 0 and values["threads"] >= 1
+
+
+def fakeProcTable(procs):
+    """
+    sysctl(3) stand-in serving the kern.proc.proc table and the
+    kern.proc.args of 'procs', a list of (pid, comm, args).
+    """
+    table = b""
+    for pid, comm, _ in procs:
+        kp = KinfoProc(ki_structsize=ctypes.sizeof(KinfoProc), ki_pid=pid, ki_comm=comm)
+        table += bytes(kp)
+    args = {pid: a for pid, _, a in procs}
+
+    def sysctl(mib, buf, size):
+        if mib[2] == FreeBSDProcBackend.KERN_PROC_ARGS:
+            data = args.get(mib[3])
+            if data is None:
+                return errno.EPERM
+        else:
+            data = table
+        if buf is not None:
+            ctypes.memmove(buf, data, len(data))
+        size.value = len(data)
+        return 0
+
+    return sysctl
+
+
+def testFreeBSDFindMatchesTruncatedNames():
+    backend = FreeBSDProcBackend.__new__(FreeBSDProcBackend)
+    backend._sysctl = fakeProcTable(
+        [
+            (10, b"compactd", b"compactd\0"),
+            (11, b"streamcluster-bench", b"/usr/local/bin/streamcluster-bench-a\0-n\0"),
+            (12, b"streamcluster-bench", b"./streamcluster-bench-b\0"),
+            (13, b"canneal-parallel-ru", None),
+        ]
+    )
+    assert backend.find("compactd") == 10
+    assert backend.find("streamcluster-bench-b") == 12
+    assert backend.find("streamcluster-bench-a") == 11
+    # Arguments that cannot be read leave the truncated name to decide
+    assert backend.find("canneal-parallel-run") == 13
+    assert backend.find("compact") is None
+    assert backend.find("streamcluster-bench-c") is None
@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import socket
+
+from threading import Event, Thread, Timer
+
+import pytest
+
+from core.remote import Agent, Controller, connect, parseAddress, sendRecord
+from core.results import ResultSink, recover
+
+
+def testParseAddressDefaultsToLoopback():
+    assert parseAddress(":9000") == (socket.AF_INET, ("127.0.0.1", 9000))
+    assert parseAddress("[::1]:9000") == (socket.AF_INET6, ("::1", 9000))
+    assert parseAddress("unix:/tmp/kbench.sock") == (socket.AF_UNIX, "/tmp/kbench.sock")
+    with pytest.raises(ValueError):
+        parseAddress("localhost")
+
+
+def testTcpAgentRequiresToken():
+    with pytest.raises(ValueError):
+        Agent("127.0.0.1:9000")
+    Agent("unix:/tmp/kbench.sock")
+
+
+def testAgentChecksToken():
+    agent = Agent("127.0.0.1:9000", token="secret")
+    agent.authorize({"token": "secret"})
+    for request in ({}, {"token": "wrong"}, {"token": 1}):
+        with pytest.raises(PermissionError):
+            agent.authorize(request)
+
+
+def testAgentOnlyUsesItsOwnConfigs(tmp_path):
+    (tmp_path / "config").mkdir()
+    (tmp_path / "config" / "vm.toml").write_text("")
+    (tmp_path / "outside.toml").write_text("")
+    (tmp_path / "config" / "link.toml").symlink_to(tmp_path / "outside.toml")
+    agent = Agent("unix:/tmp/kbench.sock", configDir=str(tmp_path / "config"))
+
+    assert agent.configPath("vm.toml") == str((tmp_path / "config" / "vm.toml").resolve())
+    assert agent.configPath("vm") == agent.configPath("vm.toml")
+    for name in ("../outside.toml", str(tmp_path / "outside.toml"), ".", "..", "link.toml", "missing"):
+        with pytest.raises(ValueError):
+            agent.configPath(name)
+
+
+@pytest.fixture
+def agents(tmp_path):
+    """
+    Two agents listening on Unix sockets, both monitoring a collector
+    that counts up every 50ms.
+    """
+    metrics = tmp_path / "metrics.toml"
+    metrics.write_text(
+        "[[collector]]\n"
+        'name = "counter"\n'
+        "command = [\"sh\", \"-c\", \"i=0; while :; do echo $i; i=$((i + 1)); sleep 0.05; done\"]\n"
+        'columns = ["n"]\n'
+    )
+    (tmp_path / "config").mkdir()
+    (tmp_path / "config" / "monitor.toml").write_text(
+        f'name = "monitor"\nbenchmarks = "all"\nmetrics = "{metrics}"\nflush_interval = 30\n'
+    )
+
+    stopEvent = Event()
+    addresses, threads = [], []
+    for i in range(2):
+        address = f"unix:{tmp_path}/agent{i}.sock"
+        agent = Agent(address, configDir=str(tmp_path / "config"))
+        t = Thread(target=agent.serve, args=(stopEvent,))
+        t.start()
+        addresses.append(address)
+        threads.append(t)
+    for address in addresses:
+        while not os.path.exists(parseAddress(address)[1]):
+            time.sleep(0.01)
+    yield addresses
+
+    stopEvent.set()
+    for t in threads:
+        t.join()
+
+
+def testControllerMonitorsSeveralAgents(tmp_path, agents):
+    paths = {}
+
+    def sinkFactory(agent):
+        paths[agent] = str(tmp_path / f"{len(paths)}.jsonl")
+        return ResultSink(paths[agent])
+
+    stopEvent = Event()
+    Timer(1.5, stopEvent.set).start()
+    start = time.monotonic()
+    Controller(agents, {"op": "monitor", "config": "monitor"}, sinkFactory).run(stopEvent)
+    # Stopped on request long before the 30s flush interval
+    assert time.monotonic() - start < 10
+
+    assert set(paths) == set(agents)
+    for agent, path in paths.items():
+        results = recover(path)
+        assert results["agent"] == agent
+        assert results["action"] == "monitor"
+        values = list(results["metrics"]["collector"]["counter"]["n"]["values"])
+        assert values and values == list(range(len(values)))
+
+
+def testControllerReportsFailedSessions(tmp_path, agents):
+    request = {"op": "monitor", "config": "missing"}
+    sinks = iter(range(3))
+    controller = Controller(
+        agents + [f"unix:{tmp_path}/none.sock"], request, lambda agent: ResultSink(str(tmp_path / f"{next(sinks)}.jsonl"))
+    )
+    with pytest.raises(RuntimeError):
+        controller.run(Event())
+    assert set(controller.errors) == set(agents) | {f"unix:{tmp_path}/none.sock"}
+    assert "No configuration" in controller.errors[agents[0]]
+
+
+@pytest.mark.parametrize("line", [b"not json\n", b"[1]\n", b""])
+def testAgentStopsOnBadLineOrHangup(agents, line):
+    sock = connect(agents[0])
+    sendRecord(sock, {"op": "monitor", "config": "monitor"})
+    time.sleep(0.5)
+    if line:
+        sock.sendall(line)
+    else:
+        sock.shutdown(socket.SHUT_WR)
+    sock.settimeout(10)
+
+    records = [json.loads(line) for line in sock.makefile("rb")]
+    sock.close()
+    assert records[0]["type"] == "meta"
+    assert records[-1] == {"type": "done"}
@@ -0,0 +1,69 @@
+import json
+
+from core.results import ResultSink, readRecords, recover
+
+
+def writeRun(path: str) -> ResultSink:
+    sink = ResultSink(path)
+    sink.writeMetadata({"config": "test"})
+    sink.writeSamples({"sysctl": {"vm.x": {"timestamps": [0.0, 1.0], "values": [1, 2]}}})
+    sink.writeSamples({"sysctl": {"vm.x": {"timestamps": [2.0], "values": [3]}}})
+    sink.writeIteration("w", 0, {"time": 1.5})
+    sink.writeWorkload("w", {"iterations": 1})
+    return sink
+
+
+def testRecoverJoinsSampleRecords(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    writeRun(path).close()
+
+    results = recover(path)
+    assert results["config"] == "test"
+    assert results["metrics"]["sysctl"]["vm.x"] == {"timestamps": [0.0, 1.0, 2.0], "values": [1, 2, 3]}
+    assert results["w"] == {0: {"time": 1.5}, "iterations": 1}
+
+
+def testSummaryIndexesRecords(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    writeRun(path).close()
+
+    *records, summary = readRecords(path)
+    assert summary["type"] == "summary"
+    assert summary["records"] == len(records)
+    with open(path, "rb") as file:
+        for entry, record in zip(summary["index"], records):
+            file.seek(entry["offset"])
+            assert json.loads(file.readline()) == record
+
+
+def testKilledRunIsRecovered(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    sink = writeRun(path)
+    # Killed halfway through writing a record, without a summary
+    sink.file.write(b'{"type": "iteration", "workl')
+    sink.file.flush()
+
+    results = recover(path)
+    assert results["w"][0] == {"time": 1.5}
+    assert len(results["metrics"]["sysctl"]["vm.x"]["values"]) == 3
+
+
+def testRecoverCombinesSeriesChunks(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    sink = ResultSink(path)
+    sink.writeSamples({"sysctl": {"vm.x": {"timestamps": [0.0, 1.0], "values": [1, 2]}}})
+    # A downsampled chunk holding every other of its 6 samples
+    sink.writeSamples({"sysctl": {"vm.x": {"timestamps": [2.0, 4.0, 6.0], "values": [3, 5, 7], "count": 6, "stride": 2}}})
+    sink.writeSamples({"sysctl": {"vm.y": {"timestamps": [0.0], "values": [1], "runs": [4], "end": 3.0}}})
+    sink.writeSamples({"sysctl": {"vm.y": {"timestamps": [4.0], "values": [2], "runs": [2], "end": 5.0}}})
+    sink.writeSamples({"sysctl": {"vm.y": {"timestamps": [], "values": [], "runs": [], "end": None}}})
+    sink.close()
+
+    metrics = recover(path)["metrics"]["sysctl"]
+    assert metrics["vm.x"] == {
+        "timestamps": [0.0, 1.0, 2.0, 4.0, 6.0],
+        "values": [1, 2, 3, 5, 7],
+        "count": 8,
+        "stride": 2,
+    }
+    assert metrics["vm.y"] == {"timestamps": [0.0, 4.0], "values": [1, 2], "runs": [4, 2], "end": 5.0}
@@ -0,0 +1,91 @@
+import time
+
+from collections import defaultdict
+from threading import Lock
+
+from core.sampler import AdaptiveSamplingGroup, SamplingGroup, SamplingScheduler
+
+
+class CountingMetric:
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.timestamps = []
+        self.changed = True
+
+    def label(self) -> str:
+        return "counting"
+
+    def sample(self, ts: float) -> None:
+        self.timestamps.append(ts)
+        time.sleep(self.delay)
+
+
+def runScheduler(groups, duration: float) -> None:
+    scheduler = SamplingScheduler(groups, Lock())
+    scheduler.start(time.monotonic())
+    time.sleep(duration)
+    scheduler.stop()
+
+
+def testSamplesStayOnGrid():
+    fast, slow = CountingMetric(), CountingMetric()
+    groups = [SamplingGroup(10, [fast]), SamplingGroup(20, [slow])]
+    runScheduler(groups, 0.2)
+
+    # Allow for a loaded test machine, but no drift beyond a period
+    assert 10 <= len(fast.timestamps) <= 20
+    assert 5 <= len(slow.timestamps) <= 10
+    for i, ts in enumerate(slow.timestamps):
+        assert ts >= (i + 1) * 0.02
+
+    results = defaultdict(dict)
+    for g in groups:
+        g.getResults(results)
+    assert set(results["schedule"]) == {"10ms", "20ms"}
+    assert len(results["schedule"]["10ms"]["lateness"]["values"]) == len(fast.timestamps)
+
+
+def testOverrunTicksAreSkipped():
+    metric = CountingMetric(delay=0.035)
+    group = SamplingGroup(10, [metric])
+    runScheduler([group], 0.2)
+
+    assert group.missed > 0
+    # Never sampled in a burst to catch up
+    gaps = [b - a for a, b in zip(metric.timestamps, metric.timestamps[1:])]
+    assert min(gaps) >= 0.03
+
+
+class SteppedMetric(CountingMetric):
+    """
+    Changes on the samples listed in 'changes'.
+    """
+
+    def __init__(self, changes) -> None:
+        super().__init__()
+        self.changes = set(changes)
+
+    def sample(self, ts: float) -> None:
+        self.changed = len(self.timestamps) in self.changes
+        super().sample(ts)
+
+
+def testAdaptivePeriodFollowsChanges():
+    metric = SteppedMetric(changes=[12])
+    group = AdaptiveSamplingGroup("adaptive", 10, 80, [metric])
+    periods = []
+    for i in range(14):
+        group.sample(0.0, 0.0)
+        periods.append(group.period)
+
+    # Backs off after every 4 unchanged samples up to the maximum,
+    # and drops back on a change
+    assert periods[:12] == [0.01] * 3 + [0.02] * 4 + [0.04] * 4 + [0.08]
+    assert periods[12:] == [0.04, 0.04]
+
+    results = defaultdict(dict)
+    group.getResults(results)
+    periods = results["schedule"]["adaptive"]["periods"]
+    # One run per period the group sampled at
+    assert list(periods["values"]) == [0.01, 0.02, 0.04, 0.08, 0.04]
+    assert sum(periods["runs"]) == 14
@@ -0,0 +1,129 @@
+import pytest
+
+from core.columnar import BinaryResultSink
+from core.derived import DerivedMetric
+from core.loader import load
+from core.results import ResultSink
+from core.series import SampleSeries, expandRuns
+
+# A counter that stays flat for most samples, taken every 0.5s
+samples = [(i * 0.5, v) for i, v in enumerate([1, 1, 1, 2, 2, 5, 5, 5, 5, 7])]
+
+
+def rleSeries() -> SampleSeries:
+    series = SampleSeries(encoding="rle")
+    for ts, value in samples:
+        series.append(ts, value)
+    return series
+
+
+def testExpandRunsRestoresEverySample():
+    view = rleSeries().view()
+    assert list(view["runs"]) == [3, 2, 4, 1]
+
+    ts, values = expandRuns(view["timestamps"], view["values"], view["runs"], view["end"])
+    assert list(values) == [v for _, v in samples]
+    assert list(ts) == pytest.approx([t for t, _ in samples])
+
+
+@pytest.mark.parametrize("sinkClass,ext", [(ResultSink, "jsonl"), (BinaryResultSink, "kbc")])
+def testRleSeriesRoundTrip(tmp_path, sinkClass, ext):
+    path = str(tmp_path / f"results.{ext}")
+    sink = sinkClass(path)
+    sink.writeMetadata({"config": "test"})
+    sink.writeIteration("w", 0, {"time": 1.0, "metrics": {"sysctl": {"vm.x": rleSeries().view()}}})
+    sink.close()
+
+    with load(path) as result:
+        ts, values = result.series("w", 0, "sysctl", "vm.x")
+    assert list(values) == [v for _, v in samples]
+    assert list(ts) == pytest.approx([t for t, _ in samples])
+
+
+def testSummaryWeightsRuns():
+    m = DerivedMetric({"name": "s", "type": "summary", "source": "sysctl/vm.x"})
+    summary = m.compute({"sysctl": {"vm.x": rleSeries().view()}})
+    assert summary["count"] == len(samples)
+    assert summary["mean"] == pytest.approx(sum(v for _, v in samples) / len(samples))
+
+
+def testRleWindowCarriesRunInEffect():
+    # The window opens in the middle of the run of 5s and closes in it
+    view = rleSeries().window(3.0, 4.0)
+    ts, values = expandRuns(view["timestamps"], view["values"], view["runs"], view["end"])
+    assert list(values) == [v for t, v in samples if 3.0 <= t <= 4.0]
+    assert list(ts) == pytest.approx([t for t, _ in samples if 3.0 <= t <= 4.0])
+
+
+def testRleDiscardKeepsRunInEffect():
+    series = rleSeries()
+    series.discard(3.0)
+    assert list(series.view()["values"]) == [5, 7]
+
+    view = series.window(3.0, 4.5)
+    ts, values = expandRuns(view["timestamps"], view["values"], view["runs"], view["end"])
+    assert list(values) == [5, 5, 5, 7]
+    assert list(ts) == pytest.approx([3.0, 3.5, 4.0, 4.5])
+
+
+def testRingKeepsNewestSamples():
+    series = SampleSeries(capacity=4, overflow="ring")
+    for i in range(10):
+        series.append(float(i), i)
+
+    view = series.view()
+    assert list(view["timestamps"]) == [6.0, 7.0, 8.0, 9.0]
+    assert list(view["values"]) == [6, 7, 8, 9]
+    assert view["count"] == 10
+
+
+def testDownsampleHalvesResolution():
+    series = SampleSeries(capacity=4, overflow="downsample")
+    for i in range(10):
+        series.append(float(i), i)
+
+    view = series.view()
+    assert view["stride"] == 4
+    # Every fourth sample after the second decimation
+    assert list(view["values"]) == [0, 4, 8]
+    assert view["count"] == 10
+
+
+def testColumnsFallBackToList():
+    series = SampleSeries()
+    series.append(0.0, 1)
+    assert series.values.typecode == "q"
+    # Does not fit a signed 64-bit column
+    series.append(1.0, 2**64)
+    series.append(2.0, "text")
+    assert list(series.view()["values"]) == [1, 2**64, "text"]
+
+
+def testViewSurvivesReset():
+    series = SampleSeries()
+    for i in range(3):
+        series.append(float(i), float(i))
+    view = series.view()
+    series.reset()
+    series.append(5.0, 5.0)
+    assert list(view["values"]) == [0.0, 1.0, 2.0]
+
+
+def testInvalidModes():
+    with pytest.raises(ValueError):
+        SampleSeries(overflow="drop")
+    with pytest.raises(ValueError):
+        SampleSeries(encoding="delta")
+
+
+def testRleDecimationKeepsSampleCount():
+    series = SampleSeries(capacity=2, overflow="downsample", encoding="rle")
+    for i, value in enumerate([1, 2, 2, 3, 3, 3]):
+        series.append(float(i), value)
+
+    view = series.view()
+    # The run of 1s absorbed the run of 2s dropped after it, and
+    # samples skipped at the new stride still extend the run of 3s
+    assert list(view["values"]) == [1, 3]
+    assert list(view["runs"]) == [3, 3]
+    assert view["end"] == 5.0
@@ -0,0 +1,53 @@
+import os
+import time
+import signal
+
+from util.spawn import SpawnedProcess
+
+
+def testReleaseRunsCommand(tmp_path):
+    out = os.open(tmp_path / "out", os.O_WRONLY | os.O_CREAT)
+    process = SpawnedProcess(["sh", "-c", "pwd"], cwd=str(tmp_path), stdout=out)
+    os.close(out)
+    process.release()
+    status = process.wait()
+
+    assert status["status"] == 0
+    assert status["time"] >= 0
+    assert set(status["rusage"]) >= {"utime", "stime", "maxrss"}
+    assert (tmp_path / "out").read_text().strip() == os.path.realpath(tmp_path)
+
+
+def testKillWhileOthersWait():
+    first = SpawnedProcess(["true"])
+    second = SpawnedProcess(["true"])
+    # Hangs if the second child holds the first one's barrier open
+    signal.alarm(5)
+    try:
+        first.kill()
+    finally:
+        signal.alarm(0)
+
+    second.release()
+    assert second.wait()["status"] == 0
+
+
+def testExitStatus():
+    failing = SpawnedProcess(["sh", "-c", "exit 3"])
+    failing.release()
+    assert failing.wait()["status"] == 3
+
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    missing = SpawnedProcess(["kbench-no-such-command"], stdout=devnull)
+    os.close(devnull)
+    missing.release()
+    assert missing.wait()["status"] == 127
+
+
+def testTerminateEscalates():
+    # Ignores SIGTERM, so only SIGKILL stops it
+    process = SpawnedProcess(["sh", "-c", "trap '' TERM; while :; do sleep 0.01; done"])
+    process.release()
+    # Give the shell time to install its trap
+    time.sleep(0.2)
+    assert process.terminate(timeout=0.2) == -signal.SIGKILL
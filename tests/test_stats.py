@@ -0,0 +1,85 @@
+import json
+import math
+
+import pytest
+
+import analysis.stats as stats
+
+from analysis.compare import compare, compareSamples, formatTable
+from core.results import ResultSink
+
+
+def testMannWhitneyExact():
+    u, p = stats.mannWhitneyU([1, 2, 3], [4, 5, 6])
+    assert u == 0
+    # Only 2 of the 20 orderings are as extreme
+    assert p == pytest.approx(0.1)
+    assert stats.mannWhitneyU([1, 2, 3], []) == pytest.approx((math.nan, math.nan), nan_ok=True)
+
+
+def testMannWhitneyTies():
+    u, p = stats.mannWhitneyU([1, 1, 2, 2], [1, 1, 2, 2])
+    assert u == 8
+    assert p == 1.0
+
+
+def testCliffsDelta():
+    assert stats.cliffsDelta([1, 2, 3], [4, 5, 6]) == 1
+    assert stats.cliffsDelta([4, 5, 6], [1, 2, 3]) == -1
+    # b beats a in 5 of 9 pairs and loses 3
+    assert stats.cliffsDelta([1, 3, 5], [2, 4, 6]) == pytest.approx(3 / 9)
+
+
+def testSingleIterationIsValidJson():
+    c = compareSamples([1.0], [2.0])
+    assert c["status"] == "too_few_samples"
+    assert c["relative"] == 1.0
+    assert c["ci"] is None and c["p"] is None
+    json.dumps(c, allow_nan=False)
+
+
+def testZeroBaselineIsValidJson():
+    c = compareSamples([0.0, 0.0], [1.0, 1.0])
+    assert c["status"] == "ok"
+    assert c["relative"] is None
+    json.dumps(c, allow_nan=False)
+
+
+def testCompareOneIteration(tmp_path):
+    paths = []
+    for name, t in (("baseline", 1.0), ("patched", 1.5)):
+        path = str(tmp_path / f"{name}.jsonl")
+        sink = ResultSink(path)
+        sink.writeMetadata({"config": name})
+        sink.writeIteration("w", 0, {"time": t})
+        sink.close()
+        paths.append(path)
+
+    report = compare(*paths)
+    assert report["workloads"]["w"]["time"]["status"] == "too_few_samples"
+    json.dumps(report, allow_nan=False)
+    assert "too few samples" in formatTable(report)
+
+
+def testBootstrapCIContainsDifference():
+    a = [10.0, 10.2, 9.9, 10.1, 10.0, 9.8]
+    b = [11.0, 11.1, 10.9, 11.2, 10.8, 11.0]
+    low, high = stats.bootstrapDiffCI(a, b)
+    assert low < 1.0 < high
+    assert low > 0
+    # Seeded, so repeated comparisons agree
+    assert stats.bootstrapDiffCI(a, b) == (low, high)
+    assert stats.bootstrapDiffCI([1.0], b) == (-math.inf, math.inf)
+
+
+def testWelchAndMeanCI():
+    a = [1.0, 2.0, 3.0]
+    low, high = stats.meanCI(a)
+    assert low < 2.0 < high
+    assert stats.welchDiffCI([1.0, 1.0], [2.0, 2.0]) == (1.0, 1.0)
+
+
+def testHedgesG():
+    assert stats.hedgesG([1.0, 1.0], [1.0, 1.0]) == 0.0
+    assert stats.hedgesG([1.0, 2.0, 3.0], [2.0, 3.0, 4.0]) == pytest.approx(0.8, abs=0.01)
+    assert math.isnan(stats.hedgesG([1.0], [2.0, 3.0]))
@@ -0,0 +1,53 @@
+import sys
+import itertools
+from collections import defaultdict
+
+import pytest
+
+import util.sysctl
+
+from core.metric import SysctlMetric
+from util.sysctl import FakeSysctlBackend, ProcSysBackend, SysctlReader
+
+
+@pytest.fixture
+def fakeBackend():
+    counter = itertools.count()
+    backend = FakeSysctlBackend({"hw.ncpu": 8, "vm.stats.vm.v_pdwakeups": lambda: next(counter)})
+    util.sysctl.setDefaultBackend(backend)
+    yield backend
+    util.sysctl.setDefaultBackend(None)
+
+
+def testReaderReadsGroup(fakeBackend):
+    reader = SysctlReader(["hw.ncpu", "vm.stats.vm.v_pdwakeups"])
+    assert reader.read() == [8, 0]
+    assert reader.read() == [8, 1]
+    reader.close()
+    assert reader.read() == []
+
+
+def testUnknownSysctl(fakeBackend):
+    with pytest.raises(ValueError):
+        SysctlReader(["hw.ncpu", "vm.missing"])
+
+
+def testSysctlMetricSamples(fakeBackend):
+    metric = SysctlMetric({"name": "vm", "oids": ["hw.ncpu", "vm.stats.vm.v_pdwakeups"]})
+    for ts in (0.0, 1.0, 2.0):
+        metric.sample(ts)
+
+    results = defaultdict(dict)
+    metric.getResults(results)
+    assert list(results["sysctl"]["hw.ncpu"]["values"]) == [8, 8, 8]
+    assert list(results["sysctl"]["vm.stats.vm.v_pdwakeups"]["values"]) == [0, 1, 2]
+    assert list(results["sysctl"]["hw.ncpu"]["timestamps"]) == [0.0, 1.0, 2.0]
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc/sys")
+def testProcSysBackend():
+    reader = SysctlReader(["kernel.pid_max", "kernel.ostype"], ProcSysBackend())
+    pidMax, ostype = reader.read()
+    assert isinstance(pidMax, int) and pidMax > 0
+    assert ostype == "Linux"
+    reader.close()
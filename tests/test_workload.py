@@ -0,0 +1,72 @@
+import itertools
+from threading import Lock
+
+import pytest
+
+from core.benchmark import BenchmarkRegistry
+from core.workload import ResourcePool, Workload, WorkloadRegistry
+
+
+def workload(**info) -> Workload:
+    return Workload("w.toml", {"info": {"name": "w", "benchmark": "b", "warmup": 0, "run_args": "x", **info}})
+
+
+@pytest.fixture
+def times(monkeypatch):
+    """
+    Wall times the fake iterations take, in order.
+    """
+    times = []
+    it = iter(times)
+    monkeypatch.setattr(BenchmarkRegistry, "get", staticmethod(lambda name: None))
+    monkeypatch.setattr(
+        WorkloadRegistry, "runIteration", staticmethod(lambda w, b, cpus=None, windowed=False: {"time": next(it)})
+    )
+    return times
+
+
+def testStopsOnceConverged(times):
+    times.extend([1.0, 1.01, 0.99, 1.0, 5.0, 5.0])
+    results = WorkloadRegistry.runWorkload(workload(target_ci=0.05, warmup=1), None, Lock())
+    summary = results["summary"]
+    # The warmup run is discarded
+    assert [results[i]["time"] for i in range(summary["iterations"])] == [1.01, 0.99, 1.0]
+    assert summary["stop_reason"] == "converged"
+    assert summary["ci_width"] <= 0.05
+
+
+def testStopsAtMaxIterations(times):
+    times.extend(itertools.islice(itertools.cycle([1.0, 2.0]), 10))
+    summary = WorkloadRegistry.runWorkload(workload(target_ci=0.01, max_iterations=5), None, Lock())["summary"]
+    assert summary["iterations"] == 5
+    assert summary["stop_reason"] == "max_iterations"
+
+
+def testFixedIterationsWithoutTarget(times):
+    times.extend([1.0, 1.0, 1.0, 1.0])
+    summary = WorkloadRegistry.runWorkload(workload(iterations=4), None, Lock())["summary"]
+    assert summary["iterations"] == 4
+    assert "ci_width" not in summary
+
+
+def testInvalidIterationBounds():
+    with pytest.raises(ValueError):
+        workload(target_ci=0.05, min_iterations=10, max_iterations=5)
+
+
+def testResourcePoolHandsOutDisjointCpus():
+    pool = ResourcePool({0, 1, 2, 3}, memory=1024)
+    big, small = workload(cpus=3, memory=512), workload(cpus=2, memory=256)
+    pool.check(big)
+
+    first = pool.acquire(big)
+    assert first == {0, 1, 2}
+    assert not pool.fits(small)
+    pool.release(big, first)
+    assert pool.fits(small)
+    assert pool.acquire(small).isdisjoint(pool.free)
+
+    with pytest.raises(ValueError):
+        pool.check(workload(cpus=5))
+    with pytest.raises(ValueError):
+        pool.check(workload(memory=2048))
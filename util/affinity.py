@@ -0,0 +1,216 @@
+import os
+import sys
+import ctypes
+import platform
+
+from abc import ABC, abstractmethod
+from typing import Iterable, Set
+
+from ctypes.util import find_library
+
+import util.sysctl
+
+
+class AffinityBackend(ABC):
+    # Whether bindMemory() can target other processes. Otherwise it
+    # only binds the calling thread, which children inherit when spawned.
+    bindsByPid: bool = True
+
+    @abstractmethod
+    def getAffinity(self, pid: int) -> Set[int]:
+        """
+        Return the CPUs process 'pid' (0 for the calling process) may run on.
+        """
+        pass
+
+    @abstractmethod
+    def setAffinity(self, pid: int, cpus: Iterable[int]) -> None:
+        pass
+
+    @abstractmethod
+    def bindMemory(self, pid: int, domain: int | None) -> None:
+        """
+        Restrict future allocations of process 'pid' (0 for the calling
+        thread) to NUMA domain 'domain', or lift the restriction if None.
+        Inherited by child processes.
+        """
+        pass
+
+
+class LinuxAffinityBackend(AffinityBackend):
+    MPOL_DEFAULT = 0
+    MPOL_BIND = 2
+    # Memory policies are per thread and cannot be set for another process
+    bindsByPid = False
+    # set_mempolicy(2) has no libc wrapper
+    setMempolicySyscall = {"x86_64": 238, "aarch64": 237, "ppc64le": 261, "riscv64": 237}
+
+    def __init__(self) -> None:
+        self.libc = ctypes.CDLL(find_library("c"), use_errno=True)
+
+    def getAffinity(self, pid: int) -> Set[int]:
+        return os.sched_getaffinity(pid)
+
+    def setAffinity(self, pid: int, cpus: Iterable[int]) -> None:
+        os.sched_setaffinity(pid, cpus)
+
+    def bindMemory(self, pid: int, domain: int | None) -> None:
+        if pid != 0:
+            raise OSError("Memory policies can only be set for the calling thread")
+        nr = LinuxAffinityBackend.setMempolicySyscall.get(platform.machine())
+        if nr is None:
+            raise OSError(f"NUMA binding is not supported on '{platform.machine()}'")
+
+        if domain is None:
+            mode, mask, maxnode = self.MPOL_DEFAULT, None, 0
+        else:
+            bits = ctypes.sizeof(ctypes.c_ulong) * 8
+            mask = (ctypes.c_ulong * (domain // bits + 1))()
+            mask[domain // bits] = 1 << (domain % bits)
+            mode, maxnode = self.MPOL_BIND, len(mask) * bits + 1
+        if self.libc.syscall(
+            ctypes.c_long(nr),
+            ctypes.c_int(mode),
+            mask,
+            ctypes.c_ulong(maxnode),
+        ) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+
+class FreeBSDAffinityBackend(AffinityBackend):
+    CPU_LEVEL_WHICH = 3
+    CPU_WHICH_PID = 2
+    DOMAINSET_POLICY_ROUNDROBIN = 1
+    DOMAINSET_POLICY_FIRSTTOUCH = 2
+    # sizeof(domainset_t) in userland
+    domainsetSize = 32
+
+    def __init__(self) -> None:
+        self.libc = ctypes.CDLL(find_library("c"), use_errno=True)
+        # Size of the kernel's cpuset_t, which differs between releases
+        reader = util.sysctl.SysctlReader(["kern.sched.cpusetsize"])
+        self.setsize = reader.read()[0]
+        reader.close()
+
+    def _call(self, func, pid: int, mask) -> None:
+        # The calling process is identified by -1, not 0
+        if func(
+            self.CPU_LEVEL_WHICH,
+            self.CPU_WHICH_PID,
+            ctypes.c_int64(pid or -1),
+            ctypes.c_size_t(self.setsize),
+            mask,
+        ) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def getAffinity(self, pid: int) -> Set[int]:
+        mask = ctypes.create_string_buffer(self.setsize)
+        self._call(self.libc.cpuset_getaffinity, pid, mask)
+        bits = int.from_bytes(mask.raw, "little")
+        return {cpu for cpu in range(self.setsize * 8) if bits >> cpu & 1}
+
+    def setAffinity(self, pid: int, cpus: Iterable[int]) -> None:
+        bits = 0
+        for cpu in cpus:
+            bits |= 1 << cpu
+        mask = ctypes.create_string_buffer(bits.to_bytes(self.setsize, "little"), self.setsize)
+        self._call(self.libc.cpuset_setaffinity, pid, mask)
+
+    def bindMemory(self, pid: int, domain: int | None) -> None:
+        if domain is None:
+            # First-touch over every domain, the system default
+            reader = util.sysctl.SysctlReader(["vm.ndomains"])
+            domains = (1 << reader.read()[0]) - 1
+            reader.close()
+            policy = self.DOMAINSET_POLICY_FIRSTTOUCH
+        else:
+            # Round-robin over a single domain never falls back to another one
+            domains = 1 << domain
+            policy = self.DOMAINSET_POLICY_ROUNDROBIN
+        mask = ctypes.create_string_buffer(
+            domains.to_bytes(self.domainsetSize, "little"), self.domainsetSize
+        )
+        if self.libc.cpuset_setdomain(
+            self.CPU_LEVEL_WHICH,
+            self.CPU_WHICH_PID,
+            ctypes.c_int64(pid or -1),
+            ctypes.c_size_t(self.domainsetSize),
+            mask,
+            policy,
+        ) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+
+class FakeAffinityBackend(AffinityBackend):
+    """
+    In-memory backend for testing, every process starts out on 'ncpu' CPUs.
+    """
+
+    def __init__(self, ncpu: int, bindsByPid: bool = True) -> None:
+        self.ncpu = ncpu
+        self.bindsByPid = bindsByPid
+        self.affinity = {}
+        self.domains = {}
+
+    def getAffinity(self, pid: int) -> Set[int]:
+        return set(self.affinity.get(pid, range(self.ncpu)))
+
+    def setAffinity(self, pid: int, cpus: Iterable[int]) -> None:
+        cpus = set(cpus)
+        if not cpus or max(cpus) >= self.ncpu:
+            raise OSError(f"Invalid CPU set {sorted(cpus)}")
+        self.affinity[pid] = cpus
+
+    def bindMemory(self, pid: int, domain: int | None) -> None:
+        if pid != 0 and not self.bindsByPid:
+            raise OSError("Memory policies can only be set for the calling thread")
+        self.domains[pid] = domain
+
+
+_defaultBackend: AffinityBackend | None = None
+
+
+def setDefaultBackend(backend: AffinityBackend | None) -> None:
+    global _defaultBackend
+    _defaultBackend = backend
+
+
+def defaultBackend() -> AffinityBackend:
+    global _defaultBackend
+    if _defaultBackend is None:
+        if sys.platform.startswith("freebsd"):
+            _defaultBackend = FreeBSDAffinityBackend()
+        elif sys.platform.startswith("linux"):
+            _defaultBackend = LinuxAffinityBackend()
+        else:
+            raise OSError(f"No CPU affinity backend available for platform '{sys.platform}'")
+    return _defaultBackend
+
+
+def parseCpus(spec: str) -> Set[int]:
+    """
+    Parse a cpuset(1)-style CPU list such as '0-3,8'.
+    """
+    cpus = set()
+    for part in spec.split(","):
+        lo, sep, hi = part.strip().partition("-")
+        if not lo.isdigit() or (sep and not hi.isdigit()):
+            raise ValueError(f"Invalid CPU list '{spec}'")
+        cpus.update(range(int(lo), int(hi or lo) + 1))
+    return cpus
+
+
+def formatCpus(cpus: Iterable[int]) -> str:
+    """
+    Format a CPU set as a cpuset(1)-style list, e.g. '0-3,8'.
+    """
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(lo) if lo == hi else f"{lo}-{hi}" for lo, hi in ranges)
@@ -0,0 +1,420 @@
+import os
+import sys
+import errno
+import ctypes
+import logging as log
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List
+
+from ctypes.util import find_library
+
+# Stats reported by every process stats backend
+stats: List[str] = [
+    "time",  # CPU time (user + system) in seconds
+    "rss",  # Resident set size in bytes
+    "vsz",  # Virtual size in bytes
+    "minflt",  # Minor page faults
+    "majflt",  # Major page faults
+    "nvcsw",  # Voluntary context switches
+    "nivcsw",  # Involuntary context switches
+    "threads",  # Number of threads
+]
+
+
+class ProcBackend(ABC):
+    @abstractmethod
+    def find(self, name: str) -> int | None:
+        """
+        Return the PID of a process whose command name matches 'name'.
+        """
+        pass
+
+    @abstractmethod
+    def open(self, pid: int) -> Any:
+        pass
+
+    @abstractmethod
+    def read(self, handle: Any) -> Dict[str, int | float] | None:
+        """
+        Return current stats for an opened process,
+        or None if the process has exited.
+        """
+        pass
+
+    def close(self, handle: Any) -> None:
+        pass
+
+
+class Timeval(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_usec", ctypes.c_long)]
+
+
+class Rusage(ctypes.Structure):
+    _fields_ = [
+        ("ru_utime", Timeval),
+        ("ru_stime", Timeval),
+        ("ru_maxrss", ctypes.c_long),
+        ("ru_ixrss", ctypes.c_long),
+        ("ru_idrss", ctypes.c_long),
+        ("ru_isrss", ctypes.c_long),
+        ("ru_minflt", ctypes.c_long),
+        ("ru_majflt", ctypes.c_long),
+        ("ru_nswap", ctypes.c_long),
+        ("ru_inblock", ctypes.c_long),
+        ("ru_oublock", ctypes.c_long),
+        ("ru_msgsnd", ctypes.c_long),
+        ("ru_msgrcv", ctypes.c_long),
+        ("ru_nsignals", ctypes.c_long),
+        ("ru_nvcsw", ctypes.c_long),
+        ("ru_nivcsw", ctypes.c_long),
+    ]
+
+
+class KinfoProc(ctypes.Structure):
+    """
+    Leading part of FreeBSD's 'struct kinfo_proc' (sys/user.h),
+    up to and including the rusage fields.
+    """
+
+    _fields_ = [
+        ("ki_structsize", ctypes.c_int),
+        ("ki_layout", ctypes.c_int),
+        ("ki_args", ctypes.c_void_p),
+        ("ki_paddr", ctypes.c_void_p),
+        ("ki_addr", ctypes.c_void_p),
+        ("ki_tracep", ctypes.c_void_p),
+        ("ki_textvp", ctypes.c_void_p),
+        ("ki_fd", ctypes.c_void_p),
+        ("ki_vmspace", ctypes.c_void_p),
+        ("ki_wchan", ctypes.c_void_p),
+        ("ki_pid", ctypes.c_int),
+        ("ki_ppid", ctypes.c_int),
+        ("ki_pgid", ctypes.c_int),
+        ("ki_tpgid", ctypes.c_int),
+        ("ki_sid", ctypes.c_int),
+        ("ki_tsid", ctypes.c_int),
+        ("ki_jobc", ctypes.c_short),
+        ("ki_spare_short1", ctypes.c_short),
+        ("ki_tdev_freebsd11", ctypes.c_uint32),
+        ("ki_siglist", ctypes.c_uint32 * 4),
+        ("ki_sigmask", ctypes.c_uint32 * 4),
+        ("ki_sigignore", ctypes.c_uint32 * 4),
+        ("ki_sigcatch", ctypes.c_uint32 * 4),
+        ("ki_uid", ctypes.c_uint32),
+        ("ki_ruid", ctypes.c_uint32),
+        ("ki_svuid", ctypes.c_uint32),
+        ("ki_rgid", ctypes.c_uint32),
+        ("ki_svgid", ctypes.c_uint32),
+        ("ki_ngroups", ctypes.c_short),
+        ("ki_spare_short2", ctypes.c_short),
+        ("ki_groups", ctypes.c_uint32 * 16),
+        ("ki_size", ctypes.c_size_t),
+        ("ki_rssize", ctypes.c_long),
+        ("ki_swrss", ctypes.c_long),
+        ("ki_tsize", ctypes.c_long),
+        ("ki_dsize", ctypes.c_long),
+        ("ki_ssize", ctypes.c_long),
+        ("ki_xstat", ctypes.c_ushort),
+        ("ki_acflag", ctypes.c_ushort),
+        ("ki_pctcpu", ctypes.c_uint32),
+        ("ki_estcpu", ctypes.c_uint),
+        ("ki_slptime", ctypes.c_uint),
+        ("ki_swtime", ctypes.c_uint),
+        ("ki_cow", ctypes.c_uint),
+        ("ki_runtime", ctypes.c_uint64),
+        ("ki_start", Timeval),
+        ("ki_childtime", Timeval),
+        ("ki_flag", ctypes.c_long),
+        ("ki_kiflag", ctypes.c_long),
+        ("ki_traceflag", ctypes.c_int),
+        ("ki_stat", ctypes.c_char),
+        ("ki_nice", ctypes.c_byte),
+        ("ki_lock", ctypes.c_char),
+        ("ki_rqindex", ctypes.c_char),
+        ("ki_oncpu_old", ctypes.c_ubyte),
+        ("ki_lastcpu_old", ctypes.c_ubyte),
+        ("ki_tdname", ctypes.c_char * 17),
+        ("ki_wmesg", ctypes.c_char * 9),
+        ("ki_login", ctypes.c_char * 18),
+        ("ki_lockname", ctypes.c_char * 9),
+        ("ki_comm", ctypes.c_char * 20),
+        ("ki_emul", ctypes.c_char * 17),
+        ("ki_loginclass", ctypes.c_char * 18),
+        ("ki_moretdname", ctypes.c_char * 4),
+        ("ki_sparestrings", ctypes.c_char * 46),
+        ("ki_spareints", ctypes.c_int * 2),
+        ("ki_tdev", ctypes.c_uint64),
+        ("ki_oncpu", ctypes.c_int),
+        ("ki_lastcpu", ctypes.c_int),
+        ("ki_tracer", ctypes.c_int),
+        ("ki_flag2", ctypes.c_int),
+        ("ki_fibnum", ctypes.c_int),
+        ("ki_cr_flags", ctypes.c_uint),
+        ("ki_jid", ctypes.c_int),
+        ("ki_numthreads", ctypes.c_int),
+        ("ki_tid", ctypes.c_int),
+        ("ki_pri", ctypes.c_ubyte * 4),
+        ("ki_rusage", Rusage),
+        ("ki_rusage_ch", Rusage),
+    ]
+
+
+class FreeBSDProcBackend(ProcBackend):
+    CTL_KERN = 1
+    KERN_PROC = 14
+    KERN_PROC_PID = 1
+    KERN_PROC_ARGS = 7
+    KERN_PROC_PROC = 8
+    # Length of 'ki_comm' without its terminating NUL
+    COMMLEN = 19
+
+    # Room for a full kinfo_proc, which is larger than the part we map
+    bufsize = 2048
+
+    def __init__(self) -> None:
+        self.libc = ctypes.CDLL(find_library("c"), use_errno=True)
+        self.pagesize = os.sysconf("SC_PAGESIZE")
+
+    def _sysctl(self, mib, buf, size) -> int:
+        if self.libc.sysctl(mib, len(mib), buf, ctypes.byref(size), None, 0) != 0:
+            return ctypes.get_errno()
+        return 0
+
+    def find(self, name: str) -> int | None:
+        mib = (ctypes.c_int * 3)(
+            self.CTL_KERN, self.KERN_PROC, self.KERN_PROC_PROC
+        )
+        size = ctypes.c_size_t(0)
+        # The process table may grow between the size probe and the read
+        while True:
+            if err := self._sysctl(mib, None, size):
+                raise OSError(err, os.strerror(err))
+            size.value += size.value // 8
+            buf = ctypes.create_string_buffer(size.value)
+            err = self._sysctl(mib, buf, size)
+            if err != errno.ENOMEM:
+                break
+        if err:
+            raise OSError(err, os.strerror(err))
+
+        offset = 0
+        bname = name.encode()
+        while offset < size.value:
+            kp = KinfoProc.from_buffer(buf, offset)
+            # 'ki_comm' is truncated to COMMLEN characters, tell longer
+            # names sharing a prefix apart by the command line
+            if kp.ki_comm == bname[: self.COMMLEN] and (
+                len(bname) <= self.COMMLEN or self._argv0(kp.ki_pid) in (None, bname)
+            ):
+                return kp.ki_pid
+            offset += kp.ki_structsize
+        return None
+
+    def _argv0(self, pid: int) -> bytes | None:
+        """
+        Return the base name of the first argument of process 'pid',
+        or None if its arguments cannot be read.
+        """
+        mib = (ctypes.c_int * 4)(
+            self.CTL_KERN, self.KERN_PROC, self.KERN_PROC_ARGS, pid
+        )
+        buf = ctypes.create_string_buffer(self.bufsize)
+        size = ctypes.c_size_t(ctypes.sizeof(buf))
+        if self._sysctl(mib, buf, size) or size.value == 0:
+            return None
+        return os.path.basename(buf.raw[: size.value].split(b"\0")[0])
+
+    def open(self, pid: int) -> Any:
+        mib = (ctypes.c_int * 4)(
+            self.CTL_KERN, self.KERN_PROC, self.KERN_PROC_PID, pid
+        )
+        buf = ctypes.create_string_buffer(FreeBSDProcBackend.bufsize)
+        return (mib, buf, KinfoProc.from_buffer(buf), ctypes.c_size_t(0))
+
+    def read(self, handle: Any) -> Dict[str, int | float] | None:
+        mib, buf, kp, size = handle
+        size.value = ctypes.sizeof(buf)
+        err = self._sysctl(mib, buf, size)
+        if err == errno.ESRCH or (err == 0 and size.value == 0):
+            return None
+        if err:
+            raise OSError(err, os.strerror(err))
+
+        ru = kp.ki_rusage
+        return {
+            "time": kp.ki_runtime / 1e6,
+            "rss": kp.ki_rssize * self.pagesize,
+            "vsz": kp.ki_size,
+            "minflt": ru.ru_minflt,
+            "majflt": ru.ru_majflt,
+            "nvcsw": ru.ru_nvcsw,
+            "nivcsw": ru.ru_nivcsw,
+            "threads": kp.ki_numthreads,
+        }
+
+
+class LinuxProcBackend(ProcBackend):
+    """
+    Reads process stats from /proc/<pid>/stat and /proc/<pid>/status.
+    Both files are kept open and re-read with pread().
+    """
+
+    def __init__(self) -> None:
+        self.pagesize = os.sysconf("SC_PAGESIZE")
+        self.clktck = os.sysconf("SC_CLK_TCK")
+
+    @staticmethod
+    def _comm(pid: str) -> str | None:
+        try:
+            with open(f"/proc/{pid}/comm", "rb") as f:
+                return f.read().rstrip(b"\n").decode(errors="replace")
+        except OSError:
+            return None
+
+    @staticmethod
+    def _cmdline(pid: str) -> str | None:
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                return f.read().rstrip(b"\0").replace(b"\0", b" ").decode(errors="replace")
+        except OSError:
+            return None
+
+    def find(self, name: str) -> int | None:
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            # 'comm' is truncated to 15 characters, fall back to the command line
+            if self._comm(entry) == name[:15] or self._cmdline(entry) == name:
+                return int(entry)
+        return None
+
+    def open(self, pid: int) -> Any:
+        try:
+            statFd = os.open(f"/proc/{pid}/stat", os.O_RDONLY)
+            statusFd = os.open(f"/proc/{pid}/status", os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        return (statFd, statusFd, bytearray(4096), bytearray(8192))
+
+    def read(self, handle: Any) -> Dict[str, int | float] | None:
+        if handle is None:
+            return None
+        statFd, statusFd, statBuf, statusBuf = handle
+        try:
+            n = os.preadv(statFd, [statBuf], 0)
+            m = os.preadv(statusFd, [statusBuf], 0)
+        except ProcessLookupError:
+            return None
+        if n == 0:
+            return None
+
+        # Skip past the command name, which may contain spaces and parentheses
+        fields = statBuf[statBuf.rindex(b")", 0, n) + 2 : n].split()
+        values = {
+            "time": (int(fields[11]) + int(fields[12])) / self.clktck,
+            "rss": int(fields[21]) * self.pagesize,
+            "vsz": int(fields[20]),
+            "minflt": int(fields[7]),
+            "majflt": int(fields[9]),
+            "threads": int(fields[17]),
+        }
+
+        for line in statusBuf[:m].splitlines():
+            if line.startswith(b"voluntary_ctxt_switches:"):
+                values["nvcsw"] = int(line.split()[1])
+            elif line.startswith(b"nonvoluntary_ctxt_switches:"):
+                values["nivcsw"] = int(line.split()[1])
+        return values
+
+    def close(self, handle: Any) -> None:
+        if handle is not None:
+            os.close(handle[0])
+            os.close(handle[1])
+
+
+class FakeProcBackend(ProcBackend):
+    """
+    In-memory backend for testing.
+    'procs' maps command names to PIDs and PIDs to stats dicts;
+    removing a PID from 'stats' simulates the process exiting.
+    """
+
+    def __init__(self, procs: Dict[str, int], stats: Dict[int, Dict]) -> None:
+        self.procs = procs
+        self.stats = stats
+
+    def find(self, name: str) -> int | None:
+        return self.procs.get(name)
+
+    def open(self, pid: int) -> Any:
+        return pid
+
+    def read(self, handle: Any) -> Dict[str, int | float] | None:
+        return self.stats.get(handle)
+
+
+_defaultBackend: ProcBackend | None = None
+
+
+def setDefaultBackend(backend: ProcBackend | None) -> None:
+    global _defaultBackend
+    _defaultBackend = backend
+
+
+def defaultBackend() -> ProcBackend:
+    global _defaultBackend
+    if _defaultBackend is None:
+        if sys.platform.startswith("freebsd"):
+            _defaultBackend = FreeBSDProcBackend()
+        elif sys.platform.startswith("linux"):
+            _defaultBackend = LinuxProcBackend()
+        else:
+            raise OSError(f"No process stats backend available for platform '{sys.platform}'")
+    return _defaultBackend
+
+
+class ProcStats:
+    """
+    Tracks the stats of a single process identified by its command name.
+    The process table is only scanned when we have no PID yet or
+    when the tracked process went away.
+    """
+
+    def __init__(self, name: str, backend: ProcBackend | None = None) -> None:
+        self.name = name
+        self.backend = backend if backend else defaultBackend()
+        self.pid = None
+        self.handle = None
+
+    def _attach(self) -> bool:
+        pid = self.backend.find(self.name)
+        if pid is None:
+            return False
+
+        self.pid = pid
+        self.handle = self.backend.open(pid)
+        log.debug(f"Tracking process '{self.name}' (PID {pid})")
+        return True
+
+    def _detach(self) -> None:
+        self.backend.close(self.handle)
+        self.pid = None
+        self.handle = None
+
+    def read(self) -> Dict[str, int | float] | None:
+        if self.pid is None and not self._attach():
+            return None
+
+        values = self.backend.read(self.handle)
+        if values is None:
+            # Process exited, look for a new instance
+            self._detach()
+            if not self._attach():
+                return None
+            values = self.backend.read(self.handle)
+        return values
+
+    def close(self) -> None:
+        if self.pid is not None:
+            self._detach()
@@ -0,0 +1,134 @@
+import os
+import sys
+import time
+import signal
+import resource
+
+from typing import Any, Dict, List
+
+# Resource usage reported for every reaped process tree
+rusageStats: List[str] = [
+    "utime",  # User CPU time in seconds
+    "stime",  # System CPU time in seconds
+    "maxrss",  # Largest resident set size in bytes
+    "minflt",  # Minor page faults
+    "majflt",  # Major page faults
+    "nvcsw",  # Voluntary context switches
+    "nivcsw",  # Involuntary context switches
+    "inblock",  # Block input operations
+    "oublock",  # Block output operations
+]
+
+# ru_maxrss is reported in kilobytes on both Linux and FreeBSD
+maxrssUnit = 1 if sys.platform == "darwin" else 1024
+
+
+def rusageDict(ru: resource.struct_rusage) -> Dict[str, int | float]:
+    return {
+        "utime": ru.ru_utime,
+        "stime": ru.ru_stime,
+        "maxrss": ru.ru_maxrss * maxrssUnit,
+        "minflt": ru.ru_minflt,
+        "majflt": ru.ru_majflt,
+        "nvcsw": ru.ru_nvcsw,
+        "nivcsw": ru.ru_nivcsw,
+        "inblock": ru.ru_inblock,
+        "oublock": ru.ru_oublock,
+    }
+
+
+class SpawnedProcess:
+    """
+    A command started up front that blocks on a pipe until released,
+    so starting the clock costs a single write(2) instead of a fork and
+    interpreter startup. The process is reaped with wait4(2), whose
+    resource usage covers the whole process tree it waited for.
+
+    Anything the process needs beyond its working directory and stdout,
+    such as CPU affinity, is applied by pid while it waits.
+    """
+
+    # Spawned with posix_spawn(2), so no Python runs in the child: the
+    # shell changes to the working directory, waits for a line on the
+    # barrier at fd 3 and execs the command in its place, looking it up
+    # in the PATH of 'env'. The barrier's write end and every other
+    # pipe we created are close-on-exec and never reach the child.
+    shell = "/bin/sh"
+    barrierFd = 3
+    barrierScript = (
+        '[ -z "$1" ] || cd -- "$1" || exit 127; shift; '
+        "IFS= read -r _ <&3 || exit 1; exec 3<&-; "
+        'exec "$@"'
+    )
+
+    def __init__(
+        self,
+        argv: List[str],
+        env: Dict[str, str] | None = None,
+        cwd: str | None = None,
+        stdout: int | None = None,
+    ) -> None:
+        if env is None:
+            env = dict(os.environ)
+        self.argv = argv
+        self.start = None
+
+        barrier, self.releaseFd = os.pipe()
+        fileActions = [(os.POSIX_SPAWN_DUP2, barrier, SpawnedProcess.barrierFd)]
+        if stdout is not None:
+            fileActions.insert(0, (os.POSIX_SPAWN_DUP2, stdout, 1))
+        try:
+            self.pid = os.posix_spawn(
+                SpawnedProcess.shell,
+                [SpawnedProcess.shell, "-c", SpawnedProcess.barrierScript, "kbench-spawn", cwd or "", *argv],
+                env,
+                file_actions=fileActions,
+            )
+        except OSError:
+            os.close(self.releaseFd)
+            raise
+        finally:
+            os.close(barrier)
+
+    def release(self) -> None:
+        self.start = time.perf_counter()
+        os.write(self.releaseFd, b"\n")
+        os.close(self.releaseFd)
+
+    def kill(self) -> None:
+        # Closing the barrier without writing makes the child exit
+        os.close(self.releaseFd)
+        os.waitpid(self.pid, 0)
+
+    def terminate(self, timeout: float = 2.0, sig: int = signal.SIGTERM) -> int:
+        """
+        Stop a released process with 'sig', escalating to SIGKILL
+        after 'timeout' seconds, and return its exit status.
+        """
+        try:
+            os.kill(self.pid, sig)
+        except ProcessLookupError:
+            pass
+        deadline = time.monotonic() + timeout
+        while True:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+            if pid:
+                return os.waitstatus_to_exitcode(status)
+            if time.monotonic() >= deadline:
+                os.kill(self.pid, signal.SIGKILL)
+                _, status = os.waitpid(self.pid, 0)
+                return os.waitstatus_to_exitcode(status)
+            time.sleep(0.01)
+
+    def wait(self) -> Dict[str, Any]:
+        """
+        Reap the process and return its exit status, wall time
+        since release and resource usage.
+        """
+        _, status, ru = os.wait4(self.pid, 0)
+        end = time.perf_counter()
+        return {
+            "time": end - self.start,
+            "status": os.waitstatus_to_exitcode(status),
+            "rusage": rusageDict(ru),
+        }
@@ -0,0 +1,257 @@
+import os
+import sys
+import errno
+import ctypes
+import logging as log
+
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List
+
+from ctypes.util import find_library
+
+
+class SysctlOid:
+    """
+    Resolved sysctl OID.
+
+    Backends attach whatever state they need for a fast read
+    (MIB, preallocated buffer, open file descriptor, ...).
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+
+class SysctlBackend(ABC):
+    @abstractmethod
+    def resolve(self, name: str) -> SysctlOid:
+        pass
+
+    @abstractmethod
+    def read(self, oid: SysctlOid) -> Any:
+        pass
+
+    def release(self, oid: SysctlOid) -> None:
+        pass
+
+
+class FreeBSDSysctlBackend(SysctlBackend):
+    CTL_MAXNAME = 24
+
+    CTLTYPE = 0xF
+    CTLTYPE_NODE = 1
+    CTLTYPE_STRING = 3
+    CTLTYPE_OPAQUE = 5
+
+    # Maps CTLTYPE_* values to the matching C scalar type
+    scalarTypes: Dict[int, Any] = {
+        2: ctypes.c_int,
+        4: ctypes.c_int64,
+        6: ctypes.c_uint,
+        7: ctypes.c_long,
+        8: ctypes.c_ulong,
+        9: ctypes.c_uint64,
+        0xA: ctypes.c_uint8,
+        0xB: ctypes.c_uint16,
+        0xC: ctypes.c_int8,
+        0xD: ctypes.c_int16,
+        0xE: ctypes.c_int32,
+        0xF: ctypes.c_uint32,
+    }
+
+    def __init__(self) -> None:
+        self.libc = ctypes.CDLL(find_library("c"), use_errno=True)
+        self.libc.sysctl.argtypes = [
+            ctypes.POINTER(ctypes.c_int),
+            ctypes.c_uint,
+            ctypes.c_void_p,
+            ctypes.POINTER(ctypes.c_size_t),
+            ctypes.c_void_p,
+            ctypes.c_size_t,
+        ]
+
+    def _sysctl(self, mib, miblen, buf, size) -> int:
+        if self.libc.sysctl(mib, miblen, buf, ctypes.byref(size), None, 0) != 0:
+            return ctypes.get_errno()
+        return 0
+
+    def _oidfmt(self, mib, miblen):
+        # {0, 4, <mib>} returns the OID kind followed by its format string
+        qmib = (ctypes.c_int * (miblen + 2))(0, 4, *mib[:miblen])
+        buf = ctypes.create_string_buffer(256)
+        size = ctypes.c_size_t(ctypes.sizeof(buf))
+        err = self._sysctl(qmib, miblen + 2, buf, size)
+        if err:
+            raise OSError(err, os.strerror(err))
+        kind = ctypes.c_uint.from_buffer(buf).value
+        fmt = buf.raw[ctypes.sizeof(ctypes.c_uint) : size.value].split(b"\0")[0]
+        return kind, fmt.decode()
+
+    def resolve(self, name: str) -> SysctlOid:
+        oid = SysctlOid(name)
+        mib = (ctypes.c_int * FreeBSDSysctlBackend.CTL_MAXNAME)()
+        miblen = ctypes.c_size_t(FreeBSDSysctlBackend.CTL_MAXNAME)
+        if self.libc.sysctlnametomib(name.encode("ascii"), mib, ctypes.byref(miblen)):
+            raise ValueError(f"Unknown sysctl '{name}'")
+
+        oid.miblen = miblen.value
+        oid.mib = (ctypes.c_int * oid.miblen)(*mib[: oid.miblen])
+        oid.kind, oid.fmt = self._oidfmt(oid.mib, oid.miblen)
+        oid.ctltype = oid.kind & FreeBSDSysctlBackend.CTLTYPE
+        if oid.ctltype == FreeBSDSysctlBackend.CTLTYPE_NODE:
+            raise ValueError(f"sysctl '{name}' is a node, not a leaf")
+
+        # Probe the current size once and preallocate a typed buffer for it
+        size = ctypes.c_size_t(0)
+        err = self._sysctl(oid.mib, oid.miblen, None, size)
+        if err:
+            raise OSError(err, f"sysctl '{name}': {os.strerror(err)}")
+        self._allocate(oid, size.value)
+        oid.size = ctypes.c_size_t(0)
+
+        log.debug(f"Resolved sysctl '{name}' (type {oid.ctltype}, fmt '{oid.fmt}')")
+        return oid
+
+    def _allocate(self, oid: SysctlOid, nbytes: int) -> None:
+        ctype = FreeBSDSysctlBackend.scalarTypes.get(oid.ctltype)
+        if ctype is not None:
+            oid.elemsize = ctypes.sizeof(ctype)
+            count = max(nbytes // oid.elemsize, 1)
+            oid.buf = (ctype * count)()
+            oid.decode = self._decodeScalar
+        else:
+            # Strings and opaque tables can grow between reads, leave some slack
+            oid.buf = ctypes.create_string_buffer(max(nbytes + nbytes // 4, 64))
+            if oid.ctltype == FreeBSDSysctlBackend.CTLTYPE_STRING:
+                oid.decode = self._decodeString
+            else:
+                oid.decode = self._decodeOpaque
+        oid.bufsize = ctypes.sizeof(oid.buf)
+
+    @staticmethod
+    def _decodeScalar(oid: SysctlOid, nbytes: int):
+        if nbytes == oid.elemsize:
+            return oid.buf[0]
+        return tuple(oid.buf[: nbytes // oid.elemsize])
+
+    @staticmethod
+    def _decodeString(oid: SysctlOid, nbytes: int):
+        return oid.buf.raw[:nbytes].split(b"\0")[0].decode(errors="replace")
+
+    @staticmethod
+    def _decodeOpaque(oid: SysctlOid, nbytes: int):
+        return oid.buf.raw[:nbytes]
+
+    def read(self, oid: SysctlOid) -> Any:
+        oid.size.value = oid.bufsize
+        err = self._sysctl(oid.mib, oid.miblen, oid.buf, oid.size)
+        if err == 0:
+            return oid.decode(oid, oid.size.value)
+
+        if err != errno.ENOMEM:
+            raise OSError(err, f"sysctl '{oid.name}': {os.strerror(err)}")
+
+        # The value outgrew our buffer, reallocate and retry once
+        size = ctypes.c_size_t(0)
+        self._sysctl(oid.mib, oid.miblen, None, size)
+        self._allocate(oid, size.value)
+        return self.read(oid)
+
+
+class ProcSysBackend(SysctlBackend):
+    """
+    Linux backend reading sysctls from /proc/sys.
+    Each OID keeps its file open and is re-read with pread()
+    into a preallocated buffer.
+    """
+
+    root = "/proc/sys"
+    bufsize = 4096
+
+    def resolve(self, name: str) -> SysctlOid:
+        oid = SysctlOid(name)
+        oid.path = os.path.join(ProcSysBackend.root, *name.split("."))
+        try:
+            oid.fd = os.open(oid.path, os.O_RDONLY)
+        except FileNotFoundError:
+            raise ValueError(f"Unknown sysctl '{name}'")
+        oid.buf = bytearray(ProcSysBackend.bufsize)
+        oid.view = memoryview(oid.buf)
+        return oid
+
+    def read(self, oid: SysctlOid) -> Any:
+        nbytes = os.preadv(oid.fd, [oid.buf], 0)
+        fields = bytes(oid.view[:nbytes]).split()
+        try:
+            values = tuple(int(f) for f in fields)
+        except ValueError:
+            return b" ".join(fields).decode(errors="replace")
+
+        if len(values) == 1:
+            return values[0]
+        return values
+
+    def release(self, oid: SysctlOid) -> None:
+        os.close(oid.fd)
+
+
+class FakeSysctlBackend(SysctlBackend):
+    """
+    In-memory backend for testing off FreeBSD.
+    Values can be constants or callables returning the next value.
+    """
+
+    def __init__(self, values: Dict[str, Any | Callable[[], Any]]) -> None:
+        self.values = values
+
+    def resolve(self, name: str) -> SysctlOid:
+        if name not in self.values:
+            raise ValueError(f"Unknown sysctl '{name}'")
+        return SysctlOid(name)
+
+    def read(self, oid: SysctlOid) -> Any:
+        value = self.values[oid.name]
+        if callable(value):
+            return value()
+        return value
+
+
+_defaultBackend: SysctlBackend | None = None
+
+
+def setDefaultBackend(backend: SysctlBackend | None) -> None:
+    global _defaultBackend
+    _defaultBackend = backend
+
+
+def defaultBackend() -> SysctlBackend:
+    global _defaultBackend
+    if _defaultBackend is None:
+        if sys.platform.startswith("freebsd"):
+            _defaultBackend = FreeBSDSysctlBackend()
+        elif sys.platform.startswith("linux"):
+            _defaultBackend = ProcSysBackend()
+        else:
+            raise OSError(f"No sysctl backend available for platform '{sys.platform}'")
+    return _defaultBackend
+
+
+class SysctlReader:
+    """
+    Reads a fixed group of sysctls.
+    OID names are resolved once when the reader is created.
+    """
+
+    def __init__(self, names: List[str], backend: SysctlBackend | None = None) -> None:
+        self.backend = backend if backend else defaultBackend()
+        self.names = list(names)
+        self.oids = [self.backend.resolve(name) for name in self.names]
+
+    def read(self) -> List[Any]:
+        read = self.backend.read
+        return [read(oid) for oid in self.oids]
+
+    def close(self) -> None:
+        for oid in self.oids:
+            self.backend.release(oid)
+        self.oids = []